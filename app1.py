@@ -1,14 +1,23 @@
-import os
 import time
-import queue
+from startup import StartupTimer, ensure_models
+
+startup_timer = StartupTimer()
+
+import os
+import sys
 import threading
 import numpy as np
 import sounddevice as sd
-from collections import deque
 import subprocess as sp
+import multiprocessing as mp
 import openwakeword
 from openwakeword.model import Model
-from RealtimeSTT import AudioToTextRecorder
+from audio_pipeline import AudioRingBuffer, EnergyGate, WakeWordDetector, DROP_OLDEST
+from stt_engine import SpeechToTextEngine
+from shared_audio import SharedAudioRing, parse_cores, pin_to_cores
+from tracing import get_tracer, trace_path
+
+startup_timer.mark("imports")
 
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
@@ -19,31 +28,17 @@ def _patched_popen(*args, **kwargs):
     return _orig_popen(*args, **kwargs)
 sp.Popen = _patched_popen
 
-# === Ensure pretrained ONNX models are present ===
-print("🔄 Checking and downloading OpenWakeWord models if needed...")
-try:
-    # This will download models into resources/models if missing
-    openwakeword.utils.download_models()
-    print("✅ Model files are in place.")
-except Exception as e:
-    print(f"⚠️ download_models() warning: {e}")
-
-# === Initialize OpenWakeWord Model ===
-print("🔄 Initializing OpenWakeWord model...")
-try:
-    oww_model = Model(
-        wakeword_models=["alexa"],
-        enable_speex_noise_suppression=False,
-        inference_framework='onnx',
-        vad_threshold=0.2
-    )
-    print("✅ Model initialized. Available wake words:")
-    for name in oww_model.models:
-        print(f"   - {name}")
-except Exception as e:
-    print(f"❌ Failed to initialize model: {e}")
-    print("💡 Please ensure openwakeword v0.6.0+ and onnxruntime are installed.")
-    exit(1)
+# Fast start: verify models from the local manifest instead of calling the
+# downloader, and load speech-to-text in the background once the mic is open
+FAST_START = os.environ.get("ALEXA_FAST_START") == "1" or "--fast-start" in sys.argv
+WAKEWORD_MODELS = ["alexa"]
+
+# Process split: capture + wake word here, STT and the voice agent in a second
+# process fed through a shared-memory ring
+PROCESS_SPLIT = os.environ.get("ALEXA_PROCESS_SPLIT") == "1" or "--split" in sys.argv
+SHARED_RING_CHUNKS = 64                                  # ~5 s of audio
+WAKE_CPUS = parse_cores(os.environ.get("ALEXA_WAKE_CPUS"))  # e.g. "0"
+STT_CPUS = parse_cores(os.environ.get("ALEXA_STT_CPUS"))    # e.g. "1-3"
 
 # === Audio parameters ===
 SR = 16000
@@ -51,105 +46,191 @@ CHUNK_DURATION_MS = 80
 CHUNK_SIZE = int(SR * CHUNK_DURATION_MS / 1000)
 BLOCK_SIZE = CHUNK_SIZE
 DEVICE_INDEX = None
+PREROLL_SECONDS = 1.5  # audio before/around the wake word handed to speech-to-text
+PREROLL_CHUNKS = int(PREROLL_SECONDS * 1000 / CHUNK_DURATION_MS)
+RING_CAPACITY_CHUNKS = max(32, PREROLL_CHUNKS + 8)  # ~2.5 s of audio at 80 ms per chunk
+AUDIO_QUEUE_POLICY = DROP_OLDEST  # drop_oldest | drop_newest | coalesce
+MAX_AUDIO_LATENCY = 0.5  # seconds from capture to prediction before chunks are skipped
 
 # Detection parameters
 DETECTION_THRESHOLD = 0.5
 POST_DETECT_COOLDOWN = 2.0
 SMOOTHING_WINDOW = 5
 
+# Energy gate: skip ONNX inference on silent chunks
+ENERGY_GATE_ENABLED = True
+ENERGY_GATE_DBFS = -50.0   # RMS level treated as sound
+GATE_HANGOVER_CHUNKS = 12  # keep inferring ~1 s after the last loud chunk
+GATE_CONTEXT_CHUNKS = 12   # silent chunks replayed into the model when the gate opens
+
 # Buffers
-audio_queue = queue.Queue()
-audio_buffer = np.zeros(0, dtype=np.float32)
-last_detect_time = 0.0
+audio_ring = AudioRingBuffer(CHUNK_SIZE, capacity_chunks=RING_CAPACITY_CHUNKS,
+                             policy=AUDIO_QUEUE_POLICY, max_latency=MAX_AUDIO_LATENCY)
+energy_gate = EnergyGate(CHUNK_SIZE, threshold_dbfs=ENERGY_GATE_DBFS,
+                         hangover_chunks=GATE_HANGOVER_CHUNKS,
+                         context_chunks=GATE_CONTEXT_CHUNKS) if ENERGY_GATE_ENABLED else None
+preroll_buffer = np.zeros((PREROLL_CHUNKS, CHUNK_SIZE), dtype=np.int16)
+oww_model = None
+detector = None
 last_log_time = 0.0
-prediction_buffer = {m: deque(maxlen=SMOOTHING_WINDOW) for m in oww_model.models}
 
-# Speech-to-text state
-stt_recorder = None
-stt_active = False
+# Latency tracing (ALEXA_TRACE=1): one trace per wake word, exported on exit
+tracer = get_tracer()
 
-def start_speech_to_text():
-    """Start real-time speech-to-text recording immediately"""
-    global stt_recorder, stt_active
-    
-    print("🎤 Starting speech-to-text recording IMMEDIATELY...")
-    stt_active = True
+def ensure_wake_word_models():
+    """Make sure the pretrained ONNX models are present"""
+    if FAST_START:
+        print("🔄 Verifying OpenWakeWord models against the local manifest...")
+        try:
+            status = ensure_models(WAKEWORD_MODELS)
+            print(f"✅ Model files are in place ({status}).")
+            return
+        except Exception as e:
+            print(f"⚠️ Manifest check failed, falling back to the downloader: {e}")
     
-    # Initialize the recorder
-    stt_recorder = AudioToTextRecorder()
+    print("🔄 Checking and downloading OpenWakeWord models if needed...")
+    try:
+        # This will download models into resources/models if missing
+        openwakeword.utils.download_models()
+        print("✅ Model files are in place.")
+    except Exception as e:
+        print(f"⚠️ download_models() warning: {e}")
+
+def init_wake_word_model():
+    """Initialize the OpenWakeWord model and the detector that smooths its scores"""
+    global oww_model, detector
     
-    def on_text(txt):
-        if txt.strip():  # Only print non-empty text
-            print(f"🗣️ You said: {txt}")
+    print("🔄 Initializing OpenWakeWord model...")
+    try:
+        oww_model = Model(
+            wakeword_models=WAKEWORD_MODELS,
+            enable_speex_noise_suppression=False,
+            inference_framework='onnx',
+            vad_threshold=0.2
+        )
+        print("✅ Model initialized. Available wake words:")
+        for name in oww_model.models:
+            print(f"   - {name}")
+    except Exception as e:
+        print(f"❌ Failed to initialize model: {e}")
+        print("💡 Please ensure openwakeword v0.6.0+ and onnxruntime are installed.")
+        sys.exit(1)
     
-    # Start recording immediately
-    stt_recorder.text(on_text)
+    detector = WakeWordDetector(oww_model.models, threshold=DETECTION_THRESHOLD,
+                                smoothing_window=SMOOTHING_WINDOW, cooldown=POST_DETECT_COOLDOWN)
+
+# Speech-to-text state: one warm engine, fed from the wake-word capture stream
+stt_engine = None
+
+# Process split state
+shared_ring = None
+last_shared_seq = -1
+wake_events = None
+stt_busy = None
+stt_stop = None
+stt_proc = None
+
+def on_stt_text(txt):
+    """Handle a finished utterance from the speech-to-text engine"""
+    print(f"🗣️ You said: {txt}")
+    print("👂 Listening for wake word again...")
+
+def stt_is_active():
+    if stt_busy is not None:
+        return stt_busy.is_set()
+    return stt_engine is not None and stt_engine.armed
+
+def start_speech_to_text(word="", score=0.0, trace_id=None):
+    """Arm the warm speech-to-text engine immediately, handing it the pre-roll audio"""
+    print("🎤 Starting speech-to-text recording IMMEDIATELY...")
+    if wake_events is not None:
+        # The STT process reads its pre-roll back from the shared ring
+        wake_events.put({"seq": last_shared_seq, "word": word, "score": score,
+                         "trace_id": trace_id, "detected_at": time.perf_counter()})
+        return
+    n = audio_ring.copy_history(preroll_buffer)
+    stt_engine.arm(preroll=preroll_buffer[:n], trace_id=trace_id)
     print("✅ Speech-to-text started. Speak now...")
 
 def stop_speech_to_text():
-    """Stop real-time speech-to-text recording"""
-    global stt_recorder, stt_active
-    
-    if stt_active and stt_recorder:
+    """Disarm the speech-to-text engine"""
+    if stt_engine is not None and stt_engine.armed:
         print("🛑 Stopping speech-to-text recording...")
         try:
-            stt_recorder.stop()
-            stt_active = False
-            stt_recorder = None
+            stt_engine.disarm()
             print("✅ Speech-to-text stopped.")
         except Exception as e:
             print(f"⚠️ Error stopping recorder: {e}")
 
 # Worker thread for wake word detection
 def worker():
-    global last_detect_time, last_log_time, stt_active
+    global last_log_time, last_shared_seq
     
     while True:
-        chunk = audio_queue.get()
-        if chunk is None:
+        audio_int16 = audio_ring.read()
+        if audio_int16 is None:
             break
+        read_at = time.perf_counter()
+        
+        # While armed, the STT engine listens to the same stream
+        if shared_ring is not None:
+            last_shared_seq = shared_ring.write_chunk(audio_int16)
+        elif stt_is_active():
+            stt_engine.feed(audio_int16)
         
         now = time.time()
         
         # Check for wake word detection
-        if now - last_detect_time < POST_DETECT_COOLDOWN:
+        if detector.in_cooldown(now):
             continue
         
         try:
-            if len(chunk) != CHUNK_SIZE:
-                chunk = np.pad(chunk, (0, max(0, CHUNK_SIZE - len(chunk))), mode='constant')[:CHUNK_SIZE]
+            if energy_gate is not None:
+                if not energy_gate.check(audio_int16):
+                    continue
+                # Prime the model's streaming buffers with the audio just before speech
+                for context_chunk in energy_gate.drain_context():
+                    oww_model.predict(context_chunk)
             
-            audio_int16 = (chunk * 32767).astype(np.int16)
             preds = oww_model.predict(audio_int16)
             
-            detected = False
-            for name, score in preds.items():
-                buf = prediction_buffer[name]
-                buf.append(score)
-                smoothed = np.mean(buf) if len(buf) >= SMOOTHING_WINDOW else score
-                
-                if smoothed >= DETECTION_THRESHOLD:
+            detections = detector.update(preds, now)
+            detected = bool(detections)
+            if detected:
+                for name, smoothed in detections:
                     print(f"🎯 WAKE WORD DETECTED: '{name}' (score: {smoothed:.3f})")
-                    last_detect_time = now
-                    detected = True
-                    
-                    # Start speech-to-text IMMEDIATELY if not already active
-                    if not stt_active:
-                        start_speech_to_text()
-                    break
+                
+                # From capture of the triggering chunk to the decision
+                trace_id = tracer.new_trace_id()
+                tracer.record("wake.detect", read_at - audio_ring.last_latency, trace_id=trace_id,
+                              word=detections[0][0], score=float(detections[0][1]))
+                
+                # Start speech-to-text IMMEDIATELY if not already active
+                if not stt_is_active():
+                    start_speech_to_text(*detections[0], trace_id=trace_id)
             
             # Log status if not detected and enough time has passed
             if not detected and now - last_log_time > 5:
                 if preds:
                     best = max(preds, key=preds.get)
                     status = f"👂 Listening... Best: '{best}' ({preds[best]:.3f})"
-                    if stt_active:
+                    if stt_is_active():
                         status += " | 🎤 STT Active"
+                    dropped = audio_ring.overruns + audio_ring.late_drops
+                    if dropped:
+                        status += f" | ⚠️ Dropped: {dropped} (lagging: {audio_ring.lagging_reads})"
+                    if energy_gate is not None:
+                        status += f" | 🔇 Skipped: {energy_gate.skipped}"
                     print(status)
                 else:
                     status = "👂 Listening..."
-                    if stt_active:
+                    if stt_is_active():
                         status += " | 🎤 STT Active"
+                    dropped = audio_ring.overruns + audio_ring.late_drops
+                    if dropped:
+                        status += f" | ⚠️ Dropped: {dropped} (lagging: {audio_ring.lagging_reads})"
+                    if energy_gate is not None:
+                        status += f" | 🔇 Skipped: {energy_gate.skipped}"
                     print(status)
                 last_log_time = now
                 
@@ -157,26 +238,50 @@ def worker():
             print(f"⚠️ Error in processing: {e}")
             continue
 
-# Start worker thread
-worker_thread = threading.Thread(target=worker, daemon=True)
-worker_thread.start()
+worker_thread = None
 
 # Audio callback
 def audio_callback(indata, frames, time_info, status):
-    global audio_buffer
     if status:
         print(f"⚠️ Stream status: {status}")
     
+    # Written in place into the preallocated ring; no per-chunk allocation here
     mono = indata[:, 0] if indata.ndim > 1 else indata
-    audio_buffer = np.concatenate([audio_buffer, mono])
+    audio_ring.write(mono)
+
+def start_stt_process():
+    """Start the STT/agent process and the shared ring it reads audio from"""
+    global shared_ring, wake_events, stt_busy, stt_stop, stt_proc
+    from stt_process import run_stt_agent_process
     
-    while len(audio_buffer) >= CHUNK_SIZE:
-        chunk = audio_buffer[:CHUNK_SIZE].copy()
-        audio_buffer = audio_buffer[CHUNK_SIZE:]
-        try:
-            audio_queue.put_nowait(chunk)
-        except queue.Full:
-            pass
+    shared_ring = SharedAudioRing(create=True, capacity_chunks=SHARED_RING_CHUNKS, chunk_size=CHUNK_SIZE)
+    wake_events = mp.Queue()
+    stt_busy = mp.Event()
+    stt_stop = mp.Event()
+    stt_proc = mp.Process(
+        target=run_stt_agent_process,
+        kwargs={
+            "shm_name": shared_ring.name,
+            "wake_events": wake_events,
+            "stt_busy": stt_busy,
+            "stop_event": stt_stop,
+            "preroll_chunks": PREROLL_CHUNKS,
+            "sample_rate": SR,
+            "cores": STT_CPUS,
+        },
+        daemon=True,
+    )
+    stt_proc.start()
+    print(f"🔀 STT/agent process started (pid {stt_proc.pid}, shared ring '{shared_ring.name}')")
+
+def stop_stt_process():
+    """Stop the STT/agent process and release the shared ring"""
+    stt_stop.set()
+    wake_events.put(None)
+    stt_proc.join(timeout=5.0)
+    if stt_proc.is_alive():
+        stt_proc.terminate()
+    shared_ring.close()
 
 # Main loop
 def main():
@@ -184,9 +289,31 @@ def main():
     print(f"📋 Instructions:")
     print(f"   - Say 'Alexa' to start speech-to-text IMMEDIATELY")
     print(f"   - Speak your command")
-    print(f"   - NO AUTO-STOP - will record until manually stopped")
+    print(f"   - Listening for the wake word resumes after each command")
     print(f"   - Press Ctrl+C to exit")
     
+    global stt_engine, worker_thread
+    if PROCESS_SPLIT:
+        start_stt_process()
+    if pin_to_cores(WAKE_CPUS):
+        print(f"📌 Wake word process pinned to cores {sorted(WAKE_CPUS)}")
+    ensure_wake_word_models()
+    startup_timer.mark("model files")
+    init_wake_word_model()
+    startup_timer.mark("wake word model")
+    
+    # Start worker thread
+    worker_thread = threading.Thread(target=worker, daemon=True)
+    worker_thread.start()
+    
+    if not PROCESS_SPLIT:
+        stt_engine = SpeechToTextEngine(on_text=on_stt_text, sample_rate=SR)
+    if stt_engine is not None and not FAST_START:
+        print("🔄 Loading speech-to-text engine...")
+        stt_engine.load()
+        print("✅ Speech-to-text engine ready.")
+        startup_timer.mark("speech-to-text engine")
+    
     try:
         dev = DEVICE_INDEX if DEVICE_INDEX is not None else sd.default.device[0]
         info = sd.query_devices(dev)
@@ -196,6 +323,13 @@ def main():
                              dtype=np.float32, device=dev,
                              callback=audio_callback):
             print("✅ Stream started. Say 'Alexa' to begin IMMEDIATELY!")
+            startup_timer.mark("audio stream")
+            print(startup_timer.report())
+            
+            if stt_engine is not None and FAST_START:
+                # Listening already; STT warms up behind the wake-word detector
+                print("🔄 Loading speech-to-text engine in the background...")
+                stt_engine.load_async()
             
             while True:
                 time.sleep(0.1)
@@ -205,13 +339,23 @@ def main():
     except Exception as e:
         print(f"❌ Stream error: {e}")
     finally:
-        # Stop speech-to-text if active
-        if stt_active:
-            stop_speech_to_text()
+        # Stop speech-to-text and release the engine
+        stop_speech_to_text()
+        if stt_engine is not None:
+            stt_engine.shutdown()
+        if stt_proc is not None:
+            stop_stt_process()
         
         # Stop worker thread
-        audio_queue.put(None)
-        worker_thread.join(timeout=1.0)
+        audio_ring.close()
+        if worker_thread is not None:
+            worker_thread.join(timeout=1.0)
+        print(f"📊 Audio buffer: {audio_ring.stats()}")
+        if energy_gate is not None:
+            print(f"📊 Energy gate: {energy_gate.stats()}")
+        if tracer.enabled:
+            print(f"📊 {tracer.report()}")
+            print(f"📊 Trace written to {tracer.export_chrome(trace_path())}")
         print("✅ Shutdown complete")
 
 if __name__ == '__main__':
@@ -0,0 +1,383 @@
+import time
+import threading
+import numpy as np
+from typing import Iterable, List, Optional, Tuple
+
+# Backpressure policies applied when the ring is full
+DROP_OLDEST = "drop_oldest"   # discard the oldest unread chunk
+DROP_NEWEST = "drop_newest"   # discard incoming audio until the reader catches up
+COALESCE = "coalesce"         # discard the whole backlog and keep only the newest chunk
+QUEUE_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity, preallocated int16 ring buffer for the audio capture path.
+
+    The sounddevice callback writes float32 samples into the ring in place,
+    and the worker reads whole chunk slots back out as read-only views.
+    Nothing is allocated per chunk once the buffer has been created.
+
+    Chunks are addressed by a monotonically increasing sequence number; the
+    slot for chunk ``seq`` is ``seq % capacity``. The ring doubles as the
+    bounded capture queue: when it is full, ``policy`` decides what gets
+    dropped, and ``max_latency`` bounds how stale a chunk handed to the
+    reader can be.
+    """
+
+    def __init__(self, chunk_size: int, capacity_chunks: int = 32, max_block_size: int = 4096,
+                 policy: str = DROP_OLDEST, max_latency: Optional[float] = None):
+        """
+        Args:
+            chunk_size: Number of samples per chunk handed to the worker
+            capacity_chunks: Number of chunk slots kept in the ring
+            max_block_size: Largest block converted in one pass (larger blocks are split)
+            policy: One of QUEUE_POLICIES, applied when the ring is full
+            max_latency: Skip chunks captured more than this many seconds ago (None = no limit)
+        """
+        if capacity_chunks < 2:
+            raise ValueError("capacity_chunks must be at least 2")
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+
+        self.chunk_size = chunk_size
+        self.capacity = capacity_chunks
+        self._slots = np.zeros((capacity_chunks, chunk_size), dtype=np.int16)
+        self._scratch = np.zeros(max_block_size, dtype=np.float32)
+        self._timestamps = np.zeros(capacity_chunks, dtype=np.float64)
+        self.policy = policy
+        self.max_latency = max_latency
+
+        # Read-only views handed to the reader, created once up front
+        self._views = []
+        for i in range(capacity_chunks):
+            view = self._slots[i]
+            view.flags.writeable = False
+            self._views.append(view)
+
+        self._write_seq = 0   # sequence number of the chunk being filled
+        self._write_pos = 0   # samples already written into that chunk
+        self._read_seq = 0    # next chunk the reader will get
+        self._held_seq = -1   # chunk whose view the reader currently holds
+
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Stats
+        self.chunks_written = 0
+        self.chunks_read = 0
+        self.overruns = 0          # chunks dropped because the ring was full
+        self.late_drops = 0        # chunks skipped because they exceeded max_latency
+        self.lagging_reads = 0     # reads made while more chunks were already waiting
+        self.last_latency = 0.0    # capture-to-read latency of the last chunk, in seconds
+        self.max_latency_seen = 0.0
+
+    def write_int16(self, samples: np.ndarray) -> None:
+        """Write int16 PCM samples into the ring (for file and socket sources)."""
+        self._write_scaled(samples)
+
+    def write(self, samples: np.ndarray) -> None:
+        """Write float32 samples in [-1, 1] into the ring (called from the audio callback)."""
+        offset = 0
+        total = len(samples)
+        while offset < total:
+            n = min(total - offset, len(self._scratch))
+            scratch = self._scratch[:n]
+            np.multiply(samples[offset:offset + n], 32767, out=scratch)
+            np.clip(scratch, -32768, 32767, out=scratch)
+            self._write_scaled(scratch)
+            offset += n
+
+    def _write_scaled(self, scaled: np.ndarray) -> None:
+        pos = 0
+        total = len(scaled)
+        with self._cond:
+            while pos < total:
+                if self._write_pos == 0 and not self._claim_slot():
+                    # No slot can be reused right now; drop the rest of this block
+                    self.overruns += -(-(total - pos) // self.chunk_size)
+                    return
+                slot = self._write_seq % self.capacity
+                n = min(total - pos, self.chunk_size - self._write_pos)
+                dst = self._slots[slot, self._write_pos:self._write_pos + n]
+                np.copyto(dst, scaled[pos:pos + n], casting='unsafe')
+                self._write_pos += n
+                pos += n
+                if self._write_pos == self.chunk_size:
+                    self._publish()
+
+    def _claim_slot(self) -> bool:
+        """Make the slot for the next chunk writable, applying the queue policy if the ring is full."""
+        reused = self._write_seq - self.capacity
+        if reused < 0:
+            return True
+        if reused == self._held_seq:
+            return False
+        if reused >= self._read_seq:
+            if self.policy == DROP_NEWEST:
+                return False
+            if self.policy == COALESCE:
+                new_read_seq = self._write_seq - 1
+            else:
+                new_read_seq = reused + 1
+            self.overruns += new_read_seq - self._read_seq
+            self._read_seq = new_read_seq
+        return True
+
+    def _publish(self) -> None:
+        self._timestamps[self._write_seq % self.capacity] = time.monotonic()
+        self._write_seq += 1
+        self._write_pos = 0
+        self.chunks_written += 1
+        self._cond.notify()
+
+    def read(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Return a read-only view of the next complete chunk.
+
+        The view stays valid until the next call to read() or release().
+        Returns None on timeout or once the buffer has been closed and drained.
+        """
+        with self._cond:
+            self._held_seq = -1
+            if not self._cond.wait_for(lambda: self._write_seq > self._read_seq or self._closed, timeout):
+                return None
+            if self._write_seq == self._read_seq:
+                return None
+
+            now = time.monotonic()
+            if self.max_latency is not None:
+                # Skip stale chunks, but always hand out the newest one
+                newest = self._write_seq - 1
+                while (self._read_seq < newest and
+                       now - self._timestamps[self._read_seq % self.capacity] > self.max_latency):
+                    self._read_seq += 1
+                    self.late_drops += 1
+
+            seq = self._read_seq
+            self._read_seq += 1
+            self._held_seq = seq
+            self.chunks_read += 1
+            if self._write_seq > self._read_seq:
+                self.lagging_reads += 1
+            self.last_latency = now - float(self._timestamps[seq % self.capacity])
+            if self.last_latency > self.max_latency_seen:
+                self.max_latency_seen = self.last_latency
+        return self._views[seq % self.capacity]
+
+    def copy_history(self, out: np.ndarray) -> int:
+        """
+        Copy the most recently read chunks, oldest first, into ``out``.
+
+        ``out`` is a preallocated (n_chunks, chunk_size) int16 array. The copy
+        ends with the chunk returned by the last read(), so it lines up with
+        whatever the reader gets next. Returns the number of chunks copied,
+        which is smaller than ``len(out)`` if older audio was already overwritten.
+        """
+        with self._cond:
+            end = self._read_seq                                   # exclusive
+            oldest = max(0, self._write_seq - self.capacity + 1)   # the slot being filled is not intact
+            start = max(oldest, end - len(out))
+            count = max(0, end - start)
+            for i in range(count):
+                np.copyto(out[i], self._slots[(start + i) % self.capacity])
+        return count
+
+    def release(self) -> None:
+        """Give the chunk returned by the last read() back to the writer."""
+        with self._cond:
+            self._held_seq = -1
+
+    def close(self) -> None:
+        """Wake up a blocked reader; chunks already written can still be drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Number of complete chunks waiting to be read."""
+        with self._cond:
+            return self._write_seq - self._read_seq
+
+    def stats(self) -> dict:
+        """Return buffer counters for status logging."""
+        with self._cond:
+            return {
+                "chunks_written": self.chunks_written,
+                "chunks_read": self.chunks_read,
+                "overruns": self.overruns,
+                "late_drops": self.late_drops,
+                "lagging_reads": self.lagging_reads,
+                "max_latency_ms": round(self.max_latency_seen * 1000, 1),
+                "pending": self._write_seq - self._read_seq,
+            }
+
+
+class EnergyGate:
+    """
+    Cheap RMS energy gate in front of wake-word inference.
+
+    Chunks below ``threshold_dbfs`` are skipped once the hangover window has
+    run out. Skipped chunks are kept in a small preallocated context ring so
+    that, when the gate opens again, the model can be primed with the audio
+    just before speech started and its streaming feature buffers are not stale.
+    """
+
+    def __init__(self, chunk_size: int, threshold_dbfs: float = -50.0,
+                 hangover_chunks: int = 12, context_chunks: int = 12):
+        """
+        Args:
+            chunk_size: Number of int16 samples per chunk
+            threshold_dbfs: RMS level (dB full scale) above which a chunk counts as sound
+            hangover_chunks: Chunks to keep the gate open after the last loud chunk
+            context_chunks: Skipped chunks replayed into the model when the gate opens
+        """
+        self.chunk_size = chunk_size
+        self.threshold_dbfs = threshold_dbfs
+        self.hangover_chunks = hangover_chunks
+        self.context_chunks = context_chunks
+
+        self._scratch = np.zeros(chunk_size, dtype=np.float32)
+        self._context = np.zeros((max(context_chunks, 1), chunk_size), dtype=np.int16)
+        self._context_count = 0     # skipped chunks currently stored
+        self._context_next = 0      # slot the next skipped chunk goes into
+        self._replay_count = 0      # chunks to hand out from drain_context()
+        self._open_remaining = 0
+
+        # Stats
+        self.evaluated = 0
+        self.skipped = 0
+        self.replayed = 0
+        self.last_dbfs = -120.0
+
+    def level_dbfs(self, chunk: np.ndarray) -> float:
+        """Return the RMS level of an int16 chunk in dB full scale."""
+        scratch = self._scratch[:len(chunk)]
+        np.multiply(chunk, 1.0 / 32768, out=scratch)
+        energy = float(np.dot(scratch, scratch)) / max(len(chunk), 1)
+        return 10.0 * np.log10(energy + 1e-12)
+
+    def check(self, chunk: np.ndarray) -> bool:
+        """
+        Decide whether a chunk should go through inference.
+
+        Returns False for chunks that can be skipped. When the gate opens after
+        skipping, call drain_context() before predicting on this chunk.
+        """
+        self.last_dbfs = self.level_dbfs(chunk)
+
+        if self.last_dbfs >= self.threshold_dbfs:
+            if self._open_remaining == 0:
+                self._replay_count = self._context_count
+            self._open_remaining = self.hangover_chunks + 1
+        if self._open_remaining > 0:
+            self._open_remaining -= 1
+            self.evaluated += 1
+            return True
+
+        self.skipped += 1
+        if self.context_chunks > 0:
+            np.copyto(self._context[self._context_next], chunk)
+            self._context_next = (self._context_next + 1) % self.context_chunks
+            self._context_count = min(self._context_count + 1, self.context_chunks)
+        return False
+
+    def drain_context(self):
+        """Yield stored context chunks (oldest first) to replay into the model, then forget them."""
+        count = self._replay_count
+        start = (self._context_next - count) % max(self.context_chunks, 1)
+        self._replay_count = 0
+        self._context_count = 0
+        for i in range(count):
+            self.replayed += 1
+            yield self._context[(start + i) % self.context_chunks]
+
+    def reset(self) -> None:
+        """Close the gate and drop stored context (e.g. after a detection cooldown)."""
+        self._open_remaining = 0
+        self._context_count = 0
+        self._replay_count = 0
+
+    def stats(self) -> dict:
+        """Return gate counters for status logging."""
+        total = self.evaluated + self.skipped
+        return {
+            "evaluated": self.evaluated,
+            "skipped": self.skipped,
+            "replayed": self.replayed,
+            "skip_ratio": round(self.skipped / total, 3) if total else 0.0,
+        }
+
+
+class WakeWordDetector:
+    """
+    Score smoothing and post-detection cooldown for one audio stream.
+
+    Recent scores for every loaded wake-word model live in one preallocated
+    (models x window) ring with running sums, so smoothing and the threshold
+    test are a couple of vectorized operations per chunk no matter how many
+    wake words are loaded.
+    """
+
+    # Recompute the running sums from the ring this often to cancel float drift
+    RESYNC_INTERVAL = 4096
+
+    def __init__(self, model_names: Iterable[str], threshold: float = 0.5,
+                 smoothing_window: int = 5, cooldown: float = 2.0):
+        self.model_names = list(model_names)
+        self.threshold = threshold
+        self.smoothing_window = smoothing_window
+        self.cooldown = cooldown
+        self.last_detect_time = -float("inf")
+
+        n_models = len(self.model_names)
+        self._index = {name: i for i, name in enumerate(self.model_names)}
+        self._ring = np.zeros((n_models, smoothing_window), dtype=np.float64)
+        self._sums = np.zeros(n_models, dtype=np.float64)
+        self._scores = np.zeros(n_models, dtype=np.float64)
+        self._smoothed = np.zeros(n_models, dtype=np.float64)
+        self._pos = 0
+        self._count = 0
+
+    def in_cooldown(self, now: float) -> bool:
+        return now - self.last_detect_time < self.cooldown
+
+    def update(self, preds: dict, now: float) -> List[Tuple[str, float]]:
+        """
+        Add one chunk's predictions ({model_name: score}).
+
+        Returns (model_name, smoothed_score) for every model at or above the
+        threshold; an empty list means no detection.
+        """
+        for name, score in preds.items():
+            self._scores[self._index[name]] = score
+        return self.update_scores(self._scores, now)
+
+    def update_scores(self, scores: np.ndarray, now: float) -> List[Tuple[str, float]]:
+        """Same as update(), with scores given as an array ordered like ``model_names``."""
+        column = self._ring[:, self._pos]
+        np.subtract(self._sums, column, out=self._sums)
+        np.add(self._sums, scores, out=self._sums)
+        np.copyto(column, scores)
+        self._pos = (self._pos + 1) % self.smoothing_window
+        self._count += 1
+        if self._count % self.RESYNC_INTERVAL == 0:
+            np.sum(self._ring, axis=1, out=self._sums)
+
+        if self._count >= self.smoothing_window:
+            np.divide(self._sums, self.smoothing_window, out=self._smoothed)
+        else:
+            np.copyto(self._smoothed, scores)
+
+        hits = np.flatnonzero(self._smoothed >= self.threshold)
+        if hits.size == 0:
+            return []
+        self.last_detect_time = now
+        return [(self.model_names[i], float(self._smoothed[i])) for i in hits]
+
+    def reset(self) -> None:
+        """Forget score history (e.g. when switching to a different audio stream)."""
+        self._ring.fill(0.0)
+        self._sums.fill(0.0)
+        self._pos = 0
+        self._count = 0
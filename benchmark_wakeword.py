@@ -0,0 +1,251 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import wave
+import numpy as np
+from typing import Dict, List, Optional
+
+from audio_pipeline import AudioRingBuffer, EnergyGate, WakeWordDetector
+
+# === Audio parameters (same as app1.py) ===
+SR = 16000
+CHUNK_DURATION_MS = 80
+CHUNK_SIZE = int(SR * CHUNK_DURATION_MS / 1000)
+
+# Detection parameters (same as app1.py)
+DETECTION_THRESHOLD = 0.5
+POST_DETECT_COOLDOWN = 2.0
+SMOOTHING_WINDOW = 5
+
+# A detection within this many seconds after a labeled wake word counts as a hit
+MAX_DETECTION_DELAY = 3.0
+
+
+def load_audio(path: str) -> np.ndarray:
+    """Load a 16 kHz mono WAV (16-bit) or NPY file; returns int16 or float32 samples."""
+    if path.endswith(".npy"):
+        audio = np.load(path)
+        if audio.ndim > 1:
+            audio = audio[:, 0]
+        if audio.dtype != np.int16:
+            audio = audio.astype(np.float32)
+        return audio
+
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != SR or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz 16-bit PCM")
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        if wf.getnchannels() > 1:
+            audio = audio.reshape(-1, wf.getnchannels())[:, 0]
+        return audio
+
+
+def load_labels(path: Optional[str]) -> Dict[str, List[float]]:
+    """
+    Load wake-word offsets (seconds) keyed by file name.
+
+    The labels file is JSON: {"clip1.wav": [1.2, 8.5], "noise.npy": []}.
+    Files without an entry are treated as containing no wake words.
+    """
+    if not path:
+        return {}
+    with open(path) as f:
+        labels = json.load(f)
+    return {os.path.basename(k): sorted(float(t) for t in v) for k, v in labels.items()}
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class WakeWordBenchmark:
+    """
+    Replay audio through the same chunking, prediction, smoothing and cooldown
+    path as app1.py's worker, driven by audio time instead of the wall clock.
+    """
+
+    def __init__(self, wakeword_models=("alexa",), use_energy_gate: bool = False,
+                 threshold: float = DETECTION_THRESHOLD):
+        from openwakeword.model import Model
+
+        self.model = Model(wakeword_models=list(wakeword_models),
+                           enable_speex_noise_suppression=False,
+                           inference_framework='onnx',
+                           vad_threshold=0.2)
+        self.use_energy_gate = use_energy_gate
+        self.threshold = threshold
+
+        self.chunk_latencies = []
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.detection_delays = []
+        self.false_accepts = 0
+        self.misses = 0
+        self.labeled = 0
+        self.skipped_chunks = 0
+
+    def run_file(self, path: str, offsets: List[float]) -> dict:
+        audio = load_audio(path)
+        ring = AudioRingBuffer(CHUNK_SIZE, capacity_chunks=4, max_latency=None)
+        gate = EnergyGate(CHUNK_SIZE) if self.use_energy_gate else None
+        detector = WakeWordDetector(self.model.models, threshold=self.threshold,
+                                    smoothing_window=SMOOTHING_WINDOW,
+                                    cooldown=POST_DETECT_COOLDOWN)
+        self.model.reset()
+
+        detections = []
+        start = time.perf_counter()
+        n_chunks = len(audio) // CHUNK_SIZE
+        for i in range(n_chunks):
+            block = audio[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE]
+            if block.dtype == np.int16:
+                ring.write_int16(block)
+            else:
+                ring.write(block)
+            chunk = ring.read(timeout=0)
+            now = (i + 1) * CHUNK_SIZE / SR   # audio time at the end of this chunk
+
+            if detector.in_cooldown(now):
+                continue
+            if gate is not None:
+                if not gate.check(chunk):
+                    continue
+                for context_chunk in gate.drain_context():
+                    self.model.predict(context_chunk)
+
+            t0 = time.perf_counter()
+            preds = self.model.predict(chunk)
+            self.chunk_latencies.append(time.perf_counter() - t0)
+
+            for name, score in detector.update(preds, now):
+                detections.append((now, name, score))
+
+        elapsed = time.perf_counter() - start
+        duration = n_chunks * CHUNK_SIZE / SR
+        self.wall_seconds += elapsed
+        self.audio_seconds += duration
+        if gate is not None:
+            self.skipped_chunks += gate.skipped
+
+        # Match detections to labels: the first detection inside each label's window is a hit
+        remaining = list(offsets)
+        hits, false_accepts = 0, 0
+        for det_time, _, _ in detections:
+            match = next((t for t in remaining if 0.0 <= det_time - t <= MAX_DETECTION_DELAY), None)
+            if match is None:
+                false_accepts += 1
+            else:
+                remaining.remove(match)
+                hits += 1
+                self.detection_delays.append(det_time - match)
+        self.false_accepts += false_accepts
+        self.misses += len(remaining)
+        self.labeled += len(offsets)
+
+        return {
+            "file": path,
+            "audio_seconds": round(duration, 2),
+            "realtime_factor": round(duration / elapsed, 1) if elapsed else None,
+            "detections": [{"time": round(t, 2), "model": m, "score": round(s, 3)} for t, m, s in detections],
+            "hits": hits,
+            "misses": len(remaining),
+            "false_accepts": false_accepts,
+        }
+
+    def report(self, files: List[dict]) -> dict:
+        latencies_ms = [t * 1000 for t in self.chunk_latencies]
+        delays_ms = [d * 1000 for d in self.detection_delays]
+        hours = self.audio_seconds / 3600
+        return {
+            "files": files,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "throughput_audio_s_per_wall_s": round(self.audio_seconds / self.wall_seconds, 1) if self.wall_seconds else None,
+            "chunks_predicted": len(latencies_ms),
+            "chunks_skipped_by_gate": self.skipped_chunks,
+            "inference_latency_ms": {
+                "p50": round(percentile(latencies_ms, 50), 3),
+                "p99": round(percentile(latencies_ms, 99), 3),
+                "max": round(max(latencies_ms), 3) if latencies_ms else 0.0,
+            },
+            "detection_delay_ms": {
+                "p50": round(percentile(delays_ms, 50), 1),
+                "p99": round(percentile(delays_ms, 99), 1),
+            },
+            "labeled_wake_words": self.labeled,
+            "recall": round((self.labeled - self.misses) / self.labeled, 3) if self.labeled else None,
+            "false_accepts": self.false_accepts,
+            "false_accepts_per_hour": round(self.false_accepts / hours, 2) if hours else 0.0,
+        }
+
+
+def collect_files(inputs: List[str]) -> List[str]:
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files += sorted(glob.glob(os.path.join(item, "*.wav")) + glob.glob(os.path.join(item, "*.npy")))
+        else:
+            files.append(item)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the wake word worker")
+    parser.add_argument("inputs", nargs="+", help="WAV/NPY files or directories containing them")
+    parser.add_argument("--labels", help="JSON file mapping file names to wake word offsets in seconds")
+    parser.add_argument("--model", action="append", default=[], help="Wake word model (default: alexa)")
+    parser.add_argument("--threshold", type=float, default=DETECTION_THRESHOLD)
+    parser.add_argument("--gate", action="store_true", help="Run with the energy gate enabled")
+    parser.add_argument("--json", metavar="PATH", help="Write the report as JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if p99 inference latency exceeds this")
+    parser.add_argument("--max-fa-per-hour", type=float, help="Fail if false accepts per hour exceed this")
+    parser.add_argument("--min-recall", type=float, help="Fail if recall on labeled files is below this")
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs)
+    if not files:
+        print("❌ No WAV/NPY files found")
+        sys.exit(2)
+    labels = load_labels(args.labels)
+
+    print(f"🔄 Loading models and replaying {len(files)} file(s)...")
+    bench = WakeWordBenchmark(wakeword_models=args.model or ["alexa"],
+                              use_energy_gate=args.gate, threshold=args.threshold)
+    results = []
+    for path in files:
+        result = bench.run_file(path, labels.get(os.path.basename(path), []))
+        print(f"   - {path}: {result['audio_seconds']}s audio, x{result['realtime_factor']} realtime, "
+              f"hits={result['hits']} misses={result['misses']} false_accepts={result['false_accepts']}")
+        results.append(result)
+
+    report = bench.report(results)
+    print(f"📊 Throughput: {report['throughput_audio_s_per_wall_s']} audio-s/wall-s")
+    print(f"📊 Inference latency: p50={report['inference_latency_ms']['p50']} ms "
+          f"p99={report['inference_latency_ms']['p99']} ms")
+    print(f"📊 Detection delay: p50={report['detection_delay_ms']['p50']} ms "
+          f"p99={report['detection_delay_ms']['p99']} ms")
+    print(f"📊 Recall: {report['recall']} | False accepts/hour: {report['false_accepts_per_hour']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.json}")
+
+    failures = []
+    if args.max_p99_ms is not None and report["inference_latency_ms"]["p99"] > args.max_p99_ms:
+        failures.append(f"p99 latency {report['inference_latency_ms']['p99']} ms > {args.max_p99_ms} ms")
+    if args.max_fa_per_hour is not None and report["false_accepts_per_hour"] > args.max_fa_per_hour:
+        failures.append(f"false accepts/hour {report['false_accepts_per_hour']} > {args.max_fa_per_hour}")
+    if args.min_recall is not None and report["recall"] is not None and report["recall"] < args.min_recall:
+        failures.append(f"recall {report['recall']} < {args.min_recall}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from tracing import get_tracer
+
+
+class CommandScheduler:
+    """
+    Run voice commands with bounded concurrency and barge-in cancellation.
+
+    Each command belongs to a session (one per microphone/user). When a new
+    command arrives for a session, the command still running or waiting
+    there is cancelled, so "play Queen... no, pause" does not execute both.
+    Cancellation is delivered as asyncio.CancelledError into the processor,
+    which propagates it to the in-flight LLM and Spotify calls.
+
+    Must be used from the event loop the commands run on.
+    """
+
+    def __init__(self, processor, max_concurrency: int = 2, cancel_superseded: bool = True):
+        """
+        Args:
+            processor: VoiceCommandProcessor (anything with async process_voice_command(text, session=...))
+            max_concurrency: Maximum commands executing at once; the rest wait in line
+            cancel_superseded: Cancel a session's previous command when a new one arrives
+        """
+        self.processor = processor
+        self.max_concurrency = max_concurrency
+        self.cancel_superseded = cancel_superseded
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._current: Dict[str, asyncio.Task] = {}   # session -> latest command task
+        self._queued = set()                           # tasks not yet admitted by the semaphore
+        self._wait_times = deque(maxlen=500)
+        self.tracer = get_tracer()
+
+        # Stats
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.superseded = 0
+        self.running = 0
+
+    def schedule(self, text: str, session: str = "default") -> asyncio.Task:
+        """Start a command; returns its task (result dict, or CancelledError if superseded)."""
+        previous = self._current.get(session)
+        if self.cancel_superseded and previous is not None and not previous.done():
+            print(f"Cancelling superseded command in session '{session}'")
+            previous.cancel()
+            self.superseded += 1
+
+        self.submitted += 1
+        task = asyncio.ensure_future(self._run(text, session, time.perf_counter()))
+        self._queued.add(task)
+        self._current[session] = task
+        task.add_done_callback(lambda t, session=session: self._finished(session, t))
+        return task
+
+    def cancel(self, session: str = "default") -> bool:
+        """Cancel the session's in-flight command (explicit barge-in); returns True if one was cancelled."""
+        task = self._current.get(session)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def _run(self, text: str, session: str, queued_at: float) -> Dict[str, Any]:
+        # A task cancelled before its first step never enters this coroutine,
+        # so the outcome counts are kept in _finished() rather than here
+        await self._semaphore.acquire()
+        self._queued.discard(asyncio.current_task())
+
+        started_at = time.perf_counter()
+        self._wait_times.append(started_at - queued_at)
+        self.tracer.record("command.queue", queued_at, started_at)
+        self.running += 1
+        try:
+            result = await self.processor.process_voice_command(text, session=session)
+        except asyncio.CancelledError:
+            print(f"Command cancelled: '{text}'")
+            raise
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+        return result
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queued)
+
+    def _finished(self, session: str, task: asyncio.Task):
+        self._queued.discard(task)
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        if self._current.get(session) is task:
+            del self._current[session]
+
+    def stats(self) -> Dict[str, Any]:
+        waits = np.asarray(self._wait_times) * 1000 if self._wait_times else None
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "superseded": self.superseded,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "wait_ms_p50": float(np.percentile(waits, 50)) if waits is not None else 0.0,
+            "wait_ms_p95": float(np.percentile(waits, 95)) if waits is not None else 0.0,
+            "wait_ms_max": float(waits.max()) if waits is not None else 0.0,
+        }
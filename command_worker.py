@@ -0,0 +1,191 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from command_scheduler import CommandScheduler
+from tracing import current_trace_id, get_tracer
+
+
+class CommandWorker:
+    """
+    Long-lived background event loop that owns one VoiceCommandProcessor.
+
+    The processor (and with it the LLM client and the pooled Spotify session)
+    is built once, on the worker's own thread. Transcripts are handed over
+    through a thread-safe queue with ``submit``, which returns a
+    ``concurrent.futures.Future`` immediately, so the STT thread never blocks
+    on the LLM or HTTP calls. Commands are run by a CommandScheduler: up to
+    ``max_concurrency`` at once, and a new command cancels the one still
+    running in the same session (barge-in). A cancelled command's future
+    resolves to a result dict with ``"cancelled": True``.
+
+    A command runs in the trace that was current when it was submitted (e.g.
+    the one the STT engine opened at wake-word time), and so does its callback.
+    """
+
+    def __init__(self, processor_factory: Optional[Callable[[], Any]] = None,
+                 max_concurrency: int = 2, cancel_superseded: bool = True):
+        """
+        Args:
+            processor_factory: Builds the processor (default: VoiceCommandProcessor());
+                called on the worker thread
+            max_concurrency: Maximum commands executing at once
+            cancel_superseded: Cancel a session's running command when a new one arrives
+        """
+        self.processor_factory = processor_factory
+        self.max_concurrency = max_concurrency
+        self.cancel_superseded = cancel_superseded
+        self.processor = None
+        self.scheduler: Optional[CommandScheduler] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[BaseException] = None
+        # Result callbacks run here so slow feedback (e.g. TTS) never blocks the loop
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command-feedback")
+        self.tracer = get_tracer()
+
+        # Stats
+        self.submitted = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self.processor is not None
+
+    def start(self, timeout: Optional[float] = None) -> bool:
+        """Start the worker thread and build the processor; returns True once it is ready."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="command-worker", daemon=True)
+            self._thread.start()
+        self._ready.wait(timeout)
+        if self._start_error is not None:
+            print(f"Command worker failed to start: {self._start_error}")
+        return self.running
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._setup())
+        except BaseException as e:
+            self._start_error = e
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_until_complete(self._consume())
+        finally:
+            self.loop.run_until_complete(self._teardown())
+            self.loop.close()
+
+    async def _setup(self):
+        self._queue = asyncio.Queue()
+        if self.processor_factory is not None:
+            self.processor = self.processor_factory()
+        else:
+            from voice_command_processor import VoiceCommandProcessor
+            self.processor = VoiceCommandProcessor()
+        await self.processor.initialize()
+        self.scheduler = CommandScheduler(self.processor, self.max_concurrency, self.cancel_superseded)
+
+    async def _consume(self):
+        tasks = set()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            text, session, future, callback, trace_id = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            # The task copies the current context, so the whole command runs in this trace
+            with self.tracer.trace(trace_id):
+                task = self.scheduler.schedule(text, session)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda t, text=text, future=future, callback=callback, trace_id=trace_id:
+                                   self._finish(t, text, future, callback, trace_id))
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def _finish(self, task: asyncio.Task, text: str, future: Future,
+                callback: Optional[Callable[[Future], None]], trace_id: str):
+        if task.cancelled():
+            future.set_result({
+                "success": False,
+                "cancelled": True,
+                "response": "",
+                "action_taken": "cancelled",
+                "tool_called": None,
+                "command": text
+            })
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+        if callback is not None:
+            self._callbacks.submit(self._run_callback, callback, future, trace_id)
+
+    def _run_callback(self, callback: Callable[[Future], None], future: Future, trace_id: str):
+        try:
+            with self.tracer.trace(trace_id):
+                callback(future)
+        except Exception as e:
+            print(f"Command callback error: {e}")
+
+    async def _teardown(self):
+        if self.processor is not None and hasattr(self.processor, "aclose"):
+            try:
+                await self.processor.aclose()
+            except Exception as e:
+                print(f"Command worker shutdown error: {e}")
+
+    def submit(self, text: str, callback: Optional[Callable[[Future], None]] = None,
+               session: str = "default", trace_id: Optional[str] = None) -> Future:
+        """
+        Queue a transcript for processing; safe to call from any thread.
+
+        Args:
+            text: Final transcript of the voice command
+            callback: Called with the finished future on a separate feedback thread
+            session: Commands in the same session supersede each other
+            trace_id: Trace to run the command in (default: the caller's current trace, or a new one)
+
+        Returns:
+            Future resolving to the processor's result dict
+        """
+        if not self.running:
+            raise RuntimeError("CommandWorker is not running; call start() first")
+        future: Future = Future()
+        self.submitted += 1
+        trace_id = trace_id or current_trace_id() or self.tracer.new_trace_id()
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, (text, session, future, callback, trace_id))
+        return future
+
+    def cancel(self, session: str = "default"):
+        """Cancel the session's in-flight command (barge-in); safe to call from any thread."""
+        if self.running:
+            self.loop.call_soon_threadsafe(self.scheduler.cancel, session)
+
+    def submit_partial(self, text: str, session: str = "default"):
+        """Forward a partial transcript to the processor (speculative search); safe from any thread."""
+        if self.running and hasattr(self.processor, "on_partial_transcript"):
+            self.loop.call_soon_threadsafe(self.processor.on_partial_transcript, text, session)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Finish the queued commands, close the processor and stop the thread."""
+        if self._thread is None:
+            return
+        if self.loop is not None and self._thread.is_alive() and self._queue is not None:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        self._thread.join(timeout)
+        self._callbacks.shutdown(wait=False)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"submitted": self.submitted, "queued": self._queue.qsize() if self._queue is not None else 0}
+        if self.scheduler is not None:
+            stats.update(self.scheduler.stats())
+        return stats
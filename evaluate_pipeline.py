@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+
+from command_scheduler import CommandScheduler
+from llm_backends import LatencyModel, StubBackend, make_backend
+from spotify_tools import SpotifyTools
+from track_index import TrackIndex
+from tracing import get_tracer
+from voice_agent import SpotifyVoiceAgent
+from voice_command_processor import VoiceCommandProcessor
+
+# Stages recorded by VoiceCommandProcessor in result["timings"]
+STAGES = ["analyze", "tools", "respond", "play", "total"]
+
+# Used when no transcript file is given (the phrases test_voice_processor runs)
+SAMPLE_TRANSCRIPTS = [
+    {"text": "pause the music", "intent": "pause"},
+    {"text": "play some music", "intent": "play"},
+    {"text": "search for Bohemian Rhapsody by Queen", "intent": "search"},
+    {"text": "find songs by The Beatles", "intent": "search"},
+    {"text": "stop playing", "intent": "pause"},
+    {"text": "resume the music", "intent": "play"},
+    {"text": "pause and then search for take five", "intent": ["pause", "search"]},
+    {"text": "what's the weather like", "intent": "none"},
+]
+
+SAMPLE_CATALOG = [
+    ("Bohemian Rhapsody", "Queen", "A Night at the Opera"),
+    ("Don't Stop Me Now", "Queen", "Jazz"),
+    ("Hey Jude", "The Beatles", "Hey Jude"),
+    ("Let It Be", "The Beatles", "Let It Be"),
+    ("Take Five", "Dave Brubeck", "Time Out"),
+    ("So What", "Miles Davis", "Kind of Blue"),
+    ("Blinding Lights", "The Weeknd", "After Hours"),
+    ("Smells Like Teen Spirit", "Nirvana", "Nevermind"),
+]
+
+
+def sample_catalog() -> List[Dict[str, Any]]:
+    """Spotify-shaped track dicts for the built-in catalog."""
+    tracks = []
+    for i, (name, artist, album) in enumerate(SAMPLE_CATALOG):
+        track_id = f"stub{i:04d}"
+        tracks.append({
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": name,
+            "artists": [{"name": artist}],
+            "album": {"name": album},
+        })
+    return tracks
+
+
+def load_transcripts(path: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Load labeled transcripts from a JSONL file.
+
+    Each line is {"text": "...", "intent": "search"} where intent is a tool
+    name, a list of tool names for multi-step commands, or "none" for
+    commands that should not call a tool. "intent" may be omitted for
+    unlabeled transcripts; "id" is optional.
+    """
+    if not path:
+        return [dict(item) for item in SAMPLE_TRANSCRIPTS]
+    items = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("text"):
+                raise ValueError(f"{path}:{line_no}: missing \"text\"")
+            items.append(item)
+    return items
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class StubSpotifyServer:
+    """
+    Local stand-in for the Express server's /player routes.
+
+    Serves searches from a fixed catalog and accepts playback commands, with
+    per-request latency drawn from a LatencyModel, so SpotifyTools runs its
+    real HTTP path (pooling, coalescing, circuit breaker) without Spotify.
+    """
+
+    def __init__(self, catalog: Optional[List[Dict[str, Any]]] = None,
+                 latency: Optional[LatencyModel] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            catalog: Spotify-shaped track dicts to search (default: a small built-in catalog)
+            latency: Latency added to every request (default: none)
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+        """
+        self.catalog = catalog if catalog is not None else sample_catalog()
+        self.latency = latency or LatencyModel()
+        self.host = host
+        self.port = port
+        self.requests = Counter()
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/player/stop", self._ok)
+        self.app.router.add_post("/player/play", self._ok)
+        self.app.router.add_post("/player/play/search", self._play_search)
+        self.app.router.add_get("/player/search", self._search)
+
+    async def start(self) -> str:
+        """Start listening; returns the base URL to give SpotifyTools."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self, request: web.Request):
+        self.requests[f"{request.method} {request.path}"] += 1
+        await asyncio.sleep(self.latency.sample())
+
+    async def _ok(self, request: web.Request) -> web.Response:
+        await self._delay(request)
+        return web.Response(text="OK")
+
+    async def _play_search(self, request: web.Request) -> web.Response:
+        await self._delay(request)
+        body = await request.json()
+        if not body.get("uri"):
+            return web.Response(status=400, text="No track URI provided")
+        return web.Response(text="Searched track playback started")
+
+    async def _search(self, request: web.Request) -> web.Response:
+        await self._delay(request)
+        query = request.query.get("query")
+        if not query:
+            return web.Response(status=400, text="No search query provided")
+        words = re.findall(r"\w+", query.lower())
+        scored = []
+        for track in self.catalog:
+            text = " ".join([track.get("name", ""), (track.get("artists") or [{}])[0].get("name", ""),
+                             (track.get("album") or {}).get("name", "")]).lower()
+            hits = sum(1 for word in words if word in text)
+            if hits:
+                scored.append((hits, track))
+        scored.sort(key=lambda pair: -pair[0])
+        return web.json_response([track for _, track in scored[:10]])
+
+
+class PipelineEvaluator:
+    """
+    Run labeled transcripts through VoiceCommandProcessor with bounded concurrency.
+
+    Commands are scheduled through a CommandScheduler (one session per
+    transcript, so nothing is superseded) and the per-stage timings the
+    processor records are aggregated into a report.
+    """
+
+    def __init__(self, processor: VoiceCommandProcessor, concurrency: int = 4, verbose: bool = False):
+        """
+        Args:
+            processor: Processor to evaluate (typically wired to stub backends)
+            concurrency: Maximum commands in flight at once
+            verbose: Show the pipeline's own log output
+        """
+        self.processor = processor
+        self.concurrency = concurrency
+        self.verbose = verbose
+        self.scheduler = CommandScheduler(processor, max_concurrency=concurrency, cancel_superseded=False)
+        self.tracer = get_tracer()
+        self.wall_seconds = 0.0
+
+    def _intents(self, intent) -> List[str]:
+        """Normalize a label or prediction to a list of canonical tool names (["none"] for no tool)."""
+        if intent is None:
+            return ["none"]
+        names = [intent] if isinstance(intent, str) else list(intent)
+        names = [self.processor.tool_registry.canonical_name(name) or "none" for name in names]
+        return names or ["none"]
+
+    def _predicted(self, result: Dict[str, Any]) -> List[str]:
+        if result.get("tools_called"):
+            return self._intents(result["tools_called"])
+        return self._intents(result.get("tool_called"))
+
+    async def _run_one(self, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        record = {"id": item.get("id", index), "text": item["text"]}
+        # One trace per command; the scheduled task inherits it
+        with self.tracer.trace() as trace_id:
+            task = self.scheduler.schedule(item["text"], session=f"eval-{index}")
+        if self.tracer.enabled:
+            record["trace_id"] = trace_id
+        try:
+            result = await task
+        except Exception as e:
+            record.update({"success": False, "error": f"{type(e).__name__}: {e}", "timings": {}})
+            return record
+        record.update({
+            "success": result.get("success", False),
+            "predicted": self._predicted(result),
+            "response": result.get("response"),
+            "final_action": result.get("final_action"),
+            "timings": result.get("timings", {}),
+            "stage_sources": result.get("stage_sources", {}),
+        })
+        if result.get("error"):
+            record["error"] = result["error"]
+        if "intent" in item:
+            record["expected"] = self._intents(item["intent"])
+            record["correct"] = record["expected"] == record["predicted"]
+        return record
+
+    async def run(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process all items (concurrency-limited) and return one record per item, in input order."""
+        output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        await self.processor.initialize()
+        start = time.perf_counter()
+        with output:
+            records = await asyncio.gather(*(self._run_one(i, item) for i, item in enumerate(items)))
+        self.wall_seconds += time.perf_counter() - start
+        return list(records)
+
+    def report(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        stage_ms = {}
+        for stage in STAGES:
+            values = [r["timings"][stage] for r in records if stage in r.get("timings", {})]
+            stage_ms[stage] = {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2),
+                "max": round(max(values), 2) if values else 0.0,
+            }
+
+        sources = defaultdict(Counter)
+        for r in records:
+            for stage, source in r.get("stage_sources", {}).items():
+                sources[stage][source] += 1
+
+        labeled = [r for r in records if "correct" in r]
+        confusion = defaultdict(Counter)
+        per_intent = defaultdict(lambda: [0, 0])
+        for r in labeled:
+            expected, predicted = "+".join(r["expected"]), "+".join(r["predicted"])
+            confusion[expected][predicted] += 1
+            per_intent[expected][0] += int(r["correct"])
+            per_intent[expected][1] += 1
+
+        succeeded = sum(1 for r in records if r["success"])
+        return {
+            "commands": len(records),
+            "concurrency": self.concurrency,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "throughput_commands_per_s": round(len(records) / self.wall_seconds, 2) if self.wall_seconds else None,
+            "success_rate": round(succeeded / len(records), 3) if records else None,
+            "stage_latency_ms": stage_ms,
+            "stage_sources": {stage: dict(counts) for stage, counts in sources.items()},
+            "labeled": len(labeled),
+            "intent_accuracy": round(sum(r["correct"] for r in labeled) / len(labeled), 3) if labeled else None,
+            "intent_accuracy_by_label": {label: round(c / n, 3) for label, (c, n) in sorted(per_intent.items())},
+            "confusion": {label: dict(counts) for label, counts in sorted(confusion.items())},
+            "scheduler": self.scheduler.stats(),
+            "trace_latency_ms": self.tracer.stats() if self.tracer.enabled else None,
+            "spotify_tools": self.processor.spotify_tools.stats(),
+            "errors": [{"id": r["id"], "text": r["text"], "error": r["error"]} for r in records if r.get("error")],
+            "records": records,
+        }
+
+
+def build_processor(args: argparse.Namespace, base_url: str) -> VoiceCommandProcessor:
+    if args.llm == "stub":
+        llm = StubBackend(LatencyModel(args.llm_latency_ms / 1000, args.llm_jitter_ms / 1000,
+                                       args.llm_dist, seed=args.seed))
+    else:
+        llm = make_backend(args.llm)
+    agent = SpotifyVoiceAgent(use_local_intents=not args.no_local_intents,
+                              cache_responses=not args.no_llm_cache, llm_backend=llm)
+    # A fresh in-memory index keeps runs repeatable and the user's on-disk index untouched
+    track_index = None if args.no_track_index else TrackIndex(":memory:")
+    tools = SpotifyTools(base_url=base_url, track_index=track_index, use_track_index=False)
+    return VoiceCommandProcessor(stream_llm=not args.no_stream, template_responses=not args.no_templates,
+                                 voice_agent=agent, spotify_tools=tools)
+
+
+async def evaluate(args: argparse.Namespace, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    catalog = None
+    if args.catalog:
+        with open(args.catalog) as f:
+            catalog = json.load(f)
+    server = StubSpotifyServer(catalog, LatencyModel(args.spotify_latency_ms / 1000, args.spotify_jitter_ms / 1000,
+                                                     args.spotify_dist, seed=args.seed))
+    base_url = args.spotify_url or await server.start()
+    processor = build_processor(args, base_url)
+    evaluator = PipelineEvaluator(processor, concurrency=args.concurrency, verbose=args.verbose)
+    try:
+        if args.warmup:
+            await evaluator.run(items[:args.warmup])
+            evaluator.wall_seconds = 0.0
+            evaluator.tracer.clear()
+        records = []
+        for _ in range(args.repeat):
+            records += await evaluator.run(items)
+        report = evaluator.report(records)
+    finally:
+        await processor.aclose()
+        await server.stop()
+    if args.trace:
+        print(f"✅ Chrome trace written to {get_tracer().export_chrome(args.trace)}")
+    report["llm_backend"] = processor.voice_agent.wrapped_llm.name
+    report["stub_spotify_requests"] = dict(server.requests)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch evaluation of the voice command pipeline")
+    parser.add_argument("transcripts", nargs="?", help="JSONL file of {\"text\", \"intent\"} (default: built-in samples)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Commands in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the transcripts this many times")
+    parser.add_argument("--warmup", type=int, default=0, help="Unmeasured commands to run first")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the latency models")
+    parser.add_argument("--llm", default="stub", help="LLM backend: stub, replay, record or gemini")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-dist", default="lognormal", help="fixed, uniform, normal or lognormal")
+    parser.add_argument("--spotify-url", help="Use a real Express server instead of the stub")
+    parser.add_argument("--catalog", help="JSON list of Spotify track dicts for the stub server")
+    parser.add_argument("--spotify-latency-ms", type=float, default=80.0)
+    parser.add_argument("--spotify-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--spotify-dist", default="lognormal", help="fixed, uniform, normal or lognormal")
+    parser.add_argument("--no-local-intents", action="store_true", help="Send every command to the LLM")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Disable the LLM response cache")
+    parser.add_argument("--no-templates", action="store_true", help="Always make the second LLM pass")
+    parser.add_argument("--no-stream", action="store_true", help="Don't start tools while the LLM streams")
+    parser.add_argument("--no-track-index", action="store_true", help="Always search over HTTP")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's log output")
+    parser.add_argument("--json", metavar="PATH", help="Write the report as JSON")
+    parser.add_argument("--trace", metavar="PATH", help="Record latency spans and write a Chrome trace")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if p99 total command latency exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Fail if commands/s is below this")
+    parser.add_argument("--min-accuracy", type=float, help="Fail if intent accuracy on labeled items is below this")
+    args = parser.parse_args()
+
+    if args.trace:
+        get_tracer().enabled = True
+    items = load_transcripts(args.transcripts)
+    if not items:
+        print("❌ No transcripts found")
+        sys.exit(2)
+
+    print(f"🔄 Evaluating {len(items)} transcript(s) x{args.repeat} with concurrency {args.concurrency}...")
+    report = asyncio.run(evaluate(args, items))
+
+    total = report["stage_latency_ms"]["total"]
+    print(f"📊 Throughput: {report['throughput_commands_per_s']} commands/s "
+          f"({report['commands']} in {report['wall_seconds']}s)")
+    for stage in STAGES:
+        stats = report["stage_latency_ms"][stage]
+        if stats["count"]:
+            print(f"📊 {stage:>8}: p50={stats['p50']} ms p95={stats['p95']} ms p99={stats['p99']} ms (n={stats['count']})")
+    print(f"📊 Success rate: {report['success_rate']} | Intent accuracy: {report['intent_accuracy']} "
+          f"({report['labeled']} labeled)")
+    for label, counts in report["confusion"].items():
+        wrong = {predicted: n for predicted, n in counts.items() if predicted != label}
+        if wrong:
+            print(f"   - {label} misclassified as {wrong}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.json}")
+
+    failures = []
+    if args.max_p99_ms is not None and total["p99"] > args.max_p99_ms:
+        failures.append(f"p99 command latency {total['p99']} ms > {args.max_p99_ms} ms")
+    if args.min_throughput is not None and (report["throughput_commands_per_s"] or 0) < args.min_throughput:
+        failures.append(f"throughput {report['throughput_commands_per_s']} commands/s < {args.min_throughput}")
+    if args.min_accuracy is not None and report["intent_accuracy"] is not None and report["intent_accuracy"] < args.min_accuracy:
+        failures.append(f"intent accuracy {report['intent_accuracy']} < {args.min_accuracy}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a backend is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests are rejected immediately for ``reset_timeout`` seconds. Then one
+    trial request is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+        # Stats
+        self.rejected = 0
+        self.trips = 0
+
+    def before_request(self):
+        """Raise CircuitOpenError if the request must not be attempted."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit open, retrying in {self.retry_in():.1f}s")
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError("circuit half-open, trial request in flight")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """The request was abandoned without an outcome; let another trial through."""
+        self._trial_in_flight = False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class LatencyTracker:
+    """Rolling window of request latencies for computing hedge delays."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the pct-th percentile, or None until min_samples have been seen."""
+        if len(self.samples) < self.min_samples:
+            return None
+        return float(np.percentile(self.samples, pct))
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls.
+
+    Concurrent ``do`` calls with the same key share one underlying task. A
+    cancelled caller only detaches itself; the shared call is cancelled when
+    its last caller goes away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, list] = {}   # key -> [task, waiter count]
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(factory())
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        except asyncio.CancelledError:
+            if call[1] == 1:
+                call[0].cancel()
+            raise
+        finally:
+            call[1] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+
+async def hedged(factory: Callable[[], Awaitable[Any]], delay: Optional[float]) -> Any:
+    """
+    Run ``factory()``; if it has not finished after ``delay`` seconds, start a
+    second identical attempt and return whichever succeeds first (the other is
+    cancelled). Only use for idempotent requests.
+    """
+    tasks = [asyncio.ensure_future(factory())]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(factory()))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # A failed attempt only counts if there is nothing left to wait for
+                if task.exception() is None or not pending:
+                    return task.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
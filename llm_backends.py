@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Prompt lines that change between runs without changing the meaning
+_VOLATILE_LINES = re.compile(r"^Current date:.*$", re.MULTILINE)
+
+# Utterances the stub treats as music requests when the classifier is unsure
+_MUSIC_REQUEST = re.compile(r"^(?:play|put on|queue|search|find|look|listen)\b|"
+                            r"\b(?:music|songs?|tracks?|albums?|artists?|band|playlist|by)\b", re.IGNORECASE)
+
+
+class LLMBackend:
+    """
+    Interface the voice agent uses to talk to a language model.
+
+    Subclasses implement ``generate`` (blocking); ``acall`` and ``astream``
+    default to running it in a thread pool and yielding the whole text at once.
+    """
+
+    name = "base"
+    # Shared fallback pool for blocking generate() calls
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+
+    def __init__(self, max_concurrent: int = 4):
+        self.max_concurrent = max_concurrent
+        self._semaphore = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def __call__(self, prompt, **kwargs):
+        return self.generate(prompt)
+
+    async def acall(self, prompt: str, timeout: Optional[float] = None, **kwargs) -> str:
+        """Non-blocking generate; raises asyncio.TimeoutError after `timeout` seconds."""
+        async with self._limit():
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, self.generate, prompt), timeout)
+
+    async def astream(self, prompt: str, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """Yield response text as it is generated; the whole stream must finish within `timeout`."""
+        yield await self.acall(prompt, timeout=timeout)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK."""
+
+    name = "gemini"
+
+    def __init__(self, model_name="gemini-2.0-flash", temperature=0.70, max_tokens=1500,
+                 max_concurrent=4, api_key: Optional[str] = None):
+        super().__init__(max_concurrent)
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.environ["GEMINI_API_KEY"])
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.generation_config = {
+            "temperature": temperature,
+            "max_output_tokens": max_tokens
+        }
+        self.model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=self.generation_config
+        )
+
+    def generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt)
+        return response.text
+
+    async def acall(self, prompt, timeout=None, **kwargs):
+        if not hasattr(self.model, "generate_content_async"):
+            return await super().acall(prompt, timeout=timeout)
+        async with self._limit():
+            response = await asyncio.wait_for(self.model.generate_content_async(prompt), timeout)
+        return response.text
+
+    async def astream(self, prompt, timeout=None, **kwargs):
+        if not hasattr(self.model, "generate_content_async"):
+            yield await self.acall(prompt, timeout=timeout)
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        async with self._limit():
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(prompt, stream=True), remaining())
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                except StopAsyncIteration:
+                    break
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # chunk without text parts (e.g. finish metadata)
+                if text:
+                    yield text
+
+
+class LatencyModel:
+    """
+    Configurable response latency for stand-in backends.
+
+    Distributions: "fixed" (always mean), "uniform" (mean ± jitter),
+    "normal" (mean, sd=jitter) and "lognormal" (median=mean, sigma=jitter),
+    all clipped at zero. Seeded so runs are reproducible.
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, distribution: str = "fixed", seed: Optional[int] = 0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.mean = mean
+        self.jitter = jitter
+        self.distribution = distribution
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.distribution == "uniform":
+                value = self._rng.uniform(self.mean - self.jitter, self.mean + self.jitter)
+            elif self.distribution == "normal":
+                value = self._rng.gauss(self.mean, self.jitter)
+            elif self.distribution == "lognormal":
+                value = self.mean * self._rng.lognormvariate(0.0, self.jitter) if self.mean > 0 else 0.0
+            else:
+                value = self.mean
+        return max(0.0, value)
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic offline stand-in for Gemini.
+
+    Answers the agent's two prompt types without a network: tool selection
+    uses the local intent classifier (falling back to a search for the whole
+    utterance if it sounds like a music request, and to a plain answer
+    otherwise), and response generation recommends the first search result.
+    Latency is drawn from a LatencyModel.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: Optional[LatencyModel] = None, stream_chunk_chars: int = 24, max_concurrent: int = 64):
+        super().__init__(max_concurrent)
+        from local_intents import LocalIntentClassifier
+
+        self.latency = latency or LatencyModel()
+        self.stream_chunk_chars = stream_chunk_chars
+        self.classifier = LocalIntentClassifier()
+        self.calls = 0
+
+    def respond(self, prompt: str) -> str:
+        """Build the JSON reply for a prompt (no latency)."""
+        self.calls += 1
+        tool_output = re.search(r"^TOOL OUTPUT: (.*?)\n\nTASK:", prompt, re.MULTILINE | re.DOTALL)
+        if tool_output:
+            tool_name = re.search(r"^TOOL CALLED: (.*)$", prompt, re.MULTILINE).group(1).strip()
+            return json.dumps(self._second_pass(tool_name, tool_output.group(1)))
+
+        match = re.search(r'^USER VOICE INPUT: "(.*)"$', prompt, re.MULTILINE)
+        voice_input = match.group(1) if match else ""
+        multi = self._multi_step(voice_input)
+        if multi is not None:
+            return json.dumps(multi)
+        result = self.classifier.classify(voice_input)
+        if result is None or result["confidence"] < 0.5:
+            result = self._fallback(voice_input)
+        else:
+            result = {k: v for k, v in result.items() if k not in ("confidence", "source")}
+        return json.dumps(result)
+
+    @staticmethod
+    def _fallback(voice_input: str) -> Dict[str, Any]:
+        """Search for an unrecognized music request; answer anything else without a tool."""
+        if not _MUSIC_REQUEST.search(voice_input):
+            return {
+                "tool_call": False,
+                "tool_name": None,
+                "tool_input": None,
+                "response": "Sorry, I can only help with your music.",
+                "user_intent": "conversation",
+            }
+        return {
+            "tool_call": True,
+            "tool_name": "search",
+            "tool_input": voice_input,
+            "response": f"Searching for {voice_input}.",
+            "user_intent": f"search for {voice_input}",
+        }
+
+    def _multi_step(self, voice_input: str) -> Optional[Dict[str, Any]]:
+        """Split "pause and then search for jazz" into independent tool calls if every part is clear."""
+        parts = [p for p in re.split(r",?\s+(?:and then|then|and)\s+", voice_input, flags=re.IGNORECASE) if p]
+        if len(parts) < 2:
+            return None
+        steps = [self.classifier.classify(part) for part in parts]
+        if not all(step and step["confidence"] >= 0.9 for step in steps):
+            return None
+        calls = [{"id": str(i), "tool_name": step["tool_name"], "tool_input": step["tool_input"], "depends_on": []}
+                 for i, step in enumerate(steps, 1)]
+        return {
+            "tool_call": True,
+            "tool_name": calls[0]["tool_name"],
+            "tool_input": calls[0]["tool_input"],
+            "tool_calls": calls,
+            "response": " ".join(step["response"] for step in steps),
+            "user_intent": " and ".join(step["user_intent"] for step in steps),
+        }
+
+    @staticmethod
+    def _second_pass(tool_name: str, tool_output: str) -> Dict[str, Any]:
+        if tool_name == "search":
+            _, _, listing = tool_output.partition("\n")
+            try:
+                tracks = json.loads(listing)
+            except ValueError:
+                tracks = []
+            if tracks:
+                track = tracks[0]
+                return {
+                    "tool_call": True,
+                    "tool_name": "play",
+                    "tool_input": track.get("uri") or track.get("id"),
+                    "response": f"I found {track.get('name')} by {track.get('artist')}.",
+                    "recommendation": f"play {track.get('name')}",
+                }
+            return {"tool_call": False, "tool_name": None, "tool_input": None,
+                    "response": "Sorry, I couldn't find that.", "recommendation": "try another search"}
+        return {"tool_call": False, "tool_name": None, "tool_input": None,
+                "response": f"Done: {tool_output}", "recommendation": ""}
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency.sample())
+        return self.respond(prompt)
+
+    async def acall(self, prompt, timeout=None, **kwargs):
+        async with self._limit():
+            return await asyncio.wait_for(self._respond_after(prompt, self.latency.sample()), timeout)
+
+    async def _respond_after(self, prompt: str, delay: float) -> str:
+        await asyncio.sleep(delay)
+        return self.respond(prompt)
+
+    async def astream(self, prompt, timeout=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        async with self._limit():
+            text = self.respond(prompt)
+            pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)] or [""]
+            delay = self.latency.sample() / len(pieces)
+            for piece in pieces:
+                if deadline is not None and loop.time() + delay > deadline:
+                    await asyncio.sleep(max(0.0, deadline - loop.time()))
+                    raise asyncio.TimeoutError()
+                await asyncio.sleep(delay)
+                yield piece
+
+
+def prompt_key(prompt: str) -> str:
+    """Stable key for a prompt, ignoring the date line that changes every day."""
+    return hashlib.sha256(_VOLATILE_LINES.sub("", prompt).strip().encode("utf-8")).hexdigest()
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Record real prompt → response pairs to a JSONL file, or replay them offline.
+
+    In "record" mode every call goes to ``inner`` and is appended to ``path``
+    together with its latency. In "replay" mode responses come from the file,
+    optionally re-applying the recorded latency; prompts that were never
+    recorded go to ``inner`` if one is given, otherwise raise KeyError.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, mode: str = "replay", inner: Optional[LLMBackend] = None,
+                 replay_latency: bool = True, max_concurrent: int = 64):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown record/replay mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("record mode needs an inner backend")
+        super().__init__(max_concurrent)
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.replay_latency = replay_latency
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    self._records[record["key"]] = record
+
+    def _append(self, prompt: str, response: str, latency: float):
+        record = {"key": prompt_key(prompt), "prompt": prompt, "response": response, "latency": latency}
+        with self._lock:
+            self._records[record["key"]] = record
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def _lookup(self, prompt: str) -> Optional[Dict[str, Any]]:
+        if self.mode != "replay":
+            return None
+        record = self._records.get(prompt_key(prompt))
+        if record is None:
+            self.misses += 1
+            if self.inner is None:
+                raise KeyError("No recorded response for prompt")
+        else:
+            self.hits += 1
+        return record
+
+    def generate(self, prompt: str) -> str:
+        record = self._lookup(prompt)
+        if record is not None:
+            if self.replay_latency:
+                time.sleep(record["latency"])
+            return record["response"]
+        start = time.perf_counter()
+        response = self.inner.generate(prompt)
+        if self.mode == "record":
+            self._append(prompt, response, time.perf_counter() - start)
+        return response
+
+    async def _replay(self, record: Dict[str, Any], timeout: Optional[float]) -> str:
+        async with self._limit():
+            if self.replay_latency:
+                await asyncio.wait_for(asyncio.sleep(record["latency"]), timeout)
+        return record["response"]
+
+    async def acall(self, prompt, timeout=None, **kwargs):
+        record = self._lookup(prompt)
+        if record is not None:
+            return await self._replay(record, timeout)
+        start = time.perf_counter()
+        response = await self.inner.acall(prompt, timeout=timeout)
+        if self.mode == "record":
+            self._append(prompt, response, time.perf_counter() - start)
+        return response
+
+    async def astream(self, prompt, timeout=None, **kwargs):
+        record = self._lookup(prompt)
+        if record is not None:
+            yield await self._replay(record, timeout)
+            return
+        start = time.perf_counter()
+        pieces = []
+        async for piece in self.inner.astream(prompt, timeout=timeout):
+            pieces.append(piece)
+            yield piece
+        if self.mode == "record":
+            self._append(prompt, "".join(pieces), time.perf_counter() - start)
+
+
+def make_backend(name: Optional[str] = None, **kwargs) -> LLMBackend:
+    """
+    Build a backend by name: "gemini", "stub", "record" or "replay".
+
+    Defaults to $ALEXA_LLM_BACKEND (or "gemini"). Record/replay use the file
+    in $ALEXA_LLM_RECORDING (default llm_recording.jsonl); the stub's latency
+    comes from $ALEXA_STUB_LATENCY_MS and $ALEXA_STUB_JITTER_MS.
+    """
+    name = (name or os.environ.get("ALEXA_LLM_BACKEND") or "gemini").lower()
+    if name == "gemini":
+        return GeminiBackend(**kwargs)
+    if name == "stub":
+        latency = LatencyModel(
+            mean=float(os.environ.get("ALEXA_STUB_LATENCY_MS", "0")) / 1000,
+            jitter=float(os.environ.get("ALEXA_STUB_JITTER_MS", "0")) / 1000,
+            distribution=os.environ.get("ALEXA_STUB_LATENCY_DIST", "fixed"),
+        )
+        return StubBackend(latency=latency, **kwargs)
+    if name in ("record", "replay"):
+        path = os.environ.get("ALEXA_LLM_RECORDING", "llm_recording.jsonl")
+        inner = GeminiBackend(**kwargs) if name == "record" else None
+        return RecordReplayBackend(path, mode=name, inner=inner)
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,155 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Politeness and filler around a command ("hey, could you please ... for me")
+_PREFIX = re.compile(r"^(?:(?:hey|ok|okay|so|um|uh|alexa|please|can you|could you|would you|will you|i want to|i'd like to|let's)\s+)+")
+_SUFFIX = re.compile(r"(?:\s+(?:please|for me|now|thanks|thank you|right now))+$")
+
+# Joins several commands in one utterance
+_CONJUNCTION = re.compile(r"\b(?:and|then)\b")
+
+# A conjunction that clearly starts a second command ("jazz and then pause",
+# "queen and skip"), as opposed to one inside a query ("simon and garfunkel")
+_NEXT_COMMAND = re.compile(r"\bthen\b|\band\s+(?:pause|stop|play|resume|unpause|continue|start|search|find|"
+                           r"look|put on|queue|skip|turn)\b")
+
+# Negated commands ("don't stop the music") mean the opposite of their nearest example
+_NEGATION = re.compile(r"\b(?:don't|dont|do not|doesn't|never|not)\b")
+
+# Words that refer to something instead of naming it ("play it louder",
+# "play my playlist"); a play command starting with one is not a search query
+_NOT_A_QUERY = r"(?:it|that|this|these|those|something|anything|everything|whatever|my|your|our|their)\b"
+
+# Compiled command grammar: (tool_name, pattern, confidence)
+_GRAMMAR = [
+    ("pause", re.compile(r"^(?:pause|stop|halt|hold|mute|silence)(?:\s+(?:the|my|this))?"
+                         r"(?:\s+(?:music|song|track|playback|playing|it|audio|tunes))?$"), 0.97),
+    ("pause", re.compile(r"^(?:stop|quit) playing(?:\s+(?:the\s+)?(?:music|song|it))?$"), 0.97),
+    ("start", re.compile(r"^(?:resume|unpause|continue|keep playing|start|play)"
+                         r"(?:\s+(?:the|my|some))?(?:\s+(?:music|song|track|playback|playing|it|again))*$"), 0.95),
+    ("start", re.compile(r"^play\s+(?:some\s+)?(?:music|something|anything)$"), 0.9),
+    ("search", re.compile(r"^(?:search|look|find|look up)(?:\s+(?:for|up))?\s+(?:some\s+)?"
+                          r"(?:(?:songs?|tracks?|music|albums?)\s+(?:by|from)\s+)?(?P<query>.+)$"), 0.93),
+    ("search", re.compile(r"^(?:play|put on|queue)\s+(?!(?:the\s+)?(?:next|previous|last)\b)(?:me\s+)?(?:some\s+|a\s+)?"
+                          r"(?:(?:songs?|tracks?|music)\s+(?:by|from)\s+)?(?!" + _NOT_A_QUERY + r")(?P<query>.+)$"), 0.90),
+]
+
+# Labeled examples for the nearest-neighbour fallback (argument-free intents only),
+# seeded from the examples in SpotifyVoiceAgent._create_tool_selection_prompt
+_EXAMPLES = {
+    "pause": [
+        "pause the music", "stop playing", "pause", "stop the music", "pause it",
+        "turn the music off", "shut it off", "be quiet", "enough music", "stop the song",
+        "pause playback", "hold the music",
+    ],
+    "start": [
+        "play music", "resume", "resume the music", "continue playing", "unpause",
+        "start the music again", "turn the music back on", "keep going", "play it again",
+        "start playback", "carry on playing",
+    ],
+}
+
+_RESPONSES = {
+    "pause": ("Pausing your music.", "pause playback"),
+    "start": ("Resuming your music.", "resume playback"),
+    "search": ("Searching for {query}.", "search for {query}"),
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and surrounding filler words."""
+    text = text.lower()
+    text = re.sub(r"[^\w\s']", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = _PREFIX.sub("", text)
+    text = _SUFFIX.sub("", text)
+    return text.strip()
+
+
+def _ngrams(text: str, n: int = 3) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def _cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(gram, 0) for gram, count in a.items()) / (a_norm * b_norm)
+
+
+class LocalIntentClassifier:
+    """
+    On-device intent classifier for the common Spotify commands.
+
+    A compiled command grammar handles pause/resume/search phrasings directly;
+    anything else is matched against labeled examples with character-trigram
+    cosine similarity. Results carry a confidence score so the agent can fall
+    back to Gemini when the classifier is unsure.
+    """
+
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None):
+        self.examples = []
+        for tool_name, phrases in (examples or _EXAMPLES).items():
+            for phrase in phrases:
+                vec = _ngrams(normalize(phrase))
+                self.examples.append((tool_name, vec, math.sqrt(sum(v * v for v in vec.values()))))
+
+    def _nearest(self, text: str) -> Tuple[Optional[str], float, float]:
+        """Return (best_tool, best_similarity, best_similarity_of_another_tool)."""
+        vec = _ngrams(text)
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        best = {}
+        for tool_name, ex_vec, ex_norm in self.examples:
+            sim = _cosine(vec, norm, ex_vec, ex_norm)
+            if sim > best.get(tool_name, 0.0):
+                best[tool_name] = sim
+        if not best:
+            return None, 0.0, 0.0
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][0], ranked[0][1], runner_up
+
+    def classify(self, voice_input: str) -> Optional[Dict[str, Any]]:
+        """
+        Classify a transcript into the agent's first-pass response format.
+
+        Returns None if nothing matched at all; otherwise a dict shaped like
+        the Gemini tool-selection JSON plus "confidence" and "source".
+        """
+        text = normalize(voice_input)
+        if not text:
+            return None
+        if _NEGATION.search(text) or _NEXT_COMMAND.search(text):
+            return None   # negated or several commands in one; leave to the LLM
+
+        for tool_name, pattern, confidence in _GRAMMAR:
+            match = pattern.match(text)
+            if match:
+                query = match.groupdict().get("query")
+                return self._result(tool_name, query.strip() if query else None, confidence)
+
+        if _CONJUNCTION.search(text):
+            return None   # possibly several commands ("pause and jazz"); too ambiguous for trigrams
+
+        tool_name, similarity, runner_up = self._nearest(text)
+        if tool_name is None:
+            return None
+        # Scale down when another intent is nearly as close
+        confidence = similarity * min(1.0, (similarity - runner_up) / 0.25)
+        return self._result(tool_name, None, round(confidence, 3))
+
+    def _result(self, tool_name: str, query: Optional[str], confidence: float) -> Dict[str, Any]:
+        response, intent = _RESPONSES[tool_name]
+        return {
+            "tool_call": True,
+            "tool_name": tool_name,
+            "tool_input": query,
+            "response": response.format(query=query),
+            "user_intent": intent.format(query=query),
+            "confidence": confidence,
+            "source": "local",
+        }
@@ -89,9 +89,11 @@ function startWakeWordDetection() {
   
   // Create enhanced Python script for wake word detection
   const wakeWordScript = `
+import time
+SCRIPT_START = time.perf_counter()
+
 import os
 import sys
-import time
 import queue
 import threading
 import numpy as np
@@ -100,7 +102,8 @@ from collections import deque
 import subprocess as sp
 import openwakeword
 from openwakeword.model import Model
-from RealtimeSTT import AudioToTextRecorder
+from stt_engine import SpeechToTextEngine
+from tracing import get_tracer, trace_path
 import json
 import pyttsx3
 import gc
@@ -147,23 +150,29 @@ DETECTION_THRESHOLD = 0.6  # Higher threshold for better accuracy
 POST_DETECT_COOLDOWN = 60.0  # 60 seconds cooldown (1 minute)
 SMOOTHING_WINDOW = 5  # Reduced smoothing window for memory efficiency
 VAD_THRESHOLD = 0.3   # Voice Activity Detection threshold
+PREROLL_SECONDS = 1.5  # Audio before/around the wake word handed to speech-to-text
+PREROLL_CHUNKS = int(PREROLL_SECONDS * 1000 / CHUNK_DURATION_MS)
 
 # Memory-optimized buffers and state
 audio_queue = queue.Queue(maxsize=50)  # Reduced queue size
 audio_buffer = np.zeros(0, dtype=np.float32)
+preroll_chunks = deque(maxlen=PREROLL_CHUNKS)
 last_detect_time = 0.0
 last_log_time = 0.0
 prediction_buffer = {}
 wake_word_cooldown_active = False
 cooldown_start_time = 0.0
 
-# Speech-to-text state
-stt_recorder = None
-stt_active = False
+# Speech-to-text state: one warm engine, fed from the wake-word capture stream
+stt_engine = None
+command_worker = None
 tts_engine = None
 stt_model_ready = False
 speak_now_count = 0
 
+# Latency tracing (ALEXA_TRACE=1): one trace per wake word, exported on exit
+tracer = get_tracer()
+
 # Initialize text-to-speech engine
 def init_tts():
     try:
@@ -176,13 +185,14 @@ def init_tts():
         return None
 
 # Text-to-speech function
-def speak_text(text, engine=None):
+def speak_text(text, engine=None, stage="tts"):
     if engine is None:
         engine = init_tts()
     if engine:
         try:
-            engine.say(text)
-            engine.runAndWait()
+            with tracer.span(stage, chars=len(text)):
+                engine.say(text)
+                engine.runAndWait()
         except Exception as e:
             print(f"TTS error: {e}")
 
@@ -249,46 +259,46 @@ def custom_print(*args, **kwargs):
 
 print = custom_print
 
-def start_speech_to_text():
-    """Start real-time speech-to-text recording with enhanced settings"""
-    global stt_recorder, stt_active, tts_engine, stt_model_ready, speak_now_count
+def stt_is_active():
+    """STT is active while the engine is armed (it disarms itself on silence or timeout)"""
+    return stt_engine is not None and stt_engine.armed
+
+def on_stt_text(txt):
+    """Handle a finished utterance from the speech-to-text engine"""
+    print(f"You said: {txt}")
+    # Send to Electron via stdout
+    result = {"type": "stt_text", "text": txt}
+    print("ELECTRON_DATA:" + json.dumps(result, cls=NumpyEncoder))
+    
+    # Process voice command in the background; TTS feedback follows when it finishes
+    submit_voice_command(txt)
+
+def start_speech_to_text(trace_id=None):
+    """Arm the warm speech-to-text engine"""
+    global tts_engine, stt_model_ready, speak_now_count
     
     print("Starting enhanced speech-to-text recording...")
-    stt_active = True
-    stt_model_ready = False
+    stt_model_ready = True
     speak_now_count = 0
     
     # Initialize TTS if not already done
     if tts_engine is None:
         tts_engine = init_tts()
     
-    # Initialize the recorder with enhanced settings
-    stt_recorder = AudioToTextRecorder()
-    
-    def on_text(txt):
-        if txt.strip():
-            print(f"You said: {txt}")
-            # Send to Electron via stdout
-            result = {"type": "stt_text", "text": txt.strip()}
-            print("ELECTRON_DATA:" + json.dumps(result, cls=NumpyEncoder))
-            
-            # Process voice command and provide TTS feedback
-            process_voice_command_feedback_sync(txt.strip())
-    
-    # Start recording immediately
-    stt_recorder.text(on_text)
+    preroll = None
+    if preroll_chunks:
+        preroll = (np.concatenate(list(preroll_chunks)) * 32767).astype(np.int16)
+    stt_engine.arm(preroll=preroll, trace_id=trace_id)
     print("Enhanced speech-to-text started. Speak now...")
 
 def stop_speech_to_text():
-    """Stop real-time speech-to-text recording"""
-    global stt_recorder, stt_active, tts_engine
+    """Disarm the speech-to-text engine"""
+    global tts_engine
     
-    if stt_active and stt_recorder:
+    if stt_is_active():
         print("Stopping speech-to-text recording...")
         try:
-            stt_recorder.stop()
-            stt_active = False
-            stt_recorder = None
+            stt_engine.disarm()
             print("Speech-to-text stopped.")
             
             if tts_engine:
@@ -297,73 +307,77 @@ def stop_speech_to_text():
             print(f"Error stopping recorder: {e}")
 
 # Enhanced voice command processing with AI agent
-def process_voice_command_feedback_sync(command):
-    global tts_engine
-    
-    print(f"Processing voice command: '{command}'")
+def start_command_worker():
+    """Start the background worker that keeps one AI agent alive across utterances"""
+    global command_worker
     
     # Check for required environment variables
     gemini_key = os.environ.get("GEMINI_API_KEY")
     if not gemini_key:
         print("GEMINI_API_KEY not found in environment variables")
         print("Please set GEMINI_API_KEY in your .env file")
-        return process_voice_command_fallback(command)
+        return None
     
-    # Try AI agent first
     try:
-        import asyncio
-        import sys
-        import os
-        
-        # Add current directory to path for imports
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        if current_dir not in sys.path:
-            sys.path.append(current_dir)
-        
-        # Import AI agent components
-        print("Importing AI agent components...")
-        from voice_command_processor import VoiceCommandProcessor
-        
-        print("Initializing AI voice agent...")
-        processor = VoiceCommandProcessor()
-        
-        # Create new event loop for async operations
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        # Process command through AI agent
-        print("Executing AI agent pipeline...")
-        result = loop.run_until_complete(processor.process_voice_command(command))
-        
-        print(f"AI Agent Result: {result}")
-        
-        # Provide TTS feedback based on AI result
-        if tts_engine:
-            if result.get("success"):
-                response = result.get("response", "Command processed")
-                speak_text(response, tts_engine)
-                print(f"TTS Feedback: {response}")
-            else:
-                error_msg = result.get("response", "Sorry, I couldn't process that command")
-                speak_text(error_msg, tts_engine)
-                print(f"AI Agent Error: {error_msg}")
-        
-        return result
-        
+        from command_worker import CommandWorker
     except ImportError as e:
         print(f"AI Agent import error: {e}")
         print("Make sure all AI agent files are in the project directory")
-        # Fallback to simple command processing
-        return process_voice_command_fallback(command)
+        return None
+    
+    print("Initializing AI voice agent...")
+    worker = CommandWorker()
+    if worker.start():
+        command_worker = worker
+        print("AI voice agent ready")
+    return command_worker
+
+def on_ai_result(command, future):
+    """Speak the AI agent's answer (runs on the command worker's feedback thread)"""
+    global tts_engine
+    
+    try:
+        result = future.result()
     except Exception as e:
         print(f"AI Agent error: {e}")
         import traceback
         traceback.print_exc()
         # Fallback to simple command processing
-        return process_voice_command_fallback(command)
+        process_voice_command_fallback(command)
+        return
+    
+    if result.get("cancelled"):
+        print(f"Command superseded by a newer one: '{command}'")
+        return
+    
+    print(f"AI Agent Result: {result}")
+    
+    # Provide TTS feedback based on AI result
+    if tts_engine:
+        if result.get("success"):
+            response = result.get("response", "Command processed")
+            speak_text(response, tts_engine)
+            print(f"TTS Feedback: {response}")
+        else:
+            error_msg = result.get("response", "Sorry, I couldn't process that command")
+            speak_text(error_msg, tts_engine)
+            print(f"AI Agent Error: {error_msg}")
+
+def submit_voice_command(command):
+    """Hand a transcript to the command worker; returns a future (or None if the fallback handled it)"""
+    print(f"Processing voice command: '{command}'")
+    
+    if command_worker is None:
+        process_voice_command_fallback(command)
+        return None
+    
+    print("Queueing command for the AI agent pipeline...")
+    return command_worker.submit(command, callback=lambda future: on_ai_result(command, future))
+
+def on_stt_partial(txt):
+    """Forward a partial transcript so the agent can start searching early"""
+    if command_worker is not None:
+        command_worker.submit_partial(txt)
 
 def process_voice_command_fallback(command):
     """Fallback voice command processing without AI agent"""
@@ -410,7 +424,7 @@ def process_voice_command_fallback(command):
 
 # Enhanced worker thread for wake word detection
 def worker():
-    global last_detect_time, last_log_time, stt_active, wake_word_cooldown_active, cooldown_start_time
+    global last_detect_time, last_log_time, wake_word_cooldown_active, cooldown_start_time
     
     while True:
         chunk = audio_queue.get()
@@ -418,6 +432,14 @@ def worker():
             break
         
         now = time.time()
+        read_at = time.perf_counter()
+        
+        # Keep recent audio so the words right after the wake word reach STT
+        preroll_chunks.append(chunk)
+        
+        # While armed, the STT engine listens to the same stream
+        if stt_is_active():
+            stt_engine.feed((chunk * 32767).astype(np.int16))
         
         # Check for wake word cooldown period
         if wake_word_cooldown_active:
@@ -451,6 +473,8 @@ def worker():
                     print(f"ENHANCED WAKE WORD DETECTED: '{name}' (score: {smoothed:.3f})")
                     last_detect_time = now
                     detected = True
+                    trace_id = tracer.new_trace_id()
+                    tracer.record("wake.detect", read_at, trace_id=trace_id, word=name, score=float(smoothed))
                     
                     # Activate 1-minute cooldown
                     wake_word_cooldown_active = True
@@ -471,11 +495,12 @@ def worker():
                     if tts_engine is None:
                         tts_engine = init_tts()
                     if tts_engine:
-                        speak_text("Activated", tts_engine)
+                        with tracer.trace(trace_id):
+                            speak_text("Activated", tts_engine, stage="tts.activated")
                     
                     # Start speech-to-text if not already active
-                    if not stt_active:
-                        start_speech_to_text()
+                    if not stt_is_active():
+                        start_speech_to_text(trace_id)
                     break
             
             # Enhanced status logging with memory cleanup
@@ -483,7 +508,7 @@ def worker():
                 if preds:
                     best = max(preds, key=preds.get)
                     status = f"Listening... Best: '{best}' ({float(preds[best]):.3f})"
-                    if stt_active:
+                    if stt_is_active():
                         status += " | STT Active"
                     if wake_word_cooldown_active:
                         remaining = POST_DETECT_COOLDOWN - (now - cooldown_start_time)
@@ -491,7 +516,7 @@ def worker():
                     print(status)
                 else:
                     status = "Listening..."
-                    if stt_active:
+                    if stt_is_active():
                         status += " | STT Active"
                     if wake_word_cooldown_active:
                         remaining = POST_DETECT_COOLDOWN - (now - cooldown_start_time)
@@ -547,6 +572,12 @@ def main():
     print("   - Speak your command clearly")
     print("   - Press Ctrl+C to exit")
     
+    global stt_engine
+    # Realtime partial transcripts cost a second (small) transcription model; opt in
+    speculative = os.environ.get("ALEXA_SPECULATIVE_SEARCH") == "1"
+    stt_engine = SpeechToTextEngine(on_text=on_stt_text, sample_rate=SR,
+                                    on_partial=on_stt_partial if speculative else None)
+    
     try:
         # Enhanced device selection
         dev = DEVICE_INDEX if DEVICE_INDEX is not None else sd.default.device[0]
@@ -558,6 +589,12 @@ def main():
                              dtype=np.float32, device=dev,
                              callback=audio_callback, latency=LATENCY):
             print("Enhanced stream started. Say 'Alexa' to begin!")
+            print(f"Listening {time.perf_counter() - SCRIPT_START:.2f}s after launch")
+            
+            # Load speech-to-text behind the wake-word detector instead of before it
+            print("Loading speech-to-text engine in the background...")
+            stt_engine.load_async()
+            threading.Thread(target=start_command_worker, daemon=True).start()
             
             while True:
                 time.sleep(0.1)
@@ -568,11 +605,18 @@ def main():
         print(f"Stream error: {e}")
     finally:
         # Cleanup
-        if stt_active:
+        if stt_is_active():
             stop_speech_to_text()
+        if stt_engine:
+            stt_engine.shutdown()
+        if command_worker:
+            command_worker.stop()
         
         audio_queue.put(None)
         worker_thread.join(timeout=1.0)
+        if tracer.enabled:
+            print(tracer.report())
+            print(f"Trace written to {tracer.export_chrome(trace_path())}")
         print("Enhanced shutdown complete")
 
 if __name__ == '__main__':
@@ -591,8 +635,11 @@ if __name__ == '__main__':
   wakeWordProcess = spawn('python', [scriptPath], {
     stdio: ['pipe', 'pipe', 'pipe'],
     windowsHide: false,
+    cwd: __dirname,
     env: { 
       ...process.env, 
+      // The script lives in the temp dir; make the project's Python modules importable
+      PYTHONPATH: process.env.PYTHONPATH ? `${__dirname}${path.delimiter}${process.env.PYTHONPATH}` : __dirname,
       PYTHONUNBUFFERED: '1',
       PYTHONMALLOC: 'malloc',
       PYTHONDEVMODE: '1',
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from local_intents import normalize
+
+
+def make_cache_key(voice_input: str, llm_pass: str, tool_name: Optional[str] = None,
+                   tool_output: Optional[str] = None) -> str:
+    """
+    Build the cache key for one LLM pass.
+
+    The utterance is normalized (case, punctuation, filler words) so that
+    "Pause the music, please" and "pause the music" share an entry; the tool
+    output is hashed so second-pass keys stay short.
+    """
+    output_hash = hashlib.sha1(tool_output.encode("utf-8")).hexdigest() if tool_output is not None else ""
+    return "\x1f".join((llm_pass, normalize(voice_input), tool_name or "", output_hash))
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with a TTL for parsed LLM responses.
+
+    Entries live in an in-memory OrderedDict; when ``path`` is given they are
+    also written through to a small SQLite table so the cache survives
+    restarts. Expired entries are dropped lazily on lookup.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 24 * 3600, path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Maximum number of cached responses (least recently used are evicted)
+            ttl: Seconds an entry stays valid
+            path: Optional SQLite file for persistence across restarts
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._db = None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, response TEXT NOT NULL, used_at REAL NOT NULL)"
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        # Load the most recently used entries, oldest first so LRU order is preserved
+        rows = self._db.execute(
+            "SELECT key, expires_at, response FROM llm_cache ORDER BY used_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for key, expires_at, response in reversed(rows):
+            self._entries[key] = (expires_at, json.loads(response))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached response, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, response = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if self._db is not None:
+                self._db.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            return dict(response)
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response, evicting the least recently used entry when full."""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, dict(response))
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+                self.evictions += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, expires_at, response, used_at) VALUES (?, ?, ?, ?)",
+                    (key, expires_at, json.dumps(response), now)
+                )
+                self._db.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in evicted])
+                self._db.commit()
+
+    def _delete(self, key: str):
+        if self._db is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,132 @@
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+# Trailing decorations Spotify adds to track names ("- Remastered 2011", "(Live)")
+_DECORATION = re.compile(r"\s+-\s+.*$|\s*[\(\[][^\)\]]*[\)\]]")
+
+_TEMPLATES = {
+    "pause": ("I've paused your music.", "paused playback"),
+    "play": ("I've resumed your music.", "resumed playback"),     # play without a track resumes
+    "start": ("I've resumed your music.", "resumed playback"),
+}
+
+
+def _clean(text: str) -> str:
+    text = _DECORATION.sub("", text.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _track_fields(track: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Return (name, first artist, uri or id) for a Spotify track dict."""
+    name = track.get("name") or ""
+    artists = track.get("artists") or [{}]
+    artist = artists[0].get("name") or ""
+    return name, artist, track.get("uri") or track.get("id") or ""
+
+
+def score_track(query: str, track: Dict[str, Any]) -> float:
+    """
+    Score how well a search result matches the spoken query (0..1).
+
+    Combines difflib similarity against "name", "name artist" and "artist"
+    with the fraction of query words that appear in the track name or artist.
+    """
+    name, artist, _ = _track_fields(track)
+    query = _clean(query)
+    name, artist = _clean(name), _clean(artist)
+    if not query or not name:
+        return 0.0
+    query = re.sub(r"\s+by\s+", " ", query)
+
+    similarity = max(
+        SequenceMatcher(None, query, name).ratio(),
+        SequenceMatcher(None, query, f"{name} {artist}").ratio(),
+        SequenceMatcher(None, query, f"{artist} {name}").ratio(),
+    )
+    words = query.split()
+    haystack = set(f"{name} {artist}".split())
+    coverage = sum(1 for w in words if w in haystack) / len(words)
+    return 0.5 * similarity + 0.5 * coverage
+
+
+def rank_tracks(query: str, results: List[Dict[str, Any]], limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+    """Rank the first ``limit`` search results (the ones shown to the LLM) by score_track, best first."""
+    candidates = results[:limit]
+    n = len(candidates)
+    ranked = []
+    for i, track in enumerate(candidates):
+        # Small prior for Spotify's own ordering to break near-ties
+        prior = 0.02 * (n - i) / n
+        ranked.append((score_track(query, track) + prior, track))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+class ResponseSynthesizer:
+    """
+    Build second-pass responses locally when the tool outcome is deterministic.
+
+    Pause/resume results and empty searches map to fixed templates; for search
+    results the candidates are ranked with a string-similarity scorer and the
+    best one is recommended if it is a clear match. Anything else returns None
+    so the caller can fall back to the LLM.
+    """
+
+    def __init__(self, min_score: float = 0.6, min_margin: float = 0.08):
+        """
+        Args:
+            min_score: Minimum score for the best search result to be played without the LLM
+            min_margin: Minimum lead of the best result over the runner-up
+        """
+        self.min_score = min_score
+        self.min_margin = min_margin
+
+    def synthesize(self, tool_name: str, tool_input: Optional[str], tool_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return a response shaped like the LLM's second-pass JSON, or None if ambiguous.
+
+        Args:
+            tool_name: Tool that was executed
+            tool_input: Input the tool was called with
+            tool_result: Successful result dict from the tool
+        """
+        if tool_name in _TEMPLATES and not tool_input:
+            response, recommendation = _TEMPLATES[tool_name]
+            return self._result(None, response, recommendation)
+        if tool_name == "play":
+            return self._result(None, "Playing your track.", "playing the requested track")
+
+        if tool_name == "search":
+            results = tool_result.get("results") or []
+            if not isinstance(results, list) or not results:
+                return self._result(
+                    None,
+                    f"Sorry, I couldn't find anything for {tool_input}. Try another song or artist name.",
+                    "try a different search"
+                )
+            ranked = rank_tracks(tool_input or "", results)
+            best_score, best = ranked[0]
+            name, artist, uri = _track_fields(best)
+            # Other versions of the same song (remasters, live cuts) do not make it ambiguous
+            identity = (_clean(name), _clean(artist))
+            runner_up = next((score for score, track in ranked[1:]
+                              if (_clean(_track_fields(track)[0]), _clean(_track_fields(track)[1])) != identity), 0.0)
+            if uri and best_score >= self.min_score and best_score - runner_up >= self.min_margin:
+                print(f"Template response: best match '{name}' by {artist} (score {best_score:.2f})")
+                track = f"{name} by {artist}" if artist else name
+                return self._result(uri, f"I found {track}.", f"play {track}")
+
+        return None
+
+    @staticmethod
+    def _result(play_uri: Optional[str], response: str, recommendation: str) -> Dict[str, Any]:
+        return {
+            "tool_call": play_uri is not None,
+            "tool_name": "play" if play_uri else None,
+            "tool_input": play_uri,
+            "response": response,
+            "recommendation": recommendation,
+            "source": "template",
+        }
@@ -0,0 +1,152 @@
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Iterable, Optional, Tuple
+
+# Header layout (int64 words at the start of the block)
+_HEADER_WORDS = 4
+_WRITE_SEQ = 0     # number of chunks published so far
+_CAPACITY = 1
+_CHUNK_SIZE = 2
+
+
+class SharedAudioRing:
+    """
+    Single-writer, multi-reader int16 chunk ring in ``multiprocessing.shared_memory``.
+
+    The capture/wake-word process publishes every chunk it reads; readers in
+    other processes keep their own cursor (a chunk sequence number), so a slow
+    reader can never stall the writer. The writer bumps the published sequence
+    only after a chunk has been copied in, and readers re-check it after
+    copying out to detect chunks that were overwritten underneath them.
+    """
+
+    def __init__(self, name: Optional[str] = None, create: bool = False,
+                 capacity_chunks: int = 64, chunk_size: int = 1280):
+        """
+        Args:
+            name: Shared memory block name (generated when creating without one)
+            create: Create the block (writer side) instead of attaching to it
+            capacity_chunks: Number of chunk slots (writer side only)
+            chunk_size: Samples per chunk (writer side only)
+        """
+        if create:
+            size = (_HEADER_WORDS * 8) + capacity_chunks * 8 + capacity_chunks * chunk_size * 2
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self._header = np.ndarray((_HEADER_WORDS,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[_CAPACITY] = capacity_chunks
+            self._header[_CHUNK_SIZE] = chunk_size
+        self.capacity = int(self._header[_CAPACITY])
+        self.chunk_size = int(self._header[_CHUNK_SIZE])
+
+        offset = _HEADER_WORDS * 8
+        self._timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=self.shm.buf, offset=offset)
+        offset += self.capacity * 8
+        self._slots = np.ndarray((self.capacity, self.chunk_size), dtype=np.int16,
+                                 buffer=self.shm.buf, offset=offset)
+        self.owner = create
+
+        # Reader-side stats
+        self.lost_chunks = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        return int(self._header[_WRITE_SEQ])
+
+    def write_chunk(self, chunk: np.ndarray) -> int:
+        """Publish one int16 chunk; returns its sequence number."""
+        seq = int(self._header[_WRITE_SEQ])
+        slot = seq % self.capacity
+        np.copyto(self._slots[slot], chunk)
+        self._timestamps[slot] = time.time()
+        self._header[_WRITE_SEQ] = seq + 1
+        return seq
+
+    def read_into(self, seq: int, out: np.ndarray) -> Tuple[bool, int]:
+        """
+        Copy chunk ``seq`` into ``out``.
+
+        Returns (ok, next_seq). If the chunk is not written yet, ok is False
+        and next_seq == seq. If the reader fell so far behind that the chunk
+        was overwritten, the cursor jumps to the oldest intact chunk.
+        """
+        write_seq = self.write_seq
+        if seq >= write_seq:
+            return False, seq
+        oldest = write_seq - self.capacity + 1   # keep one slot of margin for the writer
+        if seq < oldest:
+            self.lost_chunks += oldest - seq
+            seq = oldest
+        np.copyto(out, self._slots[seq % self.capacity])
+        # Re-check: the writer may have lapped us while we were copying
+        if self.write_seq - seq >= self.capacity:
+            self.lost_chunks += 1
+            return False, seq + 1
+        return True, seq + 1
+
+    def read_range(self, start: int, end: int, out: np.ndarray) -> int:
+        """Copy chunks [start, end) into the rows of ``out``; returns how many were still intact."""
+        # Never before the first chunk (a pre-roll asked for right after startup)
+        start = max(0, start, self.write_seq - self.capacity + 1, end - len(out))
+        count = 0
+        for seq in range(start, end):
+            ok, _ = self.read_into(seq, out[count])
+            if ok:
+                count += 1
+        return count
+
+    def wait_for(self, seq: int, timeout: float, poll_interval: float = 0.005) -> bool:
+        """Poll until chunk ``seq`` has been published or the timeout runs out."""
+        deadline = time.monotonic() + timeout
+        while self.write_seq <= seq:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def close(self):
+        # Drop the numpy views before closing, otherwise the buffer stays exported
+        self._header = self._timestamps = self._slots = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def pin_to_cores(cores: Optional[Iterable[int]]) -> bool:
+    """Pin the current process to the given CPU cores where the OS supports it."""
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, set(cores))
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not pin process to cores {sorted(cores)}: {e}")
+        return False
+
+
+def parse_cores(spec: Optional[str]) -> Optional[set]:
+    """Parse a core list like "0" or "1-3,5" (as used in ALEXA_WAKE_CPUS / ALEXA_STT_CPUS)."""
+    if not spec:
+        return None
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cores.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cores.add(int(part))
+    return cores or None
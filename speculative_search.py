@@ -0,0 +1,90 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from local_intents import LocalIntentClassifier, normalize
+
+
+class SpeculativeSearch:
+    """
+    Start Spotify searches from partial transcripts while the user is still speaking.
+
+    Each partial transcript is run through the local intent classifier; when
+    it confidently looks like a search ("play bohemian rhap..."), a
+    ``search_tracks`` call is started for the query seen so far. Once the
+    final command is known, ``take`` hands back the task whose query matches
+    it and cancels the rest, so a correct guess hides the search latency
+    behind speech time and a wrong one only costs a cancelled request.
+
+    All methods must be called on the event loop the searches run on.
+    """
+
+    def __init__(self, spotify_tools, classifier: Optional[LocalIntentClassifier] = None,
+                 min_confidence: float = 0.85, min_query_chars: int = 3, max_pending: int = 4):
+        """
+        Args:
+            spotify_tools: SpotifyTools instance to search with
+            classifier: Local intent classifier (a new one is built if omitted)
+            min_confidence: Minimum classifier confidence to start a search
+            min_query_chars: Ignore partial queries shorter than this
+            max_pending: Maximum speculative searches kept per utterance
+        """
+        self.spotify_tools = spotify_tools
+        self.classifier = classifier or LocalIntentClassifier()
+        self.min_confidence = min_confidence
+        self.min_query_chars = min_query_chars
+        self.max_pending = max_pending
+        self._tasks: "OrderedDict[str, asyncio.Task]" = OrderedDict()   # normalized query -> search task
+
+        # Stats
+        self.started = 0
+        self.reused = 0
+        self.cancelled = 0
+
+    def update(self, partial_text: str):
+        """Handle a new partial transcript, starting a search if it reveals a new query."""
+        result = self.classifier.classify(partial_text)
+        if not result or result["tool_name"] != "search" or result["confidence"] < self.min_confidence:
+            return
+        query = result["tool_input"] or ""
+        key = normalize(query)
+        if len(key) < self.min_query_chars or key in self._tasks:
+            return
+
+        self._tasks[key] = asyncio.ensure_future(self.spotify_tools.search_tracks(query))
+        self.started += 1
+        print(f"Speculative search started for '{query}'")
+        # Older guesses are prefixes of this one and are unlikely to be the final query
+        while len(self._tasks) > self.max_pending:
+            _, task = self._tasks.popitem(last=False)
+            self._cancel(task)
+
+    def take(self, query: Optional[str]) -> Optional[asyncio.Task]:
+        """Return the search task for the final query (if one was started) and cancel the others."""
+        task = self._tasks.pop(normalize(query), None) if query else None
+        if task is not None and task.done() and (task.cancelled() or task.exception() is not None):
+            task = None
+        if task is not None:
+            self.reused += 1
+            print(f"Reusing speculative search for '{query}'")
+        self.reset()
+        return task
+
+    def reset(self):
+        """Cancel all pending speculative searches (e.g. when a new utterance starts)."""
+        for task in self._tasks.values():
+            self._cancel(task)
+        self._tasks.clear()
+
+    def _cancel(self, task: asyncio.Task):
+        if not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "reused": self.reused,
+            "cancelled": self.cancelled,
+            "pending": len(self._tasks),
+        }
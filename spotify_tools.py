@@ -1,126 +1,319 @@
 import aiohttp
+import asyncio
 import json
-from typing import Dict, Any, List, Optional
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from track_index import TrackIndex
+from http_resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, SingleFlight, hedged
+from tracing import get_tracer
 
 class SpotifyTools:
-    def __init__(self, base_url: str = "http://localhost:8888"):
+    def __init__(self, base_url: str = "http://localhost:8888", request_timeout: float = 10.0,
+                 connect_timeout: float = 2.0, pool_size: int = 8, keepalive_timeout: float = 60.0,
+                 track_index: Optional[TrackIndex] = None, use_track_index: bool = True,
+                 track_index_path: Optional[str] = None,
+                 coalesce_requests: bool = True, hedge_requests: bool = False, hedge_percentile: float = 95.0,
+                 min_hedge_delay: float = 0.05, breaker_failures: int = 3, breaker_reset: float = 10.0):
         """
         Initialize Spotify Tools with the local Express server URL.
         
+        One aiohttp session (and connection pool) is shared by all calls, so
+        back-to-back requests such as search-then-play reuse warm keep-alive
+        connections. Use ``async with SpotifyTools() as tools`` or call
+        ``aclose()`` when done.
+        
         Args:
             base_url: URL of the Express server (default: localhost:8888)
+            request_timeout: Default total timeout per request in seconds
+            connect_timeout: Timeout for opening a new connection in seconds
+            pool_size: Maximum number of pooled connections to the server
+            keepalive_timeout: Seconds an idle connection is kept open
+            track_index: Local track index / search cache to use
+            use_track_index: Build a TrackIndex if none is given
+            track_index_path: SQLite file for that TrackIndex (defaults to
+                $ALEXA_TRACK_INDEX_PATH; in-memory only if unset)
+            coalesce_requests: Share one HTTP call between identical concurrent requests
+            hedge_requests: Send a second search request when the first is slower
+                than the hedge_percentile of recent search latencies
+            hedge_percentile: Latency percentile after which a search is hedged
+            min_hedge_delay: Lower bound on the hedge delay in seconds
+            breaker_failures: Consecutive connection failures that open the circuit breaker
+            breaker_reset: Seconds the circuit stays open before a trial request
         """
         self.base_url = base_url
+        self.request_timeout = request_timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._session_loop = None
+        if track_index is None and use_track_index:
+            try:
+                track_index = TrackIndex(track_index_path or os.environ.get("ALEXA_TRACK_INDEX_PATH"))
+            except Exception as e:
+                print(f"Track index unavailable: {e}")
+        self.track_index = track_index
+        self.coalesce_requests = coalesce_requests
+        self.hedge_requests = hedge_requests
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.circuit_breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._single_flight = SingleFlight()
+        self._latency = {}
+        self.tracer = get_tracer()
+    
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use (or if the event loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            if self._session is not None and not self._session.closed:
+                await self._close_stale_session()
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, sock_connect=self.connect_timeout)
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def _close_stale_session(self):
+        """Close a session created on another event loop, on that loop if it is still running."""
+        session, old_loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        try:
+            if old_loop is not None and old_loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), old_loop))
+            else:
+                await session.close()
+        except Exception as e:
+            print(f"Error closing previous HTTP session: {e}")
+    
+    def _timeout(self, timeout: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=timeout if timeout is not None else self.request_timeout,
+                                     sock_connect=self.connect_timeout)
+    
+    async def aclose(self):
+        """Close the shared session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+        
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None,
+                       hedge: bool = False, **kwargs) -> Tuple[int, str]:
+        """
+        Make one HTTP request to the Express server; returns (status, body text).
+        
+        Goes through the circuit breaker (connection errors and timeouts count
+        as failures, any HTTP response as success). With ``hedge`` set and
+        hedging enabled, a second attempt is started once the first has taken
+        longer than the recent latency percentile for this path. Each request
+        is recorded as an "http <METHOD> <path>" span.
+        """
+        self.circuit_breaker.before_request()
+        tracker = self._latency.setdefault(path, LatencyTracker())
+        
+        async def attempt():
+            session = await self._get_session()
+            start = time.perf_counter()
+            async with session.request(method, f"{self.base_url}{path}",
+                                       timeout=self._timeout(timeout), **kwargs) as response:
+                body = await response.text()
+            tracker.add(time.perf_counter() - start)
+            return response.status, body
         
-    async def pause_playback(self) -> Dict[str, Any]:
+        delay = None
+        if hedge and self.hedge_requests:
+            p = tracker.percentile(self.hedge_percentile)
+            delay = max(p, self.min_hedge_delay) if p is not None else None
+        try:
+            with self.tracer.span(f"http {method} {path}", hedged=delay is not None) as span:
+                status, body = await hedged(attempt, delay)
+                span.set(status=status)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError, OSError):
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            self.circuit_breaker.record_cancelled()
+            raise
+        self.circuit_breaker.record_success()
+        return status, body
+    
+    async def _coalesce(self, key: tuple, factory) -> Dict[str, Any]:
+        """Share one in-flight call between identical concurrent requests; each caller gets its own copy."""
+        if not self.coalesce_requests:
+            return await factory()
+        return dict(await self._single_flight.do(key, factory))
+    
+    @staticmethod
+    def _network_error(action: str, e: Exception) -> Dict[str, Any]:
+        if isinstance(e, CircuitOpenError):
+            result = {"success": False, "error": f"Network error: Spotify server unavailable ({e})"}
+        elif isinstance(e, asyncio.TimeoutError):
+            result = {"success": False, "error": "Network error: request timed out"}
+        else:
+            result = {"success": False, "error": f"Network error: {str(e)}"}
+        print(f"{action} network error: {result}")
+        return result
+    
+    async def pause_playback(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Pause current Spotify playback."""
+        return await self._coalesce(("pause",), lambda: self._pause_playback(timeout))
+    
+    async def _pause_playback(self, timeout: Optional[float]) -> Dict[str, Any]:
         print(f"Pausing Spotify playback...")
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.base_url}/player/stop") as response:
-                    print(f"HTTP Response: {response.status}")
-                    if response.status == 200:
-                        result = {"success": True, "message": "Playback paused successfully"}
-                        print(f"Pause successful: {result}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        result = {"success": False, "error": f"Failed to pause: {error_text}"}
-                        print(f"Pause failed: {result}")
-                        return result
+            status, body = await self._request("POST", "/player/stop", timeout)
+            print(f"HTTP Response: {status}")
+            if status == 200:
+                result = {"success": True, "message": "Playback paused successfully"}
+                print(f"Pause successful: {result}")
+                return result
+            else:
+                result = {"success": False, "error": f"Failed to pause: {body}"}
+                print(f"Pause failed: {result}")
+                return result
         except Exception as e:
-            result = {"success": False, "error": f"Network error: {str(e)}"}
-            print(f"Pause network error: {result}")
-            return result
+            return self._network_error("Pause", e)
 
-    async def resume_playback(self) -> Dict[str, Any]:
+    async def resume_playback(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Resume Spotify playback."""
+        return await self._coalesce(("resume",), lambda: self._resume_playback(timeout))
+    
+    async def _resume_playback(self, timeout: Optional[float]) -> Dict[str, Any]:
         print(f"Resuming Spotify playback...")
         try:
-            async with aiohttp.ClientSession() as session:
-                # For resume, we'll use a play command with no specific track
-                async with session.post(f"{self.base_url}/player/play", 
-                                     json={"uris": []}) as response:
-                    print(f"HTTP Response: {response.status}")
-                    if response.status == 200:
-                        result = {"success": True, "message": "Playback resumed successfully"}
-                        print(f"Resume successful: {result}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        result = {"success": False, "error": f"Failed to resume: {error_text}"}
-                        print(f"Resume failed: {result}")
-                        return result
+            # For resume, we'll use a play command with no specific track
+            status, body = await self._request("POST", "/player/play", timeout, json={"uris": []})
+            print(f"HTTP Response: {status}")
+            if status == 200:
+                result = {"success": True, "message": "Playback resumed successfully"}
+                print(f"Resume successful: {result}")
+                return result
+            else:
+                result = {"success": False, "error": f"Failed to resume: {body}"}
+                print(f"Resume failed: {result}")
+                return result
         except Exception as e:
-            result = {"success": False, "error": f"Network error: {str(e)}"}
-            print(f"Resume network error: {result}")
-            return result
+            return self._network_error("Resume", e)
 
-    async def search_tracks(self, query: str) -> Dict[str, Any]:
+    async def search_tracks(self, query: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         Search for tracks using the Spotify API.
         
         Args:
             query: Search query string
+            timeout: Request timeout in seconds (default: request_timeout)
             
         Returns:
             Dict containing search results or error information
         """
+        return await self._coalesce(("search", query), lambda: self._search_tracks(query, timeout))
+    
+    async def _search_tracks(self, query: str, timeout: Optional[float]) -> Dict[str, Any]:
         print(f"Searching for tracks: '{query}'")
+        local_result = self._search_locally(query)
+        if local_result is not None:
+            return local_result
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/player/search", 
-                                     params={"query": query}) as response:
-                    print(f"HTTP Response: {response.status}")
-                    if response.status == 200:
-                        results = await response.json()
-                        result = {
-                            "success": True,
-                            "results": results,
-                            "query": query,
-                            "count": len(results) if isinstance(results, list) else 0
-                        }
-                        print(f"Search successful: Found {result['count']} tracks")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        result = {"success": False, "error": f"Search failed: {error_text}"}
-                        print(f"Search failed: {result}")
-                        return result
+            status, body = await self._request("GET", "/player/search", timeout, hedge=True,
+                                               params={"query": query})
+            print(f"HTTP Response: {status}")
+            if status == 200:
+                results = json.loads(body)
+                result = {
+                    "success": True,
+                    "results": results,
+                    "query": query,
+                    "count": len(results) if isinstance(results, list) else 0
+                }
+                print(f"Search successful: Found {result['count']} tracks")
+                if self.track_index is not None and result["count"]:
+                    self.track_index.cache_search(query, results)
+                return result
+            else:
+                result = {"success": False, "error": f"Search failed: {body}"}
+                print(f"Search failed: {result}")
+                return result
         except Exception as e:
-            result = {"success": False, "error": f"Network error: {str(e)}"}
-            print(f"Search network error: {result}")
-            return result
+            return self._network_error("Search", e)
+
+    def _search_locally(self, query: str) -> Optional[Dict[str, Any]]:
+        """Answer a search from the query cache or a confident track index match, if possible."""
+        if self.track_index is None:
+            return None
+        try:
+            results = self.track_index.cached_search(query)
+            source = "cache"
+            if results is None:
+                results = self.track_index.lookup(query)
+                source = "index"
+        except Exception as e:
+            print(f"Track index error: {e}")
+            return None
+        if results is None:
+            return None
+        print(f"Search answered from local {source}: Found {len(results)} tracks")
+        return {
+            "success": True,
+            "results": results,
+            "query": query,
+            "count": len(results),
+            "source": source
+        }
 
-    async def play_track(self, track_id: str) -> Dict[str, Any]:
+    async def play_track(self, track_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         Play a specific track by ID.
         
         Args:
             track_id: Spotify track ID or URI
+            timeout: Request timeout in seconds (default: request_timeout)
             
         Returns:
             Dict containing play result or error information
         """
+        return await self._coalesce(("play", track_id), lambda: self._play_track(track_id, timeout))
+    
+    async def _play_track(self, track_id: str, timeout: Optional[float]) -> Dict[str, Any]:
         print(f"Playing track: '{track_id}'")
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.base_url}/player/play/search", 
-                                     json={"uri": track_id}) as response:
-                    print(f"HTTP Response: {response.status}")
-                    if response.status == 200:
-                        result = {"success": True, "message": f"Playing track: {track_id}"}
-                        print(f"Play track successful: {result}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        result = {"success": False, "error": f"Failed to play track: {error_text}"}
-                        print(f"Play track failed: {result}")
-                        return result
+            status, body = await self._request("POST", "/player/play/search", timeout, json={"uri": track_id})
+            print(f"HTTP Response: {status}")
+            if status == 200:
+                result = {"success": True, "message": f"Playing track: {track_id}"}
+                print(f"Play track successful: {result}")
+                return result
+            else:
+                result = {"success": False, "error": f"Failed to play track: {body}"}
+                print(f"Play track failed: {result}")
+                return result
         except Exception as e:
-            result = {"success": False, "error": f"Network error: {str(e)}"}
-            print(f"Play track network error: {result}")
-            return result
+            return self._network_error("Play track", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Coalescing, circuit breaker and latency counters."""
+        return {
+            "coalesced": self._single_flight.coalesced,
+            "breaker_state": self.circuit_breaker.state,
+            "breaker_trips": self.circuit_breaker.trips,
+            "breaker_rejected": self.circuit_breaker.rejected,
+            "p95_latency": {path: tracker.percentile(95) for path, tracker in self._latency.items()},
+        }
 
     def format_search_results(self, results: List[Dict]) -> str:
         """
@@ -172,6 +365,8 @@ async def test_spotify_tools():
     print("\n--- Testing Pause ---")
     pause_result = await tools.pause_playback()
     print(f"Pause result: {json.dumps(pause_result, indent=2)}")
+    
+    await tools.aclose()
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import time
+from typing import Iterable, List, Optional
+
+
+class StartupTimer:
+    """Record how long each startup phase takes and print a breakdown."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.phases = []
+
+    def mark(self, phase: str) -> float:
+        """Close the current phase under ``phase``; returns its duration in seconds."""
+        now = time.perf_counter()
+        duration = now - self._last
+        self.phases.append((phase, duration))
+        self._last = now
+        return duration
+
+    def total(self) -> float:
+        return self._last - self.start
+
+    def report(self) -> str:
+        lines = ["⏱️ Startup timing:"]
+        for phase, duration in self.phases:
+            lines.append(f"   - {phase:<28} {duration * 1000:8.1f} ms")
+        lines.append(f"   = {'total':<28} {self.total() * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def openwakeword_model_files(wakeword_models: Iterable[str], inference_framework: str = "onnx") -> List[str]:
+    """Return the pretrained files openwakeword needs for the given wake words (feature models included)."""
+    import openwakeword
+
+    ext = f".{inference_framework}"
+    paths = [m["model_path"] for m in openwakeword.FEATURE_MODELS.values()]
+    paths += [openwakeword.VAD_MODELS[name]["model_path"] for name in openwakeword.VAD_MODELS]
+    for name in wakeword_models:
+        if name in openwakeword.MODELS:
+            paths.append(openwakeword.MODELS[name]["model_path"])
+        else:
+            paths.append(name)   # custom model given by path
+    return [os.path.splitext(p)[0] + ext if p.endswith(".tflite") else p for p in paths]
+
+
+def verify_model_manifest(paths: Iterable[str], manifest_path: str) -> bool:
+    """
+    Check model files against a local manifest without touching the downloader.
+
+    Files whose size and mtime match the manifest are trusted as-is; a file
+    whose mtime changed is re-hashed and compared with the recorded sha256.
+    Returns False if any file is missing, changed or not in the manifest.
+    """
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    updated = False
+    for path in paths:
+        entry = manifest.get(os.path.abspath(path))
+        if entry is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != entry["size"]:
+            return False
+        if st.st_mtime_ns != entry["mtime_ns"]:
+            if _sha256(path) != entry["sha256"]:
+                return False
+            entry["mtime_ns"] = st.st_mtime_ns
+            updated = True
+
+    if updated:
+        _write_json(manifest_path, manifest)
+    return True
+
+
+def write_model_manifest(paths: Iterable[str], manifest_path: str) -> None:
+    """Hash the given model files and record them in the manifest."""
+    manifest = {}
+    for path in paths:
+        st = os.stat(path)
+        manifest[os.path.abspath(path)] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": _sha256(path),
+        }
+    _write_json(manifest_path, manifest)
+
+
+def _write_json(path: str, data: dict) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def default_manifest_path() -> str:
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "alexa-for-brokies", "model_manifest.json")
+
+
+def _download_feature_models(inference_framework: str = "onnx") -> None:
+    """Download only the shared melspectrogram, embedding and VAD models that are missing."""
+    import openwakeword
+    import openwakeword.utils
+
+    ext = f".{inference_framework}"
+    for model in list(openwakeword.FEATURE_MODELS.values()) + list(openwakeword.VAD_MODELS.values()):
+        path, url = model["model_path"], model["download_url"]
+        if path.endswith(".tflite"):
+            path, url = os.path.splitext(path)[0] + ext, url.replace(".tflite", ext)
+        if not os.path.exists(path):
+            openwakeword.utils.download_file(url, os.path.dirname(path))
+
+
+def ensure_models(wakeword_models: Iterable[str], manifest_path: Optional[str] = None,
+                  inference_framework: str = "onnx") -> str:
+    """
+    Make sure the wake-word models are on disk, downloading only on a cache miss.
+
+    Custom models given by path are never downloaded; a missing one raises
+    FileNotFoundError.
+
+    Returns "cached" when the manifest check passed, otherwise "downloaded".
+    """
+    import openwakeword
+
+    manifest_path = manifest_path or default_manifest_path()
+    wakeword_models = list(wakeword_models)
+    missing = [m for m in wakeword_models if m not in openwakeword.MODELS and not os.path.exists(m)]
+    if missing:
+        raise FileNotFoundError(f"Wake word model not found: {', '.join(missing)}")
+
+    paths = openwakeword_model_files(wakeword_models, inference_framework)
+    if verify_model_manifest(paths, manifest_path):
+        return "cached"
+
+    import openwakeword.utils
+    pretrained = [m for m in wakeword_models if m in openwakeword.MODELS]
+    if pretrained:
+        openwakeword.utils.download_models(pretrained)
+    else:
+        # download_models([]) would fetch every pretrained wake word model
+        _download_feature_models(inference_framework)
+    write_model_manifest([p for p in paths if os.path.exists(p)], manifest_path)
+    return "downloaded"
@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally parse a single JSON object arriving in arbitrary text pieces.
+
+    Top-level members are reported as soon as they are complete (i.e. once the
+    following ``,`` or the closing ``}`` arrives), so a caller can act on
+    ``"tool_name"`` before the rest of the object has been generated. Text
+    before the opening brace, such as a ```json fence, is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0              # next character to scan
+        self._start = -1           # index of the opening brace
+        self._member_start = -1    # start of the member currently being scanned
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add text; returns the (key, value) members completed by it, in order."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self._pos < len(text) and not self.complete:
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._start < 0:
+                if ch == "{":
+                    self._start = self._pos
+                    self._member_start = self._pos + 1
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_member(self._pos)
+                    self.complete = True
+            elif ch == "," and self._depth == 1:
+                completed += self._close_member(self._pos)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return completed
+
+    def _close_member(self, end: int) -> List[Tuple[str, Any]]:
+        member = self.text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            return []
+        items = list(parsed.items())
+        self.fields.update(parsed)
+        return items
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Return the whole object once the closing brace has arrived, else None."""
+        if not self.complete:
+            return None
+        try:
+            return json.loads(self.text[self._start:self._pos])
+        except json.JSONDecodeError:
+            return dict(self.fields)
@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+import numpy as np
+from typing import Callable, Optional, Sequence
+
+from tracing import get_tracer
+
+
+class SpeechToTextEngine:
+    """
+    Long-lived speech-to-text engine fed from the wake-word capture stream.
+
+    The RealtimeSTT recorder is built once with its own microphone disabled,
+    so there is a single input stream in the process. After a wake word the
+    engine is armed, the worker feeds it the same int16 chunks it already
+    reads, and the next finished utterance is passed to ``on_text``. Arming
+    and disarming only flip an event, so they take microseconds instead of
+    the seconds it takes to construct an AudioToTextRecorder.
+
+    arm() accepts a pre-roll of audio captured before the wake word was
+    confirmed, so a command spoken in the same breath as the wake word
+    ("Alexa pause") is not lost. The wake word itself is stripped from the
+    start of the transcript.
+
+    With ``on_partial`` set, RealtimeSTT's realtime transcription is enabled
+    and stabilized partial transcripts are passed on while the user is still
+    speaking, so callers can start work speculatively.
+
+    Each armed utterance carries a trace ID (passed to arm() or minted
+    there); ``on_text`` and ``on_partial`` run inside that trace, and the
+    "stt" (arm to final text) and "stt.transcribe" (end of speech to final
+    text) spans are recorded under it.
+    """
+
+    def __init__(self, on_text: Callable[[str], None], sample_rate: int = 16000,
+                 wake_words: Sequence[str] = ("alexa",),
+                 on_partial: Optional[Callable[[str], None]] = None, **recorder_kwargs):
+        """
+        Args:
+            on_text: Called with the final transcript of each utterance
+            sample_rate: Sample rate of the chunks passed to feed()
+            wake_words: Wake words to strip from the start of transcripts
+            on_partial: Called (from the recorder's thread) with partial transcripts
+            **recorder_kwargs: Extra keyword arguments for AudioToTextRecorder
+        """
+        self.on_text = on_text
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self.wake_word_pattern = None
+        if wake_words:
+            alternatives = "|".join(re.escape(w) for w in wake_words)
+            self.wake_word_pattern = re.compile(rf"^\W*(?:hey\s+)?(?:{alternatives})\b[\s,.!?]*", re.IGNORECASE)
+        self.recorder_kwargs = recorder_kwargs
+        self.recorder = None
+
+        self._armed = threading.Event()
+        self._stopping = threading.Event()
+        self._load_done = threading.Event()
+        self._loading = False
+        self._listener = None
+        self.armed_at = 0.0
+        self.load_time = 0.0
+        self.tracer = get_tracer()
+        self.trace_id = None
+        self._armed_perf = 0.0
+        self._speech_end = None
+
+    @property
+    def ready(self) -> bool:
+        return self.recorder is not None
+
+    @property
+    def armed(self) -> bool:
+        return self._armed.is_set()
+
+    def load(self):
+        """Build the recorder (loads VAD and the transcription model) and start the listener thread."""
+        if self.recorder is not None:
+            return
+
+        self._loading = True
+        start = time.perf_counter()
+        try:
+            # Deferred import: RealtimeSTT pulls in torch and friends
+            from RealtimeSTT import AudioToTextRecorder
+
+            kwargs = {"spinner": False}
+            if self.on_partial is not None:
+                kwargs["enable_realtime_transcription"] = True
+                kwargs["on_realtime_transcription_stabilized"] = self._handle_partial
+            if self.tracer.enabled:
+                kwargs["on_recording_stop"] = self._handle_recording_stop
+            kwargs.update(self.recorder_kwargs)
+            kwargs["use_microphone"] = False
+            self.recorder = AudioToTextRecorder(**kwargs)
+        finally:
+            self.load_time = time.perf_counter() - start
+            self._loading = False
+            self._load_done.set()
+
+        self._listener = threading.Thread(target=self._listen_loop, daemon=True)
+        self._listener.start()
+
+    def load_async(self) -> threading.Thread:
+        """Load the engine on a background thread so the wake-word stream can open first."""
+        self._loading = True
+
+        def _load():
+            try:
+                self.load()
+                print(f"STT engine ready ({self.load_time:.1f}s)")
+            except Exception as e:
+                print(f"STT engine failed to load: {e}")
+
+        thread = threading.Thread(target=_load, daemon=True)
+        thread.start()
+        return thread
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until a pending load finishes; returns True if the engine is usable."""
+        if self.recorder is None and self._loading:
+            self._load_done.wait(timeout)
+        return self.recorder is not None
+
+    def arm(self, preroll: Optional[np.ndarray] = None, trace_id: Optional[str] = None):
+        """
+        Start capturing the next utterance.
+
+        Args:
+            preroll: int16 audio captured just before arming (any shape), fed ahead of the live stream
+            trace_id: Trace of the command being captured (default: a new one)
+        """
+        if self.recorder is None:
+            if self._loading:
+                print("Waiting for the STT engine to finish loading...")
+            if not self.wait_ready():
+                raise RuntimeError("SpeechToTextEngine is not loaded; call load() or load_async() first")
+        if not self._armed.is_set():
+            self.recorder.clear_audio_queue()
+            self.armed_at = time.time()
+            self.trace_id = trace_id or self.tracer.new_trace_id()
+            self._armed_perf = time.perf_counter()
+            self._speech_end = None
+            self._armed.set()
+            if preroll is not None and preroll.size:
+                self.recorder.feed_audio(preroll.reshape(-1), original_sample_rate=self.sample_rate)
+
+    def strip_wake_word(self, text: str) -> str:
+        """Remove a leading wake word (e.g. "Alexa, pause" -> "pause")."""
+        if self.wake_word_pattern is None:
+            return text
+        return self.wake_word_pattern.sub("", text, count=1).strip()
+
+    def disarm(self):
+        """Stop capturing and abandon any utterance in progress."""
+        if self._armed.is_set():
+            self._armed.clear()
+            try:
+                self.recorder.abort()
+            except Exception as e:
+                print(f"STT abort error: {e}")
+
+    def feed(self, chunk: np.ndarray):
+        """Feed an int16 audio chunk; ignored while the engine is not armed."""
+        if self._armed.is_set():
+            self.recorder.feed_audio(chunk, original_sample_rate=self.sample_rate)
+
+    def _handle_partial(self, text: str):
+        if not self._armed.is_set():
+            return
+        text = self.strip_wake_word(text or "")
+        if text:
+            try:
+                with self.tracer.trace(self.trace_id):
+                    self.on_partial(text)
+            except Exception as e:
+                print(f"STT partial callback error: {e}")
+
+    def _handle_recording_stop(self):
+        if self._armed.is_set():
+            self._speech_end = time.perf_counter()
+
+    def _listen_loop(self):
+        while not self._stopping.is_set():
+            if not self._armed.wait(timeout=0.5):
+                continue
+            try:
+                text = self.recorder.text()
+            except Exception as e:
+                if not self._stopping.is_set():
+                    print(f"STT error: {e}")
+                self._armed.clear()
+                continue
+
+            if not self._armed.is_set():
+                # Disarmed while waiting; drop whatever the recorder returned
+                continue
+            self._armed.clear()
+
+            now = time.perf_counter()
+            self.tracer.record("stt", self._armed_perf, now, trace_id=self.trace_id, chars=len(text or ""))
+            if self._speech_end is not None:
+                self.tracer.record("stt.transcribe", self._speech_end, now, trace_id=self.trace_id)
+
+            text = self.strip_wake_word(text or "")
+            if text:
+                try:
+                    with self.tracer.trace(self.trace_id):
+                        self.on_text(text)
+                except Exception as e:
+                    print(f"STT callback error: {e}")
+
+    def shutdown(self):
+        """Stop the listener thread and release the recorder."""
+        self._stopping.set()
+        self.disarm()
+        if self.recorder is not None:
+            try:
+                self.recorder.shutdown()
+            except Exception as e:
+                print(f"STT shutdown error: {e}")
+            self.recorder = None
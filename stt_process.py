@@ -0,0 +1,125 @@
+import os
+import queue
+import numpy as np
+from typing import Callable, Optional, Tuple
+
+from shared_audio import SharedAudioRing, pin_to_cores
+from stt_engine import SpeechToTextEngine
+from tracing import get_tracer, trace_path
+
+
+def _make_command_handler() -> Tuple[Optional[Callable[[str], None]], Optional[Callable[[str], None]]]:
+    """
+    Build voice command handlers backed by one long-lived CommandWorker.
+
+    Returns (handle_text, handle_partial). Both return immediately; commands
+    run on the worker's event loop, so partial transcripts can start
+    speculative searches while the utterance is still being spoken.
+    """
+    # Only the Gemini backend (also behind "record") needs an API key; stub and replay run offline
+    backend = (os.environ.get("ALEXA_LLM_BACKEND") or "gemini").lower()
+    if backend in ("gemini", "record") and not os.environ.get("GEMINI_API_KEY"):
+        print("GEMINI_API_KEY not set; transcripts will only be printed")
+        return None, None
+    try:
+        from command_worker import CommandWorker
+    except ImportError as e:
+        print(f"AI agent import error: {e}")
+        return None, None
+
+    worker = CommandWorker()
+    if not worker.start():
+        return None, None
+
+    def report(future):
+        try:
+            print(f"🤖 {future.result().get('response')}")
+        except Exception as e:
+            print(f"⚠️ Voice command error: {e}")
+
+    def handle(text: str):
+        worker.submit(text, callback=report)
+
+    return handle, worker.submit_partial
+
+
+def run_stt_agent_process(shm_name: str, wake_events, stt_busy, stop_event,
+                          preroll_chunks: int, sample_rate: int = 16000, cores=None):
+    """
+    Entry point of the STT/agent process.
+
+    Waits for wake events from the capture process, arms the speech-to-text
+    engine with the pre-roll read back from the shared ring, then follows the
+    ring's write cursor and feeds live chunks until the utterance is done.
+    Transcripts go to the voice command pipeline, which therefore never
+    competes with wake-word inference for the GIL.
+
+    Args:
+        shm_name: Name of the SharedAudioRing created by the capture process
+        wake_events: multiprocessing.Queue of {"seq", "word", "score"} dicts (None = shut down)
+        stt_busy: multiprocessing.Event set while the engine is armed
+        stop_event: multiprocessing.Event set when the capture process shuts down
+        preroll_chunks: Chunks before the wake word to hand to STT
+        sample_rate: Sample rate of the shared audio
+        cores: Optional CPU cores to pin this process to
+    """
+    if pin_to_cores(cores):
+        print(f"📌 STT/agent process pinned to cores {sorted(cores)}")
+
+    ring = SharedAudioRing(name=shm_name)
+    chunk = np.zeros(ring.chunk_size, dtype=np.int16)
+    preroll = np.zeros((preroll_chunks, ring.chunk_size), dtype=np.int16)
+
+    handle_command, handle_partial = _make_command_handler()
+    tracer = get_tracer()
+
+    def on_text(txt):
+        print(f"🗣️ You said: {txt}")
+        if handle_command is not None:
+            try:
+                handle_command(txt)
+            except Exception as e:
+                print(f"⚠️ Voice command error: {e}")
+
+    engine = SpeechToTextEngine(on_text=on_text, sample_rate=sample_rate, on_partial=handle_partial)
+    print("🔄 [STT process] Loading speech-to-text engine...")
+    engine.load()
+    print(f"✅ [STT process] Speech-to-text engine ready ({engine.load_time:.1f}s).")
+
+    try:
+        while not stop_event.is_set():
+            try:
+                event = wake_events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if event is None:
+                break
+
+            seq = event["seq"]
+            n = ring.read_range(seq - preroll_chunks + 1, seq + 1, preroll)
+            engine.arm(preroll=preroll[:n], trace_id=event.get("trace_id"))
+            if event.get("detected_at") is not None:
+                # perf_counter is system-wide, so the capture process's timestamp is comparable
+                tracer.record("wake.handoff", event["detected_at"], trace_id=engine.trace_id)
+            stt_busy.set()
+            print(f"🎤 [STT process] Listening (wake word '{event['word']}', pre-roll {n} chunks)")
+
+            cursor = seq + 1
+            while engine.armed and not stop_event.is_set():
+                if not ring.wait_for(cursor, timeout=0.1):
+                    continue
+                ok, cursor = ring.read_into(cursor, chunk)
+                if ok:
+                    engine.feed(chunk)
+            stt_busy.clear()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stt_busy.clear()
+        engine.shutdown()
+        ring.close()
+        if ring.lost_chunks:
+            print(f"⚠️ [STT process] Lost {ring.lost_chunks} chunks while falling behind")
+        if tracer.enabled:
+            print(f"📊 [STT process] {tracer.report()}")
+            print(f"📊 [STT process] Trace written to {tracer.export_chrome(trace_path('stt'))}")
@@ -0,0 +1,171 @@
+import time
+
+import numpy as np
+import pytest
+
+from audio_pipeline import COALESCE, DROP_NEWEST, DROP_OLDEST, AudioRingBuffer, EnergyGate, WakeWordDetector
+
+CHUNK = 4
+
+
+def chunk(value):
+    return np.full(CHUNK, value, dtype=np.int16)
+
+
+def write_chunks(ring, values):
+    for value in values:
+        ring.write_int16(chunk(value))
+
+
+def read_values(ring):
+    values = []
+    while ring.pending():
+        values.append(int(ring.read(timeout=0)[0]))
+    return values
+
+
+@pytest.mark.parametrize("policy, expected, overruns", [
+    (DROP_OLDEST, [3, 4, 5, 6], 2),
+    (DROP_NEWEST, [1, 2, 3, 4], 2),
+    (COALESCE, [4, 5, 6], 3),   # backlog dropped down to the newest complete chunk
+])
+def test_overflow_policies(policy, expected, overruns):
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=4, policy=policy)
+    write_chunks(ring, range(1, 7))
+    assert read_values(ring) == expected
+    assert ring.overruns == overruns
+    assert ring.stats()["pending"] == 0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AudioRingBuffer(CHUNK, policy="drop_everything")
+
+
+def test_held_chunk_is_never_overwritten():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=2, policy=DROP_OLDEST)
+    write_chunks(ring, [1])
+    held = ring.read(timeout=0)
+    write_chunks(ring, [2, 3, 4])
+    assert held[0] == 1
+    assert ring.overruns > 0
+    ring.release()
+
+
+def test_partial_writes_are_assembled_into_chunks():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=4)
+    ring.write_int16(np.arange(6, dtype=np.int16))
+    assert ring.pending() == 1
+    ring.write_int16(np.arange(6, 8, dtype=np.int16))
+    assert read_values(ring) == [0, 4]
+
+
+def test_float_samples_are_scaled_and_clipped():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=4, max_block_size=3)
+    ring.write(np.array([0.5, -1.5, 2.0, 0.0], dtype=np.float32))
+    assert ring.read(timeout=0).tolist() == [16383, -32768, 32767, 0]
+
+
+def test_max_latency_skips_stale_chunks_but_keeps_the_newest():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=8, max_latency=0.05)
+    write_chunks(ring, [1, 2, 3])
+    time.sleep(0.1)
+    assert read_values(ring) == [3]
+    assert ring.late_drops == 2
+
+
+def test_read_times_out_and_returns_none_after_close():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=4)
+    assert ring.read(timeout=0.01) is None
+    write_chunks(ring, [1])
+    ring.close()
+    assert int(ring.read(timeout=0)[0]) == 1
+    assert ring.read(timeout=0) is None
+
+
+LOUD = np.full(CHUNK, 8000, dtype=np.int16)
+QUIET = np.zeros(CHUNK, dtype=np.int16)
+
+
+def test_energy_gate_level():
+    gate = EnergyGate(CHUNK)
+    assert gate.level_dbfs(np.full(CHUNK, 32767, dtype=np.int16)) == pytest.approx(0.0, abs=0.01)
+    assert gate.level_dbfs(QUIET) < -100
+
+
+def test_energy_gate_hangover():
+    gate = EnergyGate(CHUNK, hangover_chunks=2, context_chunks=0)
+    assert not gate.check(QUIET)
+    assert gate.check(LOUD)
+    assert [gate.check(QUIET) for _ in range(3)] == [True, True, False]
+    assert gate.stats() == {"evaluated": 3, "skipped": 2, "replayed": 0, "skip_ratio": 0.4}
+
+
+def test_energy_gate_replays_the_latest_skipped_chunks_once():
+    gate = EnergyGate(CHUNK, hangover_chunks=0, context_chunks=3)
+    for i in range(1, 6):
+        assert not gate.check(np.full(CHUNK, i, dtype=np.int16))
+    assert gate.check(LOUD)
+    assert [int(c[0]) for c in gate.drain_context()] == [3, 4, 5]
+    assert list(gate.drain_context()) == []
+    assert gate.replayed == 3
+
+
+def test_energy_gate_reset_drops_context():
+    gate = EnergyGate(CHUNK, hangover_chunks=0, context_chunks=3)
+    gate.check(QUIET)
+    gate.reset()
+    assert gate.check(LOUD)
+    assert list(gate.drain_context()) == []
+
+
+def test_copy_history_ends_with_the_last_read_chunk():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=8)
+    write_chunks(ring, [1, 2, 3, 4])
+    for _ in range(3):
+        ring.read(timeout=0)
+    out = np.zeros((2, CHUNK), dtype=np.int16)
+    assert ring.copy_history(out) == 2
+    assert out[:, 0].tolist() == [2, 3]
+
+
+def test_copy_history_is_limited_to_intact_chunks():
+    ring = AudioRingBuffer(CHUNK, capacity_chunks=4)
+    out = np.zeros((8, CHUNK), dtype=np.int16)
+    assert ring.copy_history(out) == 0
+    write_chunks(ring, range(1, 7))
+    read_values(ring)
+    count = ring.copy_history(out)
+    assert count == 3
+    assert out[:count, 0].tolist() == [4, 5, 6]
+
+
+def test_detector_smooths_over_the_window():
+    detector = WakeWordDetector(["alexa", "hey_jarvis"], threshold=0.5, smoothing_window=3)
+    # Until the window fills, raw scores are compared with the threshold
+    assert detector.update({"alexa": 0.1, "hey_jarvis": 0.6}, now=0.0) == [("hey_jarvis", 0.6)]
+    assert detector.update({"alexa": 0.9, "hey_jarvis": 0.0}, now=1.0) == [("alexa", 0.9)]
+    hits = detector.update({"alexa": 0.8, "hey_jarvis": 0.0}, now=2.0)
+    assert hits == [("alexa", pytest.approx(0.6))]
+    assert detector.update({"alexa": 0.0, "hey_jarvis": 0.0}, now=3.0) == [("alexa", pytest.approx(0.5667, abs=1e-4))]
+    assert detector.update({"alexa": 0.0, "hey_jarvis": 0.0}, now=4.0) == []
+    assert detector.last_detect_time == 3.0
+    assert detector.in_cooldown(4.0)
+    assert not detector.in_cooldown(5.5)
+
+
+def test_detector_running_sums_match_the_window_mean():
+    rng = np.random.default_rng(0)
+    scores = rng.random((WakeWordDetector.RESYNC_INTERVAL + 10, 2))
+    detector = WakeWordDetector(["a", "b"], threshold=2.0, smoothing_window=5)
+    for row in scores:
+        detector.update_scores(row, now=0.0)
+    np.testing.assert_allclose(detector._smoothed, scores[-5:].mean(axis=0))
+
+
+def test_detector_reset_forgets_history():
+    detector = WakeWordDetector(["alexa"], threshold=0.5, smoothing_window=2)
+    detector.update({"alexa": 1.0}, now=0.0)
+    detector.update({"alexa": 1.0}, now=0.0)
+    detector.reset()
+    assert detector.update({"alexa": 0.4}, now=0.0) == []
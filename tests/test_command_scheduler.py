@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from command_scheduler import CommandScheduler
+
+
+class SlowProcessor:
+    def __init__(self, delay=0.02, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.seen = []
+
+    async def process_voice_command(self, text, session="default"):
+        self.seen.append((text, session))
+        await asyncio.sleep(self.delay)
+        if text in self.failing:
+            raise RuntimeError(text)
+        return {"success": True, "text": text}
+
+
+def run_all(scheduler, commands):
+    async def run():
+        tasks = [scheduler.schedule(text, session) for text, session in commands]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_commands_are_counted_once_each():
+    processor = SlowProcessor(failing={"boom"})
+    scheduler = CommandScheduler(processor, max_concurrency=2)
+    results = run_all(scheduler, [("pause", "a"), ("boom", "b"), ("resume", "c")])
+    assert isinstance(results[1], RuntimeError)
+    stats = scheduler.stats()
+    assert (stats["submitted"], stats["completed"], stats["failed"], stats["cancelled"]) == (3, 2, 1, 0)
+    assert (stats["running"], stats["waiting"]) == (0, 0)
+    assert processor.seen == [("pause", "a"), ("boom", "b"), ("resume", "c")]
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 2])
+def test_superseded_commands_count_as_cancelled(max_concurrency):
+    # "a" is superseded before its task first runs; with one slot, "c" is superseded while waiting
+    processor = SlowProcessor()
+    scheduler = CommandScheduler(processor, max_concurrency=max_concurrency)
+    results = run_all(scheduler, [("a", "x"), ("b", "x"), ("c", "y"), ("d", "y")])
+    assert [isinstance(r, asyncio.CancelledError) for r in results] == [True, False, True, False]
+    stats = scheduler.stats()
+    assert (stats["cancelled"], stats["superseded"], stats["completed"]) == (2, 2, 2)
+    assert (stats["running"], stats["waiting"]) == (0, 0)
+    assert processor.seen == [("b", "x"), ("d", "y")]
+
+
+def test_cancel_running_command():
+    processor = SlowProcessor(delay=1)
+    scheduler = CommandScheduler(processor)
+
+    async def run():
+        task = scheduler.schedule("play jazz")
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["running"] == 1
+        assert scheduler.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert not scheduler.cancel()
+
+    asyncio.run(run())
+    assert scheduler.stats()["cancelled"] == 1
+    assert scheduler.stats()["running"] == 0
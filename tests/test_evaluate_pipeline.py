@@ -0,0 +1,22 @@
+import argparse
+import asyncio
+
+from evaluate_pipeline import SAMPLE_TRANSCRIPTS, evaluate
+
+
+def stub_args(**overrides):
+    args = dict(concurrency=4, repeat=1, warmup=0, seed=0, llm="stub",
+                llm_latency_ms=1.0, llm_jitter_ms=0.0, llm_dist="fixed",
+                spotify_url=None, catalog=None, spotify_latency_ms=1.0, spotify_jitter_ms=0.0,
+                spotify_dist="fixed", no_local_intents=False, no_llm_cache=False, no_templates=False,
+                no_stream=False, no_track_index=False, verbose=False, trace=None)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_sample_transcripts_match_their_labels():
+    report = asyncio.run(evaluate(stub_args(), SAMPLE_TRANSCRIPTS))
+    assert report["llm_backend"] == "stub"
+    assert report["labeled"] == len(SAMPLE_TRANSCRIPTS)
+    assert report["intent_accuracy"] == 1.0, report["confusion"]
+    assert report["success_rate"] == 1.0
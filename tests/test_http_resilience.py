@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+import http_resilience
+from http_resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, SingleFlight, hedged
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(http_resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_success()   # resets the consecutive count
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert (breaker.trips, breaker.rejected) == (1, 1)
+
+
+def test_breaker_lets_one_trial_through_when_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock[0] += 5
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_failure()   # the trial failed: open again
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 5
+
+    clock[0] += 5
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_cancelled_trial_allows_another(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    clock[0] += 1
+    breaker.before_request()
+    breaker.record_cancelled()
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(window=10, min_samples=3)
+    tracker.add(0.1)
+    tracker.add(0.2)
+    assert tracker.percentile(50) is None
+    tracker.add(0.3)
+    assert tracker.percentile(50) == pytest.approx(0.2)
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)))
+        later = await flight.do("key", fetch)   # the first call has finished, so this one runs again
+        return flight, results, later
+
+    flight, results, later = asyncio.run(run())
+    assert results == ["result"] * 3 and later == "result"
+    assert len(calls) == 2
+    assert flight.coalesced == 2
+
+
+def test_single_flight_cancels_the_call_only_with_its_last_caller():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await started.wait()
+        first.cancel()
+        assert await second == "result"
+
+        third = asyncio.ensure_future(flight.do("other", fetch))
+        await asyncio.sleep(0)
+        shared = flight._calls["other"][0]
+        third.cancel()
+        await asyncio.gather(third, return_exceptions=True)
+        await asyncio.sleep(0)
+        return shared
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_hedged_returns_the_faster_attempt_and_cancels_the_other():
+    async def run():
+        delays = [0.2, 0.01]
+        attempts = []
+
+        async def attempt():
+            delay = delays[len(attempts)]
+            attempts.append(asyncio.current_task())
+            await asyncio.sleep(delay)
+            return delay
+
+        result = await hedged(attempt, delay=0.02)
+        await asyncio.sleep(0)
+        return result, attempts
+
+    result, attempts = asyncio.run(run())
+    assert result == 0.01
+    assert len(attempts) == 2 and attempts[0].cancelled()
+
+
+def test_hedged_falls_back_to_the_attempt_that_succeeds():
+    async def run():
+        attempts = []
+
+        async def attempt():
+            attempts.append(1)
+            if len(attempts) == 1:
+                await asyncio.sleep(0.03)
+                raise ConnectionError("first attempt failed")
+            await asyncio.sleep(0.05)
+            return "second"
+
+        return await hedged(attempt, delay=0.01)
+
+    assert asyncio.run(run()) == "second"
+
+
+def test_hedged_raises_when_every_attempt_fails():
+    async def attempt():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(hedged(attempt, delay=None))
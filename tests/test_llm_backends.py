@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+from llm_backends import LatencyModel, RecordReplayBackend, StubBackend, make_backend, prompt_key
+
+
+def tool_prompt(voice_input):
+    return f'Current date: 2026-01-01\nUSER VOICE INPUT: "{voice_input}"\n'
+
+
+async def collect(stream):
+    return "".join([piece async for piece in stream])
+
+
+@pytest.fixture(scope="module")
+def stub():
+    return StubBackend()
+
+
+@pytest.mark.parametrize("distribution", LatencyModel.DISTRIBUTIONS)
+def test_latency_model_is_seeded_and_non_negative(distribution):
+    samples = [LatencyModel(0.1, 0.5, distribution, seed=7).sample() for _ in range(2)]
+    assert samples[0] == samples[1]
+    model = LatencyModel(0.1, 0.5, distribution)
+    assert all(model.sample() >= 0.0 for _ in range(200))
+
+
+def test_latency_model_rejects_unknown_distribution():
+    with pytest.raises(ValueError):
+        LatencyModel(distribution="pareto")
+
+
+def test_stub_selects_tools(stub):
+    assert json.loads(stub.respond(tool_prompt("pause the music")))["tool_name"] == "pause"
+    unknown = json.loads(stub.respond(tool_prompt("something by that band from the radio")))
+    assert unknown["tool_name"] == "search"
+    assert unknown["tool_input"] == "something by that band from the radio"
+
+
+@pytest.mark.parametrize("text", ["what's the weather like", "tell me a joke"])
+def test_stub_answers_non_music_input_without_a_tool(stub, text):
+    response = json.loads(stub.respond(tool_prompt(text)))
+    assert response["tool_call"] is False
+    assert response["tool_name"] is None
+    assert response["response"]
+
+
+def test_stub_splits_multi_step_commands(stub):
+    response = json.loads(stub.respond(tool_prompt("pause and then search for jazz")))
+    assert [(c["tool_name"], c["tool_input"]) for c in response["tool_calls"]] == [("pause", None), ("search", "jazz")]
+
+
+def test_stub_second_pass_plays_the_first_result(stub):
+    listing = json.dumps([{"name": "So What", "artist": "Miles Davis", "uri": "spotify:track:sowhat"}])
+    prompt = f"TOOL CALLED: search\nTOOL OUTPUT: Found 1 tracks\n{listing}\n\nTASK: respond"
+    response = json.loads(stub.respond(prompt))
+    assert response["tool_name"] == "play"
+    assert response["tool_input"] == "spotify:track:sowhat"
+
+
+def test_stub_stream_reassembles_and_times_out():
+    backend = StubBackend(latency=LatencyModel(0.2), stream_chunk_chars=5)
+    assert json.loads(asyncio.run(collect(backend.astream(tool_prompt("pause")))))["tool_name"] == "pause"
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(collect(backend.astream(tool_prompt("pause"), timeout=0.05)))
+
+
+def test_prompt_key_ignores_the_date_line():
+    assert prompt_key(tool_prompt("pause")) == prompt_key(tool_prompt("pause").replace("2026-01-01", "2027-05-05"))
+    assert prompt_key(tool_prompt("pause")) != prompt_key(tool_prompt("resume"))
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "recording.jsonl")
+    recorder = RecordReplayBackend(path, mode="record", inner=StubBackend())
+    recorded = recorder.generate(tool_prompt("pause"))
+    streamed = asyncio.run(collect(recorder.astream(tool_prompt("resume"))))
+
+    replay = RecordReplayBackend(path, replay_latency=False)
+    assert replay.generate(tool_prompt("pause")) == recorded
+    assert asyncio.run(replay.acall(tool_prompt("resume"))) == streamed
+    with pytest.raises(KeyError):
+        replay.generate(tool_prompt("next track"))
+    assert (replay.hits, replay.misses) == (2, 1)
+
+
+def test_record_mode_needs_an_inner_backend(tmp_path):
+    with pytest.raises(ValueError):
+        RecordReplayBackend(str(tmp_path / "r.jsonl"), mode="record")
+
+
+def test_make_backend_reads_the_environment(monkeypatch):
+    monkeypatch.setenv("ALEXA_LLM_BACKEND", "stub")
+    monkeypatch.setenv("ALEXA_STUB_LATENCY_MS", "250")
+    backend = make_backend()
+    assert isinstance(backend, StubBackend)
+    assert backend.latency.mean == 0.25
+    with pytest.raises(ValueError):
+        make_backend("gpt")
@@ -0,0 +1,86 @@
+import pytest
+
+from local_intents import LocalIntentClassifier, normalize
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return LocalIntentClassifier()
+
+
+def test_normalize_strips_filler_and_punctuation():
+    assert normalize("Hey, could you please PAUSE the music for me!") == "pause the music"
+
+
+@pytest.mark.parametrize("text, tool_name", [
+    ("pause the music", "pause"),
+    ("stop playing", "pause"),
+    ("resume", "start"),
+    ("play music", "start"),
+    ("play some music", "start"),
+    ("play something", "start"),
+])
+def test_grammar_commands(classifier, text, tool_name):
+    result = classifier.classify(text)
+    assert result["tool_name"] == tool_name
+    assert result["tool_input"] is None
+    assert result["confidence"] >= 0.9
+    assert result["source"] == "local"
+
+
+# The agent answers locally at or above this confidence (SpotifyVoiceAgent default)
+LOCAL_DISPATCH_THRESHOLD = 0.8
+
+
+@pytest.mark.parametrize("text", [
+    "play something else",
+    "play it louder",
+    "play my playlist",
+    "play this song",
+    "play anything by queen",
+])
+def test_play_without_a_real_query_is_left_to_the_llm(classifier, text):
+    result = classifier.classify(text)
+    assert result is None or result["confidence"] < LOCAL_DISPATCH_THRESHOLD
+
+
+@pytest.mark.parametrize("text, query", [
+    ("search for Bohemian Rhapsody", "bohemian rhapsody"),
+    ("find songs by Queen", "queen"),
+    ("play some rock music", "rock music"),
+    ("search for simon and garfunkel", "simon and garfunkel"),
+])
+def test_search_query_extraction(classifier, text, query):
+    result = classifier.classify(text)
+    assert result["tool_name"] == "search"
+    assert result["tool_input"] == query
+
+
+def test_nearest_neighbour_fallback(classifier):
+    result = classifier.classify("turn the music back on")
+    assert result["tool_name"] == "start"
+
+
+@pytest.mark.parametrize("text", [
+    "don't stop the music",
+    "do not pause",
+    "never stop playing",
+    "please do not stop",
+    "stop not the music",
+])
+def test_negated_commands_are_left_to_the_llm(classifier, text):
+    assert classifier.classify(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "search for jazz and then pause",
+    "play queen and then pause",
+    "pause then play",
+    "pause and search for take five",
+])
+def test_multi_command_utterances_are_left_to_the_llm(classifier, text):
+    assert classifier.classify(text) is None
+
+
+def test_empty_input(classifier):
+    assert classifier.classify("  ?! ") is None
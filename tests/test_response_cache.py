@@ -0,0 +1,68 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_cache_key_normalizes_the_utterance():
+    assert make_cache_key("Pause the music, please!", "first") == make_cache_key("pause the music", "first")
+    assert make_cache_key("pause", "first") != make_cache_key("pause", "second", "pause", "{}")
+    assert make_cache_key("pause", "second", "pause", "a") != make_cache_key("pause", "second", "pause", "b")
+
+
+def test_lru_eviction(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", {"response": "A"})
+    cache.put("b", {"response": "B"})
+    assert cache.get("a") == {"response": "A"}   # b is now the least recently used
+    cache.put("c", {"response": "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(clock):
+    cache = ResponseCache(ttl=10)
+    cache.put("a", {"response": "A"})
+    clock[0] += 9
+    assert cache.get("a") is not None
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_get_returns_a_copy(clock):
+    cache = ResponseCache()
+    cache.put("a", {"response": "A"})
+    cache.get("a")["response"] = "changed"
+    assert cache.get("a") == {"response": "A"}
+
+
+def test_sqlite_reload_keeps_live_entries_in_lru_order(clock, tmp_path):
+    path = str(tmp_path / "cache" / "llm_cache.sqlite")
+    cache = ResponseCache(max_entries=2, ttl=10, path=path)
+    cache.put("a", {"response": "A"})
+    clock[0] += 1
+    cache.put("b", {"response": "B"})
+    clock[0] += 1
+    cache.get("a")
+    cache.close()
+
+    reloaded = ResponseCache(max_entries=2, ttl=10, path=path)
+    assert reloaded.get("b") == {"response": "B"}
+    reloaded.put("c", {"response": "C"})   # evicts a, since b was used more recently
+    assert reloaded.get("a") is None
+    reloaded.close()
+
+    clock[0] += 20
+    expired = ResponseCache(max_entries=2, ttl=10, path=path)
+    assert len(expired) == 0
+    expired.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from response_synthesis import ResponseSynthesizer, rank_tracks, score_track
+
+
+def track(name, artist, uri=None):
+    return {"name": name, "artists": [{"name": artist}], "uri": uri or f"spotify:track:{name.lower()}"}
+
+
+@pytest.fixture
+def synthesizer():
+    return ResponseSynthesizer()
+
+
+@pytest.mark.parametrize("tool_name, response", [
+    ("pause", "I've paused your music."),
+    ("start", "I've resumed your music."),
+    ("play", "I've resumed your music."),
+])
+def test_playback_templates(synthesizer, tool_name, response):
+    result = synthesizer.synthesize(tool_name, None, {"success": True})
+    assert result["response"] == response
+    assert not result["tool_call"]
+    assert result["source"] == "template"
+
+
+def test_empty_search(synthesizer):
+    result = synthesizer.synthesize("search", "zzz", {"success": True, "results": []})
+    assert not result["tool_call"]
+    assert "couldn't find anything for zzz" in result["response"]
+
+
+def test_clear_search_match_is_played(synthesizer):
+    results = [track("Under Pressure", "Queen"), track("Bohemian Rhapsody", "Queen", "spotify:track:bohemian")]
+    result = synthesizer.synthesize("search", "bohemian rhapsody by queen", {"success": True, "results": results})
+    assert result["tool_call"]
+    assert result["tool_name"] == "play"
+    assert result["tool_input"] == "spotify:track:bohemian"
+    assert result["response"] == "I found Bohemian Rhapsody by Queen."
+
+
+def test_other_versions_of_the_same_song_are_not_ambiguous(synthesizer):
+    results = [track("Back in Black", "AC/DC", "spotify:track:original"),
+               track("Back in Black - Live", "AC/DC", "spotify:track:live")]
+    result = synthesizer.synthesize("search", "back in black", {"success": True, "results": results})
+    assert result["tool_input"] == "spotify:track:original"
+
+
+def test_ambiguous_search_is_left_to_the_llm(synthesizer):
+    results = [track("Hello", "Adele"), track("Hello", "Lionel Richie")]
+    assert synthesizer.synthesize("search", "hello", {"success": True, "results": results}) is None
+
+
+def test_scoring_ignores_decorations_and_ranks_best_first():
+    assert score_track("yesterday", track("Yesterday - Remastered 2009", "The Beatles")) == pytest.approx(1.0)
+    assert score_track("", track("Yesterday", "The Beatles")) == 0.0
+    ranked = rank_tracks("help the beatles", [track("Yesterday", "The Beatles"), track("Help!", "The Beatles")])
+    assert ranked[0][1]["name"] == "Help!"
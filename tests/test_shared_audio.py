@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from shared_audio import SharedAudioRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedAudioRing(create=True, capacity_chunks=8, chunk_size=4)
+    yield ring
+    ring.close()
+
+
+def write(ring, n):
+    for i in range(n):
+        ring.write_chunk(np.full(4, i + 1, dtype=np.int16))
+
+
+def test_read_range_clamps_preroll_to_the_first_chunk(ring):
+    write(ring, 2)
+    out = np.zeros((5, 4), dtype=np.int16)
+    # A pre-roll of five chunks asked for right after startup
+    assert ring.read_range(2 - 5, 2, out) == 2
+    assert out[:2, 0].tolist() == [1, 2]
+
+
+def test_read_range_skips_overwritten_chunks(ring):
+    write(ring, 20)
+    out = np.zeros((10, 4), dtype=np.int16)
+    count = ring.read_range(10, 20, out)
+    assert count == 7   # capacity minus the writer's margin slot
+    assert out[:count, 0].tolist() == list(range(14, 21))
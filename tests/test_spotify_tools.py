@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import pytest
+
+from evaluate_pipeline import StubSpotifyServer
+from spotify_tools import SpotifyTools
+
+
+@pytest.fixture(scope="module")
+def server():
+    """A StubSpotifyServer on its own event loop thread, so tests can use any loop."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    stub = StubSpotifyServer()
+    base_url = asyncio.run_coroutine_threadsafe(stub.start(), loop).result()
+    yield stub, base_url
+    asyncio.run_coroutine_threadsafe(stub.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def make_tools(base_url, **kwargs):
+    return SpotifyTools(base_url=base_url, use_track_index=False, **kwargs)
+
+
+def test_calls_share_one_session(server):
+    _, base_url = server
+
+    async def run():
+        async with make_tools(base_url) as tools:
+            session = await tools._get_session()
+            assert (await tools.pause_playback())["success"]
+            assert (await tools.search_tracks("queen"))["success"]
+            assert await tools._get_session() is session
+        return session
+
+    session = asyncio.run(run())
+    assert session.closed
+
+
+def test_loop_change_closes_the_previous_session(server):
+    _, base_url = server
+    tools = make_tools(base_url)
+
+    async def pause():
+        assert (await tools.pause_playback())["success"]
+        return tools._session
+
+    first = asyncio.run(pause())
+    second = asyncio.run(pause())
+    assert first is not second
+    assert first.closed
+    asyncio.run(tools.aclose())
+    assert second.closed
+
+
+def test_session_from_a_running_loop_is_closed_on_that_loop(server):
+    _, base_url = server
+    tools = make_tools(base_url)
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(tools.pause_playback(), other).result()
+        first = tools._session
+
+        asyncio.run(tools.pause_playback())
+        assert first.closed
+        asyncio.run(tools.aclose())
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join()
+        other.close()
+
+
+def test_identical_concurrent_requests_are_coalesced(server):
+    stub, base_url = server
+
+    async def run():
+        async with make_tools(base_url) as tools:
+            before = stub.requests["GET /player/search"]
+            results = await asyncio.gather(*(tools.search_tracks("bohemian") for _ in range(5)))
+            return tools.stats()["coalesced"], stub.requests["GET /player/search"] - before, results
+
+    coalesced, requests, results = asyncio.run(run())
+    assert requests == 1
+    assert coalesced == 4
+    assert all(result == results[0] for result in results)
+
+
+def test_unreachable_server_returns_an_error_result():
+    async def run():
+        async with make_tools("http://127.0.0.1:9", connect_timeout=0.5) as tools:
+            return await tools.pause_playback()
+
+    result = asyncio.run(run())
+    assert not result["success"]
+    assert result["error"].startswith("Network error")
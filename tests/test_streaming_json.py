@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from streaming_json import IncrementalJSONParser
+
+RESPONSE = ('```json\n{"tool_call": true, "tool_name": "search", "tool_input": "AC/DC \\"Back in Black\\", {live}",'
+            ' "tool_calls": [{"tool_name": "play", "tool_input": null}], "response": "Playing it"}\n```')
+EXPECTED = json.loads(RESPONSE[len("```json\n"):-len("\n```")])
+
+
+def feed_in_pieces(text, size):
+    parser = IncrementalJSONParser()
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return parser, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(RESPONSE)])
+def test_split_chunks_give_the_same_members(size):
+    parser, completed = feed_in_pieces(RESPONSE, size)
+    assert completed == list(EXPECTED.items())
+    assert parser.complete
+    assert parser.result() == EXPECTED
+
+
+def test_member_is_reported_once_the_next_separator_arrives():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"tool_call": true, "tool_name": "pau') == [("tool_call", True)]
+    assert parser.feed('se"') == []
+    assert parser.feed(', "tool_input"') == [("tool_name", "pause")]
+    assert parser.result() is None
+
+
+def test_trailing_text_is_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('{"response": "hi"} and some chatter {"x": 1}')
+    assert parser.result() == {"response": "hi"}
+
+
+def test_malformed_member_is_skipped():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"tool_name": "pause", oops, "response": "ok"}') == [
+        ("tool_name", "pause"), ("response", "ok")]
+    # The whole object is invalid JSON, so the members that parsed are returned
+    assert parser.result() == {"tool_name": "pause", "response": "ok"}
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from tool_registry import run_tool_calls, spotify_tool_registry
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return spotify_tool_registry()
+
+
+class Recorder:
+    """execute() stand-in that logs start/end events and fails on request."""
+
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.events = []
+
+    async def __call__(self, tool_name, tool_input):
+        label = f"{tool_name}:{tool_input}"
+        self.events.append(("start", label))
+        await asyncio.sleep(self.delays.get(label, 0.01))
+        self.events.append(("end", label))
+        if label in self.failing:
+            return {"success": False, "error": f"{label} failed"}
+        return {"success": True, "label": label}
+
+    def position(self, event, label):
+        return self.events.index((event, label))
+
+
+def call(call_id, tool_name, tool_input=None, depends_on=()):
+    return {"id": call_id, "tool_name": tool_name, "tool_input": tool_input, "depends_on": list(depends_on)}
+
+
+def test_registry_resolves_aliases_and_validates_input(registry):
+    assert registry.canonical_name("Resume") == "play"
+    assert registry.canonical_name("stop") == "pause"
+    assert registry.canonical_name("dance") == "dance"
+    assert registry.get("search").validate(None) == "No input provided for search tool"
+    result = asyncio.run(registry.execute("dance", None))
+    assert not result["success"] and result["error"] == "Unknown tool: dance"
+
+
+def test_independent_calls_run_concurrently(registry):
+    recorder = Recorder()
+    calls = [call("1", "search", "jazz"), call("2", "search", "blues")]
+    results = asyncio.run(run_tool_calls(registry, calls, recorder))
+    assert [r["label"] for r in results] == ["search:jazz", "search:blues"]
+    assert recorder.position("start", "search:blues") < recorder.position("end", "search:jazz")
+
+
+def test_dependent_call_waits_for_its_dependency(registry):
+    recorder = Recorder(delays={"search:jazz": 0.03})
+    calls = [call("1", "search", "jazz"), call("2", "search", "blues", depends_on=["1"])]
+    asyncio.run(run_tool_calls(registry, calls, recorder))
+    assert recorder.position("end", "search:jazz") < recorder.position("start", "search:blues")
+
+
+def test_exclusive_group_keeps_the_given_order(registry):
+    # pause and play share the "playback" group; the search is free to overlap them
+    recorder = Recorder(delays={"pause:None": 0.03})
+    calls = [call("1", "pause"), call("2", "search", "jazz"), call("3", "play")]
+    results = asyncio.run(run_tool_calls(registry, calls, recorder))
+    assert [r["label"] for r in results] == ["pause:None", "search:jazz", "play:None"]
+    assert recorder.position("end", "pause:None") < recorder.position("start", "play:None")
+    assert recorder.position("start", "search:jazz") < recorder.position("end", "pause:None")
+
+
+def test_failed_dependency_skips_the_call(registry):
+    recorder = Recorder(failing={"search:jazz"})
+    calls = [call("1", "search", "jazz"), call("2", "play", "spotify:track:x", depends_on=["1"])]
+    results = asyncio.run(run_tool_calls(registry, calls, recorder))
+    assert not results[1]["success"]
+    assert results[1]["error"].startswith("Skipped because an earlier step failed")
+    assert ("start", "play:spotify:track:x") not in recorder.events
+
+
+def test_only_earlier_calls_count_as_dependencies(registry):
+    recorder = Recorder()
+    calls = [call("1", "search", "jazz", depends_on=["2"]), call("2", "search", "blues", depends_on=["1"])]
+    results = asyncio.run(run_tool_calls(registry, calls, recorder))
+    assert all(r["success"] for r in results)
+
+
+def test_cancellation_cancels_every_call(registry):
+    recorder = Recorder(delays={"search:jazz": 1, "search:blues": 1})
+
+    async def run():
+        task = asyncio.ensure_future(run_tool_calls(
+            registry, [call("1", "search", "jazz"), call("2", "search", "blues")], recorder))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(asyncio.wait_for(run(), 0.5))
+    assert not any(event == "end" for event, _ in recorder.events)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from wake_word_server import (CHUNK_SIZE, EMBEDDING_DIMS, FEATURE_BUFFER_FRAMES, MEL_BINS,
+                              SharedFeatureModels)
+
+
+class FakeInput:
+    name = "input"
+
+
+class FakeSession:
+    """ONNX session stand-in whose output depends on every value of each batch row."""
+
+    def __init__(self, output_shape, seed):
+        self.output_shape = output_shape
+        self.rng = np.random.default_rng(seed)
+        self.matrix = None   # sized on first use
+        self.batch_sizes = []
+
+    def get_inputs(self):
+        return [FakeInput()]
+
+    def run(self, outputs, feeds):
+        batch = feeds["input"].reshape(len(feeds["input"]), -1).astype(np.float64)
+        self.batch_sizes.append(len(batch))
+        size = int(np.prod(self.output_shape))
+        if self.matrix is None:
+            self.matrix = self.rng.standard_normal((batch.shape[1], size)) / batch.shape[1]
+        return [(batch @ self.matrix).reshape((len(batch),) + self.output_shape).astype(np.float32)]
+
+
+def fake_models():
+    models = SharedFeatureModels.__new__(SharedFeatureModels)
+    models.melspec = FakeSession((1, 8, MEL_BINS), seed=1)
+    models.embedding = FakeSession((1, 1, EMBEDDING_DIMS), seed=2)
+    models._melspec_input = models._embedding_input = "input"
+    models.initial_features = np.zeros((FEATURE_BUFFER_FRAMES, EMBEDDING_DIMS), dtype=np.float32)
+    models._batched = True
+    return models
+
+
+@pytest.fixture
+def chunks():
+    rng = np.random.default_rng(0)
+    return [rng.integers(-3000, 3000, CHUNK_SIZE).astype(np.int16) for _ in range(3)]
+
+
+def test_chunks_of_one_stream_in_one_batch_match_sequential_processing(chunks):
+    models = fake_models()
+    batched, sequential, other = models.new_stream(), models.new_stream(), models.new_stream()
+
+    # Context replay: several chunks of one stream, mixed with another stream, in one call
+    models.process([(batched, chunks[0]), (batched, chunks[1]), (other, chunks[2]), (batched, chunks[2])])
+    assert models.melspec.batch_sizes == [4]
+    for chunk in chunks:
+        models.process([(sequential, chunk)])
+
+    np.testing.assert_allclose(batched.mel, sequential.mel, rtol=1e-6)
+    np.testing.assert_allclose(batched.get_features(3), sequential.get_features(3), rtol=1e-6)
+    assert not np.allclose(batched.get_features(3)[0], batched.get_features(3)[1])
+
+
+def test_per_stream_fallback_gives_the_same_features(chunks):
+    models = fake_models()
+    batched = models.new_stream()
+    models.process([(batched, chunk) for chunk in chunks])
+
+    fallback_models = fake_models()
+    fallback_models._batched = False
+    fallback = fallback_models.new_stream()
+    fallback_models.process([(fallback, chunk) for chunk in chunks])
+
+    assert fallback_models.melspec.batch_sizes == [1, 1, 1]
+    np.testing.assert_allclose(batched.get_features(3), fallback.get_features(3), rtol=1e-6)
+
+
+def test_feature_buffer_is_capped(chunks):
+    models = fake_models()
+    stream = models.new_stream()
+    models.process([(stream, chunks[0])] * 5)
+    assert stream.features.shape == (FEATURE_BUFFER_FRAMES, EMBEDDING_DIMS)
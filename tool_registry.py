@@ -0,0 +1,239 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Handler signature: async handler(tool_input, **context) -> result dict with
+# "success" and "formatted_output" keys
+ToolHandler = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class Tool:
+    """A tool the voice agent can call: name, input schema, prompt text and handler."""
+
+    def __init__(self, name: str, description: str, handler: Optional[ToolHandler] = None,
+                 input_description: Optional[str] = None, input_required: bool = False,
+                 aliases: Optional[List[str]] = None, examples: Optional[List[str]] = None,
+                 exclusive_group: Optional[str] = None):
+        """
+        Args:
+            name: Name the LLM uses in "tool_name"
+            description: One-line description shown in the prompt
+            handler: Coroutine function executing the tool (None for prompt-only registries)
+            input_description: What goes in "tool_input" (None if the tool takes no input)
+            input_required: Reject calls without a tool_input
+            aliases: Other names accepted for this tool
+            examples: Prompt examples, e.g. '"pause the music" → pause tool'
+            exclusive_group: Tools in the same group (e.g. "playback") never run
+                concurrently within one command; they keep the order the LLM gave
+        """
+        self.name = name
+        self.description = description
+        self.handler = handler
+        self.input_description = input_description
+        self.input_required = input_required
+        self.aliases = aliases or []
+        self.examples = examples or []
+        self.exclusive_group = exclusive_group
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        """JSON-schema-like description of the tool's input."""
+        input_schema: Dict[str, Any] = {"type": ["string", "null"]}
+        if self.input_description:
+            input_schema["description"] = self.input_description
+        return {
+            "name": self.name,
+            "description": self.description,
+            "input": input_schema,
+            "required": ["tool_input"] if self.input_required else [],
+        }
+
+    def validate(self, tool_input: Optional[str]) -> Optional[str]:
+        """Return an error message if the input does not fit the schema, else None."""
+        if self.input_required and not tool_input:
+            return f"No input provided for {self.name} tool"
+        return None
+
+
+class ToolRegistry:
+    """Tools available to the voice agent, looked up by name or alias."""
+
+    def __init__(self, tools: Optional[List[Tool]] = None):
+        self._tools: Dict[str, Tool] = {}
+        self._names: Dict[str, str] = {}
+        for tool in tools or []:
+            self.register(tool)
+
+    def register(self, tool: Tool):
+        self._tools[tool.name] = tool
+        for name in [tool.name] + tool.aliases:
+            self._names[name.lower()] = tool.name
+
+    def get(self, name: Optional[str]) -> Optional[Tool]:
+        if not name:
+            return None
+        canonical = self._names.get(name.lower())
+        return self._tools.get(canonical) if canonical else None
+
+    def canonical_name(self, name: Optional[str]) -> Optional[str]:
+        tool = self.get(name)
+        return tool.name if tool else name
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    async def execute(self, name: str, tool_input: Optional[str], **context) -> Dict[str, Any]:
+        """Validate and run a tool; unknown tools and bad input become error results."""
+        tool = self.get(name)
+        if tool is None or tool.handler is None:
+            error = f"Unknown tool: {name}"
+            return {"success": False, "error": error, "formatted_output": error}
+        error = tool.validate(tool_input)
+        if error:
+            return {"success": False, "error": error, "formatted_output": error}
+        return await tool.handler(tool_input, **context)
+
+    def prompt_tool_list(self) -> str:
+        """Numbered tool list for the tool-selection prompt."""
+        lines = []
+        for i, tool in enumerate(self, 1):
+            line = f'{i}. "{tool.name}" - {tool.description}'
+            if tool.input_description:
+                line += f" (tool_input: {tool.input_description})"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def prompt_examples(self) -> str:
+        return "\n".join(f"- {example}" for tool in self for example in tool.examples)
+
+    def prompt_name_choices(self) -> str:
+        """The '"a" | "b" | null' union used in the response format."""
+        return " | ".join(f'"{name}"' for name in self.names) + " | null"
+
+
+async def run_tool_calls(registry: ToolRegistry, calls: List[Dict[str, Any]],
+                         execute: Optional[Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]] = None
+                         ) -> List[Dict[str, Any]]:
+    """
+    Execute a list of tool calls with dependency-aware parallelism.
+
+    Each call is a dict with "tool_name", "tool_input" and optionally "id" and
+    "depends_on" (ids of earlier calls). A call starts as soon as the calls it
+    depends on have finished; calls in the same exclusive group additionally
+    wait for the previous call of that group. Everything else runs
+    concurrently. Returns the results in the order of ``calls``; a call whose
+    dependency failed is skipped with an error result.
+
+    Args:
+        registry: Registry used to resolve names and exclusive groups
+        calls: Tool calls from the agent
+        execute: Coroutine function (tool_name, tool_input) -> result (default: registry.execute)
+    """
+    execute = execute or registry.execute
+    tasks: Dict[str, asyncio.Task] = {}
+    last_in_group: Dict[str, str] = {}
+    ordered = []
+
+    async def run(call: Dict[str, Any], deps: List[asyncio.Task]) -> Dict[str, Any]:
+        for dep in deps:
+            result = await dep
+            if not result.get("success"):
+                error = f"Skipped because an earlier step failed: {result.get('error', 'unknown error')}"
+                return {"success": False, "error": error, "formatted_output": error}
+        return await execute(call.get("tool_name"), call.get("tool_input"))
+
+    try:
+        for i, call in enumerate(calls):
+            call_id = str(call.get("id", i + 1))
+            dep_ids = [str(d) for d in call.get("depends_on") or []]
+            tool = registry.get(call.get("tool_name"))
+            if tool is not None and tool.exclusive_group:
+                previous = last_in_group.get(tool.exclusive_group)
+                if previous is not None and previous not in dep_ids:
+                    dep_ids.append(previous)
+                last_in_group[tool.exclusive_group] = call_id
+            # Only earlier calls can be dependencies, which also rules out cycles
+            deps = [tasks[d] for d in dep_ids if d in tasks]
+            task = asyncio.ensure_future(run(call, deps))
+            tasks[call_id] = task
+            ordered.append(task)
+        return list(await asyncio.gather(*ordered))
+    except asyncio.CancelledError:
+        for task in ordered:
+            task.cancel()
+        raise
+
+
+def spotify_tool_registry(spotify_tools=None) -> ToolRegistry:
+    """
+    The Spotify tools offered to the agent.
+
+    Without ``spotify_tools`` the registry only describes the tools (enough
+    to build prompts); with it, every tool has a handler.
+    """
+    handlers = {}
+    if spotify_tools is not None:
+        async def pause(tool_input, **context):
+            result = await spotify_tools.pause_playback()
+            result["formatted_output"] = "Playback paused successfully"
+            return result
+
+        async def play(tool_input, **context):
+            if not tool_input:
+                # No track given: resume whatever was playing
+                result = await spotify_tools.resume_playback()
+                result["formatted_output"] = "Playback resumed successfully"
+                return result
+            result = await spotify_tools.play_track(tool_input)
+            if result["success"]:
+                result["formatted_output"] = f"Playing song: {tool_input}"
+            else:
+                result["formatted_output"] = f"Failed to play: {result.get('error', 'Unknown error')}"
+            return result
+
+        async def search(tool_input, pending_search: Optional[asyncio.Task] = None, **context):
+            if pending_search is not None:
+                print(f"Using speculative search_tracks result for query: '{tool_input}'")
+                result = dict(await pending_search)
+            else:
+                result = await spotify_tools.search_tracks(tool_input)
+            if result["success"]:
+                formatted_results = spotify_tools.format_search_results(result["results"])
+                result["formatted_output"] = f"Search results for '{tool_input}':\n{formatted_results}"
+            else:
+                result["formatted_output"] = f"Search failed: {result.get('error', 'Unknown error')}"
+            return result
+
+        handlers = {"pause": pause, "play": play, "search": search}
+
+    return ToolRegistry([
+        Tool(
+            "pause", "Pause current playback",
+            handler=handlers.get("pause"),
+            aliases=["stop"],
+            examples=['"pause the music" → pause tool', '"stop playing" → pause tool'],
+            exclusive_group="playback",
+        ),
+        Tool(
+            "play", "Resume playback, or play a specific track",
+            handler=handlers.get("play"),
+            input_description="track URI/ID to play, or null to resume",
+            aliases=["start", "resume"],
+            examples=['"play music" → play tool with null input', '"resume" → play tool with null input'],
+            exclusive_group="playback",
+        ),
+        Tool(
+            "search", "Search for songs/artists/albums",
+            handler=handlers.get("search"),
+            input_description="the search query",
+            input_required=True,
+            examples=[
+                '"search for Bohemian Rhapsody" → search tool with "Bohemian Rhapsody"',
+                '"find songs by Queen" → search tool with "Queen"',
+                '"play some rock music" → search tool with "rock music"',
+            ],
+        ),
+    ])
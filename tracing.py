@@ -0,0 +1,288 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Trace and parent span of the code currently running. asyncio tasks copy
+# these when they are created, so every span a command opens (LLM passes,
+# tool and HTTP calls) lands in the command's trace without passing IDs around.
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_span_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span_id", default=None)
+
+
+class Span:
+    """A finished span. Times are time.perf_counter() seconds (monotonic, system-wide on Linux/macOS)."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "thread", "attrs")
+
+    def __init__(self, trace_id: Optional[str], span_id: int, parent_id: Optional[int], name: str,
+                 start: float, end: float, thread: int, attrs: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = end
+        self.thread = thread
+        self.attrs = attrs
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class _ActiveSpan:
+    """Context manager returned by Tracer.span(); usable in sync and async code."""
+
+    __slots__ = ("tracer", "name", "trace_id", "attrs", "span_id", "start", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: Optional[str], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.span_id = 0
+        self.start = 0.0
+        self._token = None
+
+    def set(self, **attrs):
+        """Attach attributes (e.g. an HTTP status) before the span ends."""
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "_ActiveSpan":
+        if self.trace_id is None:
+            self.trace_id = _trace_id.get()
+        self.span_id = self.tracer._next_id()
+        self._token = _span_id.set(self.span_id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _span_id.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._add(Span(self.trace_id, self.span_id, _span_id.get(), self.name,
+                              self.start, end, threading.get_ident(), self.attrs))
+        return False
+
+
+class _NullSpan:
+    """Shared no-op span used while tracing is disabled."""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    In-memory recorder of per-command latency spans.
+
+    Each voice command gets a trace ID (usually minted at wake-word
+    detection) that follows it through STT, the LLM passes, tool and HTTP
+    calls and TTS playback. Spans are kept in a bounded deque; nothing is
+    written until export_chrome()/export_json() is called. While disabled,
+    span() returns a shared no-op object, so instrumentation costs one
+    attribute check.
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: int = 100000):
+        """
+        Args:
+            enabled: Record spans (a disabled tracer ignores everything)
+            max_spans: Most recent spans kept in memory
+        """
+        self.enabled = enabled
+        self._spans = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._thread_names: Dict[int, str] = {}
+        self.dropped = 0
+
+    def _next_id(self) -> int:
+        return next(self._ids)
+
+    def _add(self, span: Span):
+        if len(self._spans) == self._spans.maxlen:
+            self.dropped += 1
+        self._spans.append(span)
+        if span.thread not in self._thread_names:
+            self._thread_names[span.thread] = threading.current_thread().name
+
+    @staticmethod
+    def new_trace_id() -> str:
+        return uuid.uuid4().hex[:16]
+
+    @contextlib.contextmanager
+    def trace(self, trace_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Make ``trace_id`` (a new one if None) the current trace for this block.
+
+        Spans opened inside, and asyncio tasks created inside, belong to it.
+        """
+        trace_id = trace_id or self.new_trace_id()
+        token = _trace_id.set(trace_id)
+        try:
+            yield trace_id
+        finally:
+            _trace_id.reset(token)
+
+    def span(self, name: str, trace_id: Optional[str] = None, **attrs):
+        """
+        Time a block: ``with tracer.span("llm.first_pass", backend="gemini"):``.
+
+        Args:
+            name: Stage name; stats() aggregates by name
+            trace_id: Trace to record under (default: the current trace)
+            **attrs: Attributes stored with the span
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _ActiveSpan(self, name, trace_id, attrs)
+
+    def record(self, name: str, start: float, end: Optional[float] = None,
+               trace_id: Optional[str] = None, **attrs):
+        """
+        Record a span measured elsewhere, e.g. across threads or processes.
+
+        Args:
+            name: Stage name
+            start: time.perf_counter() at the start
+            end: time.perf_counter() at the end (default: now)
+            trace_id: Trace to record under (default: the current trace)
+            **attrs: Attributes stored with the span
+        """
+        if not self.enabled:
+            return
+        end = time.perf_counter() if end is None else end
+        self._add(Span(trace_id or _trace_id.get(), self._next_id(), _span_id.get(), name,
+                       start, end, threading.get_ident(), attrs))
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        spans = list(self._spans)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        return spans
+
+    def clear(self):
+        self._spans.clear()
+        self.dropped = 0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage latency in ms: count, p50, p90, p99 and max, keyed by span name."""
+        durations = defaultdict(list)
+        for span in list(self._spans):
+            durations[span.name].append(span.duration * 1000)
+        stats = {}
+        for name, values in sorted(durations.items()):
+            values = np.asarray(values)
+            stats[name] = {
+                "count": int(values.size),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p90": round(float(np.percentile(values, 90)), 3),
+                "p99": round(float(np.percentile(values, 99)), 3),
+                "max": round(float(values.max()), 3),
+            }
+        return stats
+
+    def report(self) -> str:
+        lines = ["Latency by stage (ms):"]
+        for name, s in self.stats().items():
+            lines.append(f"   - {name:<28} n={s['count']:<6} p50={s['p50']:9.1f} p99={s['p99']:9.1f} max={s['max']:9.1f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        The recorded spans in Chrome trace-event format (chrome://tracing, Perfetto).
+
+        Spans are complete ("X") events with microsecond timestamps taken
+        straight from the monotonic clock, so traces exported by separate
+        processes on one machine line up when loaded together.
+        """
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self._thread_names.items()
+        ]
+        for span in list(self._spans):
+            args = dict(span.attrs)
+            args["trace_id"] = span.trace_id
+            if span.parent_id is not None:
+                args["parent_id"] = span.parent_id
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": round(span.start * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": pid,
+                "tid": span.thread,
+                "id": span.span_id,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str) -> str:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+        return path
+
+    def export_json(self, path: str) -> str:
+        """Write the raw spans plus per-stage stats as JSON."""
+        with open(path, "w") as f:
+            json.dump({"spans": [s.to_dict() for s in self.spans()], "stats": self.stats(),
+                       "dropped": self.dropped}, f, default=str)
+        return path
+
+
+_tracer = Tracer(enabled=os.environ.get("ALEXA_TRACE") == "1")
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer (enabled with ALEXA_TRACE=1)."""
+    return _tracer
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_path(suffix: Optional[str] = None) -> str:
+    """
+    Where to export this process's trace: $ALEXA_TRACE_PATH (default
+    alexa_trace.json), with ``suffix`` inserted before the extension for
+    secondary processes (alexa_trace.stt.json).
+    """
+    path = os.environ.get("ALEXA_TRACE_PATH", "alexa_trace.json")
+    if suffix:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{suffix}{ext or '.json'}"
+    return path
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from local_intents import normalize
+from response_synthesis import rank_tracks
+
+
+class TrackIndex:
+    """
+    Local index of Spotify tracks seen in past searches, plus a TTL'd query cache.
+
+    Tracks are stored in SQLite with an FTS5 full-text index over name, artist
+    and album (falling back to LIKE matching when the SQLite build lacks FTS5).
+    ``lookup`` returns indexed tracks only when the best one is a confident
+    match for the query, so a command like "play Bohemian Rhapsody" can skip
+    the HTTP search entirely once the track has been seen before.
+    """
+
+    def __init__(self, path: Optional[str] = None, query_ttl: float = 600.0,
+                 min_score: float = 0.85, max_candidates: int = 20):
+        """
+        Args:
+            path: SQLite file to persist the index in (default: in-memory only)
+            query_ttl: Seconds a cached search result stays valid
+            min_score: Minimum match score for lookup() to answer from the index
+            max_candidates: Full-text candidates scored per lookup
+        """
+        self.path = path or ":memory:"
+        self.query_ttl = query_ttl
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                uri TEXT PRIMARY KEY,
+                name TEXT,
+                artist TEXT,
+                album TEXT,
+                track_json TEXT NOT NULL,
+                seen_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS search_cache (
+                query TEXT PRIMARY KEY,
+                results_json TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        self.fts = self._create_fts()
+        self._db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+        # Stats
+        self.cache_hits = 0
+        self.index_hits = 0
+        self.misses = 0
+
+    def _create_fts(self) -> bool:
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5("
+                "name, artist, album, content='tracks', content_rowid='rowid')"
+            )
+            return True
+        except sqlite3.OperationalError:
+            print("SQLite FTS5 not available; track index falls back to LIKE matching")
+            return False
+
+    def add_tracks(self, tracks: List[Dict[str, Any]]):
+        """Add or refresh Spotify track dicts (as returned by /player/search)."""
+        now = time.time()
+        with self._lock:
+            for track in tracks:
+                uri = track.get("uri")
+                if not uri:
+                    continue
+                name = track.get("name") or ""
+                artists = track.get("artists") or [{}]
+                artist = artists[0].get("name") or ""
+                album = (track.get("album") or {}).get("name") or ""
+                row = self._db.execute("SELECT rowid, name, artist, album FROM tracks WHERE uri = ?", (uri,)).fetchone()
+                if row is not None:
+                    if self.fts:
+                        # External-content FTS tables need the old values to delete an entry
+                        self._db.execute(
+                            "INSERT INTO tracks_fts (tracks_fts, rowid, name, artist, album) VALUES ('delete', ?, ?, ?, ?)",
+                            row
+                        )
+                    self._db.execute(
+                        "UPDATE tracks SET name = ?, artist = ?, album = ?, track_json = ?, seen_at = ? WHERE uri = ?",
+                        (name, artist, album, json.dumps(track), now, uri)
+                    )
+                    rowid = row[0]
+                else:
+                    rowid = self._db.execute(
+                        "INSERT INTO tracks (uri, name, artist, album, track_json, seen_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (uri, name, artist, album, json.dumps(track), now)
+                    ).lastrowid
+                if self.fts:
+                    self._db.execute(
+                        "INSERT INTO tracks_fts (rowid, name, artist, album) VALUES (?, ?, ?, ?)",
+                        (rowid, name, artist, album)
+                    )
+            self._db.commit()
+
+    def cache_search(self, query: str, results: List[Dict[str, Any]]):
+        """Remember the results of a remote search for query_ttl seconds and index its tracks."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (query, results_json, expires_at) VALUES (?, ?, ?)",
+                (normalize(query), json.dumps(results), time.time() + self.query_ttl)
+            )
+            self._db.commit()
+        self.add_tracks(results)
+
+    def cached_search(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """Return unexpired cached results for this query, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT results_json, expires_at FROM search_cache WHERE query = ?", (normalize(query),)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        self.cache_hits += 1
+        return json.loads(row[0])
+
+    def _candidates(self, query: str) -> List[Dict[str, Any]]:
+        words = re.findall(r"\w+", normalize(query))
+        words = [w for w in words if w != "by"]
+        if not words:
+            return []
+        with self._lock:
+            if self.fts:
+                # Every word must match (as a prefix) in name, artist or album
+                match = " ".join(f'"{w}"*' for w in words)
+                rows = self._db.execute(
+                    "SELECT t.track_json FROM tracks_fts f JOIN tracks t ON t.rowid = f.rowid "
+                    "WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (match, self.max_candidates)
+                ).fetchall()
+            else:
+                clause = " AND ".join(["(name || ' ' || artist || ' ' || album) LIKE ?"] * len(words))
+                rows = self._db.execute(
+                    f"SELECT track_json FROM tracks WHERE {clause} ORDER BY seen_at DESC LIMIT ?",
+                    [f"%{w}%" for w in words] + [self.max_candidates]
+                ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def lookup(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Resolve a query from the local index.
+
+        Returns the matching tracks (best first) if the best one scores at
+        least min_score, otherwise None so the caller searches remotely.
+        """
+        candidates = self._candidates(query)
+        if candidates:
+            ranked = rank_tracks(query, candidates, limit=len(candidates))
+            if ranked[0][0] >= self.min_score:
+                self.index_hits += 1
+                return [track for _, track in ranked]
+        self.misses += 1
+        return None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracks = self._db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+        return {
+            "tracks": tracks,
+            "fts5": self.fts,
+            "cache_hits": self.cache_hits,
+            "index_hits": self.index_hits,
+            "misses": self.misses,
+        }
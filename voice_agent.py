@@ -1,13 +1,51 @@
 import os
 import json
-import google.generativeai as genai
+import asyncio
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Callable
+from local_intents import LocalIntentClassifier
+from streaming_json import IncrementalJSONParser
+from response_cache import ResponseCache, make_cache_key
+from llm_backends import LLMBackend, make_backend
+from tool_registry import ToolRegistry, spotify_tool_registry
+from tracing import get_tracer
 
 class SpotifyVoiceAgent:
-    def __init__(self):
-        """Initialize the Spotify Voice Agent with Gemini LLM."""
-        self.wrapped_llm = self._initialize_llm()
+    def __init__(self, use_local_intents: bool = True, local_intent_threshold: float = 0.8,
+                 llm_timeout: float = 15.0, cache_responses: bool = True,
+                 cache_path: Optional[str] = None, cache_ttl: float = 24 * 3600, cache_size: int = 512,
+                 llm_backend: Optional[LLMBackend] = None, tool_registry: Optional[ToolRegistry] = None):
+        """
+        Initialize the Spotify Voice Agent with Gemini LLM.
+        
+        Args:
+            use_local_intents: Resolve common commands on-device before calling Gemini
+            local_intent_threshold: Minimum local classifier confidence to skip the LLM
+            llm_timeout: Seconds to wait for a Gemini response before giving up
+            cache_responses: Reuse parsed LLM responses for repeated commands
+            cache_path: SQLite file to persist the response cache in
+                (defaults to $ALEXA_LLM_CACHE_PATH; in-memory only if unset)
+            cache_ttl: Seconds a cached response stays valid
+            cache_size: Maximum number of cached responses
+            llm_backend: LLM backend to use instead of the default Gemini one
+                (see llm_backends.py for the offline stub and record/replay backends)
+            tool_registry: Tools described in the tool-selection prompt
+                (default: the Spotify tools; VoiceCommandProcessor sets its own)
+        """
+        self.llm_timeout = llm_timeout
+        self.response_cache = None
+        if cache_responses:
+            self.response_cache = ResponseCache(
+                max_entries=cache_size,
+                ttl=cache_ttl,
+                path=cache_path or os.environ.get("ALEXA_LLM_CACHE_PATH")
+            )
+        self.wrapped_llm = self._initialize_llm(llm_backend)
+        self.tool_registry = tool_registry if tool_registry is not None else spotify_tool_registry()
+        self.intent_classifier = LocalIntentClassifier() if use_local_intents else None
+        self.local_intent_threshold = local_intent_threshold
+        self.tracer = get_tracer()
         
     async def async_init(self):
         """
@@ -16,29 +54,9 @@ class SpotifyVoiceAgent:
         """
         # If you need to initialize other async resources, do so here.
             
-    def _initialize_llm(self):
-        """Initialize a simple wrapper for the Gemini API."""
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        
-        class SimpleGeminiWrapper:
-            def __init__(self, model_name="gemini-2.0-flash", temperature=0.70, max_tokens=1500):
-                self.model_name = model_name
-                self.temperature = temperature
-                self.max_tokens = max_tokens
-                self.generation_config = {
-                    "temperature": temperature,
-                    "max_output_tokens": max_tokens
-                }
-                self.model = genai.GenerativeModel(
-                    model_name=model_name,
-                    generation_config=self.generation_config
-                )
-            
-            def __call__(self, prompt, **kwargs):
-                response = self.model.generate_content(prompt)
-                return response.text
-        
-        return SimpleGeminiWrapper()
+    def _initialize_llm(self, llm_backend: Optional[LLMBackend] = None) -> LLMBackend:
+        """Use the given LLM backend, or build the one selected by $ALEXA_LLM_BACKEND (Gemini by default)."""
+        return llm_backend if llm_backend is not None else make_backend()
 
     def clean_response(self, response: str) -> str:
         """Clean the LLM response to extract valid JSON."""
@@ -50,7 +68,33 @@ class SpotifyVoiceAgent:
             response = response[:-3]
         return response.strip()
 
-    async def process_voice_command(self, voice_input: str, tool_output: Optional[str] = None, tool_name: Optional[str] = None) -> Dict[str, Any]:
+    async def _stream_llm(self, prompt: str, on_tool_ready: Callable[[str, Optional[str]], None],
+                          stage: str = "llm") -> str:
+        """
+        Stream the LLM response, calling on_tool_ready(tool_name, tool_input) as soon as both are complete.
+        
+        Records "<stage>.first_token" and "<stage>.tool_ready" spans measured from the request.
+        """
+        parser = IncrementalJSONParser()
+        fired = False
+        start = time.perf_counter()
+        first = True
+        async for piece in self.wrapped_llm.astream(prompt, timeout=self.llm_timeout):
+            if first:
+                first = False
+                self.tracer.record(f"{stage}.first_token", start)
+            parser.feed(piece)
+            fields = parser.fields
+            if not fired and all(key in fields for key in ("tool_call", "tool_name", "tool_input")):
+                fired = True
+                if fields["tool_call"] and fields["tool_name"]:
+                    print(f"Early tool dispatch: {fields['tool_name']} with input {fields['tool_input']}")
+                    self.tracer.record(f"{stage}.tool_ready", start, tool=fields["tool_name"])
+                    on_tool_ready(fields["tool_name"], fields["tool_input"])
+        return parser.text
+
+    async def process_voice_command(self, voice_input: str, tool_output: Optional[str] = None, tool_name: Optional[str] = None,
+                                    on_tool_ready: Optional[Callable[[str, Optional[str]], None]] = None) -> Dict[str, Any]:
         """
         Process voice command and determine which tool to call.
         
@@ -58,6 +102,9 @@ class SpotifyVoiceAgent:
             voice_input: The transcribed voice command from STT
             tool_output: Output from previous tool call (if any)
             tool_name: Name of the tool that was previously called (if any)
+            on_tool_ready: If given, stream the LLM response and call this with
+                (tool_name, tool_input) as soon as they are parsed, before the
+                rest of the JSON has been generated
         
         Returns:
             Dict containing tool call information and response
@@ -72,6 +119,16 @@ class SpotifyVoiceAgent:
 
         # Determine if this is a tool call or response generation
         if tool_output is None:
+            # Fast path: common commands are resolved locally without a network round-trip
+            if self.intent_classifier is not None:
+                with self.tracer.span("intent.local") as span:
+                    local_response = self.intent_classifier.classify(voice_input)
+                    span.set(matched=bool(local_response and local_response["confidence"] >= self.local_intent_threshold))
+                if local_response and local_response["confidence"] >= self.local_intent_threshold:
+                    print(f"Local intent match: {local_response['tool_name']} "
+                          f"(confidence: {local_response['confidence']:.2f})")
+                    return local_response
+            
             # First pass: Analyze voice command and determine tool to call
             print("First pass: Analyzing voice command...")
             prompt = self._create_tool_selection_prompt(voice_input, current_year, current_month, current_day)
@@ -80,18 +137,43 @@ class SpotifyVoiceAgent:
             print(f"Second pass: Processing tool output from {tool_name}...")
             prompt = self._create_response_generation_prompt(voice_input, tool_output, tool_name, current_year, current_month, current_day)
 
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = make_cache_key(voice_input, "first" if tool_output is None else "second", tool_name, tool_output)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                print(f"LLM cache hit ({self.response_cache.hits} hits / {self.response_cache.misses} misses)")
+                return cached
+
         try:
             # Get LLM response
-            print("Calling Gemini LLM...")
-            response = self.wrapped_llm(prompt)
+            print(f"Calling {self.wrapped_llm.name} LLM...")
+            response_cleaned = ""
+            stage = "llm.first_pass" if tool_output is None else "llm.second_pass"
+            with self.tracer.span(stage, backend=self.wrapped_llm.name, streamed=on_tool_ready is not None):
+                if on_tool_ready is not None:
+                    response = await self._stream_llm(prompt, on_tool_ready, stage)
+                else:
+                    response = await self.wrapped_llm.acall(prompt, timeout=self.llm_timeout)
             response_cleaned = self.clean_response(response)
             
             print(f"Raw LLM response: {response_cleaned}")
             
             json_response = json.loads(response_cleaned)
             print(f"Parsed JSON response: {json_response}")
+            if cache_key is not None and isinstance(json_response, dict):
+                self.response_cache.put(cache_key, json_response)
             return json_response
             
+        except asyncio.TimeoutError:
+            print(f"LLM call timed out after {self.llm_timeout}s")
+            return {
+                "tool_call": False,
+                "tool_name": None,
+                "tool_input": None,
+                "response": "Sorry, that took too long. Please try again.",
+                "error": "LLM timeout"
+            }
         except json.JSONDecodeError as e:
             print(f"Failed to parse JSON response: {e}")
             print(f"Raw response: {response_cleaned}")
@@ -114,45 +196,44 @@ class SpotifyVoiceAgent:
             }
 
     def _create_tool_selection_prompt(self, voice_input: str, current_year: int, current_month: int, current_day: int) -> str:
-        """Create prompt for tool selection phase."""
+        """Create prompt for tool selection phase (tools, examples and names come from the registry)."""
+        registry = self.tool_registry
         
         return f"""
 You are a Spotify Voice Assistant that helps users control their music through voice commands.
 
 AVAILABLE TOOLS:
-1. "pause" - Pause current playback
-2. "play" - Resume playback
-3. "search" - Search for songs/artists/albums
+{registry.prompt_tool_list()}
 
 USER VOICE INPUT: "{voice_input}"
 
-TASK: Analyze the voice input and determine which tool to call.
+TASK: Analyze the voice input and determine which tool(s) to call.
 
 INSTRUCTIONS:
 - If user wants to pause/stop music → call "pause" tool
-- If user wants to play/resume music → call "play" tool  
+- If user wants to play/resume music → call "play" tool with null tool_input
 - If user wants to search for something → call "search" tool with the search query
 - For search queries, extract the search term from the voice input
+- If the user asks for several actions (e.g. "pause and then search for jazz"), list every
+  call in "tool_calls" in the order spoken; give each an "id" and put the ids of calls that
+  must finish first in "depends_on" (leave it empty for independent calls)
 - Be smart about understanding user intent even with casual language
 
 EXAMPLES:
-- "pause the music" → pause tool
-- "stop playing" → pause tool
-- "play music" → play tool
-- "resume" → play tool
-- "search for Bohemian Rhapsody" → search tool with "Bohemian Rhapsody"
-- "find songs by Queen" → search tool with "Queen"
-- "play some rock music" → search tool with "rock music"
+{registry.prompt_examples()}
+- "pause and search for jazz" → tool_calls: pause (id "1"), search with "jazz" (id "2", depends_on [])
 
 RESPONSE FORMAT:
 Return ONLY a valid JSON object with this exact structure:
 {{
     "tool_call": true/false,
-    "tool_name": "pause" | "play" | "search" | null,
+    "tool_name": {registry.prompt_name_choices()},
     "tool_input": "search query if search tool, otherwise null",
+    "tool_calls": [{{"id": "1", "tool_name": "...", "tool_input": ..., "depends_on": []}}],
     "response": "brief explanation of what you're doing",
     "user_intent": "what the user wants to do"
 }}
+"tool_name"/"tool_input" describe the first call; "tool_calls" may be omitted for a single call.
 
 Current date: {current_year}/{current_month}/{current_day}
 
@@ -213,6 +294,31 @@ Only output the JSON - no explanations or additional text.
         
         return tool_call, tool_name, tool_input, response_text
 
+    def extract_tool_calls(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Extract every tool call from a first-pass response.
+        
+        Returns:
+            List of {"id", "tool_name", "tool_input", "depends_on"} dicts; a
+            single-call response yields one entry and no tool call yields []
+        """
+        calls = response.get("tool_calls")
+        if isinstance(calls, list) and calls:
+            normalized = []
+            for i, call in enumerate(calls, 1):
+                if isinstance(call, dict) and call.get("tool_name"):
+                    normalized.append({
+                        "id": str(call.get("id", i)),
+                        "tool_name": call["tool_name"],
+                        "tool_input": call.get("tool_input"),
+                        "depends_on": [str(d) for d in call.get("depends_on") or []],
+                    })
+            if normalized:
+                return normalized
+        if response.get("tool_call") and response.get("tool_name"):
+            return [{"id": "1", "tool_name": response["tool_name"], "tool_input": response.get("tool_input"), "depends_on": []}]
+        return []
+
 # Example usage and testing
 async def test_voice_agent():
     """Test the voice agent with sample inputs."""
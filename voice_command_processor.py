@@ -1,14 +1,43 @@
 import asyncio
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Tuple
 from voice_agent import SpotifyVoiceAgent
 from spotify_tools import SpotifyTools
+from response_synthesis import ResponseSynthesizer
+from speculative_search import SpeculativeSearch
+from tool_registry import ToolRegistry, run_tool_calls, spotify_tool_registry
+from tracing import get_tracer
 
 class VoiceCommandProcessor:
-    def __init__(self):
-        """Initialize the voice command processor with AI agent and Spotify tools."""
-        self.voice_agent = SpotifyVoiceAgent()
-        self.spotify_tools = SpotifyTools()
+    def __init__(self, stream_llm: bool = True, template_responses: bool = True,
+                 voice_agent: Optional[SpotifyVoiceAgent] = None, spotify_tools: Optional[SpotifyTools] = None,
+                 speculative_search: bool = True, tool_registry: Optional[ToolRegistry] = None):
+        """
+        Initialize the voice command processor with AI agent and Spotify tools.
+        
+        Args:
+            stream_llm: Stream LLM responses and start tool calls as soon as
+                the tool name and input have been generated
+            template_responses: Answer deterministic tool results locally and
+                only make the second LLM call for ambiguous ones
+            voice_agent: Agent to use (e.g. one built with an offline LLM backend)
+            spotify_tools: Spotify tools to use (e.g. pointed at a test server)
+            speculative_search: Start searches from partial transcripts passed
+                to on_partial_transcript() and reuse them for the final command
+                (tracked per session, so concurrent sessions don't share guesses)
+            tool_registry: Tools the agent may call (default: the Spotify tools)
+        """
+        self.voice_agent = voice_agent if voice_agent is not None else SpotifyVoiceAgent()
+        self.spotify_tools = spotify_tools if spotify_tools is not None else SpotifyTools()
+        self.tool_registry = tool_registry if tool_registry is not None else spotify_tool_registry(self.spotify_tools)
+        # Prompt the agent with exactly the tools we can execute
+        self.voice_agent.tool_registry = self.tool_registry
+        self.response_synthesizer = ResponseSynthesizer() if template_responses else None
+        self.speculative_search = speculative_search
+        self._speculative: Dict[str, SpeculativeSearch] = {}   # session -> searches for its utterance
+        self.stream_llm = stream_llm
+        self.tracer = get_tracer()
         self.initialized = False
         
     async def initialize(self):
@@ -17,65 +46,220 @@ class VoiceCommandProcessor:
             await self.voice_agent.async_init()
             self.initialized = True
     
-    async def process_voice_command(self, voice_input: str) -> Dict[str, Any]:
+    async def aclose(self):
+        """Release pooled connections held by the Spotify tools."""
+        for session in list(self._speculative):
+            self._reset_speculative(session)
+        await self.spotify_tools.aclose()
+    
+    def on_partial_transcript(self, partial_text: str, session: str = "default"):
+        """
+        Feed a partial transcript of the utterance in progress.
+        
+        Must be called on the event loop that runs process_voice_command
+        (e.g. via loop.call_soon_threadsafe from the STT thread).
+        
+        Args:
+            partial_text: Transcript so far
+            session: Session the utterance belongs to (as passed to process_voice_command)
+        """
+        if not self.speculative_search:
+            return
+        speculative = self._speculative.get(session)
+        if speculative is None:
+            speculative = self._speculative[session] = SpeculativeSearch(
+                self.spotify_tools, self.voice_agent.intent_classifier)
+        speculative.update(partial_text)
+    
+    def _reset_speculative(self, session: str):
+        """Cancel the session's remaining speculative searches once its command no longer needs them."""
+        speculative = self._speculative.pop(session, None)
+        if speculative is not None:
+            speculative.reset()
+    
+    async def process_voice_command(self, voice_input: str, session: str = "default") -> Dict[str, Any]:
         """
         Process a voice command through the complete pipeline.
         
         Args:
             voice_input: The transcribed voice command from STT
+            session: Microphone/user session; picks up that session's speculative searches
             
         Returns:
-            Dict containing the final response and any actions taken
+            Dict containing the final response and any actions taken, plus
+            "timings": milliseconds spent per stage (analyze, tools, respond,
+            play, total) and "stage_sources" (which path answered each pass)
         """
         await self.initialize()
         
+        start = time.perf_counter()
+        # Every task this command starts, so a cancelled (superseded) command stops them all
+        spawned = []
+        timings = {}
+        with self.tracer.span("command", chars=len(voice_input)) as span:
+            try:
+                result = await self._process_voice_command(voice_input, session, spawned, timings)
+            except asyncio.CancelledError:
+                for task in spawned:
+                    task.cancel()
+                raise
+            span.set(success=result.get("success"), tool=result.get("tool_called"))
+        timings["total"] = self._elapsed_ms(start)
+        result["timings"] = timings
+        return result
+    
+    async def _process_voice_command(self, voice_input: str, session: str, spawned: list,
+                                     timings: Dict[str, Any]) -> Dict[str, Any]:
         print(f"Processing voice command: '{voice_input}'")
         
-        # Step 1: Analyze voice command and determine tool to call
+        # Tool calls started early while the LLM response was still streaming
+        early_tasks = {}
+        
+        def start_tool_early(name, tool_input):
+            name = self.tool_registry.canonical_name(name)
+            task = early_tasks[(name, tool_input)] = self._start_tool(name, tool_input, session)
+            spawned.append(task)
+        
+        # Step 1: Analyze voice command and determine tool(s) to call
         print("Step 1: Analyzing voice command...")
-        first_response = await self.voice_agent.process_voice_command(voice_input)
+        stage_start = time.perf_counter()
+        first_response = await self.voice_agent.process_voice_command(
+            voice_input, on_tool_ready=start_tool_early if self.stream_llm else None)
+        timings["analyze"] = self._elapsed_ms(stage_start)
+        sources = {"analyze": first_response.get("source", "llm")}
         
         tool_call, tool_name, tool_input, response_text = self.voice_agent.extract_tool_info(first_response)
+        tool_calls = self.voice_agent.extract_tool_calls(first_response)
+        for call in tool_calls:
+            call["tool_name"] = self.tool_registry.canonical_name(call["tool_name"])
         
         print(f"Analysis result: Tool call={tool_call}, Tool={tool_name}, Input={tool_input}")
+        if len(tool_calls) > 1:
+            print(f"Multi-step command: {[(c['tool_name'], c['tool_input']) for c in tool_calls]}")
         print(f"Response: {response_text}")
         
-        if not tool_call:
+        if not tool_calls:
+            self._cancel_early_tasks(early_tasks)
+            self._reset_speculative(session)
             # No tool call needed, return the response directly
             print("No tool call needed, returning direct response")
             return {
                 "success": True,
                 "response": response_text,
                 "action_taken": "none",
-                "tool_called": None
+                "tool_called": None,
+                "stage_sources": sources
             }
         
-        # Step 2: Execute the tool
-        print(f"Step 2: Executing tool '{tool_name}' with input '{tool_input}'...")
-        tool_result = await self._execute_tool(tool_name, tool_input)
+        async def execute(name, tool_input):
+            # Reuse a call started while streaming, otherwise start it now
+            task = self._take_early_task(early_tasks, name, tool_input)
+            if task is None:
+                task = self._start_tool(name, tool_input, session)
+                spawned.append(task)
+            return await task
+        
+        # Step 2: Execute the tool(s); independent calls run concurrently
+        stage_start = time.perf_counter()
+        if len(tool_calls) == 1:
+            tool_name, tool_input = tool_calls[0]["tool_name"], tool_calls[0]["tool_input"]
+            print(f"Step 2: Executing tool '{tool_name}' with input '{tool_input}'...")
+            results = [await execute(tool_name, tool_input)]
+        else:
+            print(f"Step 2: Executing {len(tool_calls)} tool calls...")
+            results = await run_tool_calls(self.tool_registry, tool_calls, execute)
+        timings["tools"] = self._elapsed_ms(stage_start)
+        self._cancel_early_tasks(early_tasks)
+        self._reset_speculative(session)
+        
+        for call, result in zip(tool_calls, results):
+            print(f"Tool execution result ({call['tool_name']}): {result}")
+        
+        # The step that may need a follow-up (a search picks a track to play) drives steps 3-4
+        primary = len(results) - 1
+        for i, (call, result) in enumerate(zip(tool_calls, results)):
+            if call["tool_name"] == "search" and result["success"]:
+                primary = i
+        tool_name, tool_input = tool_calls[primary]["tool_name"], tool_calls[primary]["tool_input"]
+        tool_result = results[primary]
         
-        print(f"Tool execution result: {tool_result}")
+        other_responses = []
+        for i, (call, result) in enumerate(zip(tool_calls, results)):
+            if i != primary:
+                other_responses.append(self._step_summary(call["tool_name"], call["tool_input"], result))
         
         if not tool_result["success"]:
             error_msg = f"Sorry, I couldn't {tool_name}. {tool_result.get('error', 'Unknown error')}"
             print(f"Tool execution failed: {error_msg}")
             return {
                 "success": False,
-                "response": error_msg,
+                "response": " ".join(other_responses + [error_msg]),
                 "action_taken": tool_name,
                 "tool_called": tool_name,
-                "error": tool_result.get("error")
+                "tools_called": [call["tool_name"] for call in tool_calls],
+                "error": tool_result.get("error"),
+                "stage_sources": sources
             }
         
+        final_response_text, final_action = await self._follow_up(
+            voice_input, tool_name, tool_input, tool_result, spawned, timings, sources)
+        
+        final_result = {
+            "success": all(result["success"] for result in results),
+            "response": " ".join(other_responses + [final_response_text]),
+            "action_taken": tool_name,
+            "tool_called": tool_name,
+            "tools_called": [call["tool_name"] for call in tool_calls],
+            "final_action": final_action,
+            "search_results": tool_result.get("results") if tool_name == "search" else None,
+            "stage_sources": sources
+        }
+        
+        print(f"Final result: {final_result}")
+        return final_result
+    
+    async def _follow_up(self, voice_input: str, tool_name: str, tool_input: Optional[str],
+                         tool_result: Dict[str, Any], spawned: list, timings: Dict[str, Any],
+                         sources: Dict[str, str]) -> Tuple[str, Optional[str]]:
+        """
+        Steps 3-4: turn a tool result into the spoken response, playing a track if one is recommended.
+        Stage durations and sources are added to ``timings`` and ``sources``.
+        
+        Returns:
+            (response text, final action or None)
+        """
+        early_tasks = {}
+        
+        def start_play_early(name, tool_input):
+            if self.tool_registry.canonical_name(name) == "play" and tool_input:
+                task = early_tasks[("play", tool_input)] = asyncio.create_task(self.spotify_tools.play_track(tool_input))
+                spawned.append(task)
+        
         # Step 3: Process tool output and generate final response
         print("Step 3: Processing tool output...")
-        final_response = await self.voice_agent.process_voice_command(
-            voice_input=voice_input,
-            tool_output=tool_result.get("formatted_output", str(tool_result)),
-            tool_name=tool_name
-        )
+        stage_start = time.perf_counter()
+        final_response = None
+        if self.response_synthesizer is not None:
+            with self.tracer.span("respond.template", tool=tool_name):
+                final_response = self.response_synthesizer.synthesize(tool_name, tool_input, tool_result)
+        if final_response is not None:
+            print("Using template response, skipping second LLM pass")
+        else:
+            final_response = await self.voice_agent.process_voice_command(
+                voice_input=voice_input,
+                tool_output=tool_result.get("formatted_output", str(tool_result)),
+                tool_name=tool_name,
+                on_tool_ready=start_play_early if self.stream_llm else None
+            )
+        timings["respond"] = self._elapsed_ms(stage_start)
+        sources["respond"] = final_response.get("source", "llm")
         
         final_tool_call, final_tool_name, final_tool_input, final_response_text = self.voice_agent.extract_tool_info(final_response)
+        final_tool_name = self.tool_registry.canonical_name(final_tool_name)
+        early_play_task = None
+        if final_tool_call:
+            early_play_task = self._take_early_task(early_tasks, final_tool_name, final_tool_input)
+        self._cancel_early_tasks(early_tasks)
         
         print(f"Final response analysis: Tool call={final_tool_call}, Tool={final_tool_name}, Input={final_tool_input}")
         print(f"Final response text: {final_response_text}")
@@ -83,7 +267,12 @@ class VoiceCommandProcessor:
         # Step 4: Execute final tool if needed (e.g., play a specific song)
         if final_tool_call and final_tool_name == "play" and final_tool_input:
             print(f"Step 4: Playing track '{final_tool_input}'...")
-            play_result = await self.spotify_tools.play_track(final_tool_input)
+            stage_start = time.perf_counter()
+            if early_play_task is not None:
+                play_result = await early_play_task
+            else:
+                play_result = await self.spotify_tools.play_track(final_tool_input)
+            timings["play"] = self._elapsed_ms(stage_start)
             
             if play_result["success"]:
                 final_response_text = f"{final_response_text} I'm now playing the track for you!"
@@ -92,25 +281,51 @@ class VoiceCommandProcessor:
                 final_response_text = f"{final_response_text} However, I couldn't play the track: {play_result.get('error', 'Unknown error')}"
                 print(f"Track playback failed: {play_result.get('error')}")
         
-        final_result = {
-            "success": True,
-            "response": final_response_text,
-            "action_taken": tool_name,
-            "tool_called": tool_name,
-            "final_action": final_tool_name if final_tool_call else None,
-            "search_results": tool_result.get("results") if tool_name == "search" else None
-        }
-        
-        print(f"Final result: {final_result}")
-        return final_result
+        return final_response_text, final_tool_name if final_tool_call else None
     
-    async def _execute_tool(self, tool_name: str, tool_input: Optional[str]) -> Dict[str, Any]:
+    def _step_summary(self, tool_name: str, tool_input: Optional[str], result: Dict[str, Any]) -> str:
+        """Short spoken summary for the secondary steps of a multi-step command."""
+        if not result["success"]:
+            return f"I couldn't {tool_name}: {result.get('error', 'Unknown error')}."
+        if self.response_synthesizer is not None:
+            response = self.response_synthesizer.synthesize(tool_name, tool_input, result)
+            if response is not None and not response["tool_call"]:
+                return response["response"]
+        return result.get("formatted_output", f"Done: {tool_name}.")
+    
+    def _start_tool(self, tool_name: str, tool_input: Optional[str], session: str = "default") -> asyncio.Task:
+        """Start a tool call as a task, picking up the session's matching speculative search if there is one."""
+        pending_search = None
+        speculative = self._speculative.get(session)
+        if tool_name == "search" and speculative is not None:
+            pending_search = speculative.take(tool_input)
+        return asyncio.create_task(self._execute_tool(tool_name, tool_input, pending_search))
+    
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+    
+    @staticmethod
+    def _take_early_task(early_tasks: Dict, tool_name: Optional[str], tool_input: Optional[str]) -> Optional[asyncio.Task]:
+        """Return the early task matching the final parsed tool call, if one was started."""
+        return early_tasks.pop((tool_name, tool_input), None)
+    
+    @staticmethod
+    def _cancel_early_tasks(early_tasks: Dict):
+        """Cancel early tool calls that the final response did not confirm."""
+        for task in early_tasks.values():
+            task.cancel()
+        early_tasks.clear()
+    
+    async def _execute_tool(self, tool_name: str, tool_input: Optional[str],
+                            pending_search: Optional[asyncio.Task] = None) -> Dict[str, Any]:
         """
-        Execute a specific Spotify tool.
+        Execute a tool from the registry.
         
         Args:
             tool_name: Name of the tool to execute
             tool_input: Input for the tool (e.g., search query)
+            pending_search: Already running search_tracks task for tool_input (speculative search)
             
         Returns:
             Dict containing tool execution result
@@ -118,69 +333,12 @@ class VoiceCommandProcessor:
         print(f"Executing tool: {tool_name} with input: {tool_input}")
         
         try:
-            if tool_name == "pause":
-                print("Calling pause_playback...")
-                result = await self.spotify_tools.pause_playback()
-                result["formatted_output"] = "Playback paused successfully"
-                print(f"Pause tool result: {result}")
-                return result
-                
-            elif tool_name == "start":
-                print("Calling resume_playback...")
-                result = await self.spotify_tools.resume_playback()
-                result["formatted_output"] = "Playback resumed successfully"
-                print(f"Start tool result: {result}")
-                return result
-                
-            elif tool_name == "play":
-                if not tool_input:
-                    error_result = {
-                        "success": False,
-                        "error": "No song name provided for play tool",
-                        "formatted_output": "No song name provided for play tool"
-                    }
-                    print(f"Play tool error: {error_result}")
-                    return error_result
-                
-                print(f"Calling play_track with song: '{tool_input}'")
-                result = await self.spotify_tools.play_track(tool_input)
-                if result["success"]:
-                    result["formatted_output"] = f"Playing song: {tool_input}"
-                    print(f"Play tool successful: Playing {tool_input}")
-                else:
-                    result["formatted_output"] = f"Failed to play: {result.get('error', 'Unknown error')}"
-                    print(f"Play tool failed: {result}")
-                return result
-                
-            elif tool_name == "search":
-                if not tool_input:
-                    error_result = {
-                        "success": False,
-                        "error": "No search query provided",
-                        "formatted_output": "No search query provided"
-                    }
-                    print(f"Search tool error: {error_result}")
-                    return error_result
-                
-                print(f"Calling search_tracks with query: '{tool_input}'")
-                result = await self.spotify_tools.search_tracks(tool_input)
-                if result["success"]:
-                    formatted_results = self.spotify_tools.format_search_results(result["results"])
-                    result["formatted_output"] = f"Search results for '{tool_input}':\n{formatted_results}"
-                    print(f"Search tool successful: Found {len(result['results'])} results")
-                else:
-                    result["formatted_output"] = f"Search failed: {result.get('error', 'Unknown error')}"
-                    print(f"Search tool failed: {result}")
-                return result
-                
-            else:
-                error_result = {
-                    "success": False,
-                    "error": f"Unknown tool: {tool_name}",
-                    "formatted_output": f"Unknown tool: {tool_name}"
-                }
-                print(f"Unknown tool: {error_result}")
-                return error_result
+            context = {"pending_search": pending_search} if pending_search is not None else {}
+            with self.tracer.span(f"tool.{tool_name}", speculative=pending_search is not None) as span:
+                result = await self.tool_registry.execute(tool_name, tool_input, **context)
+                span.set(success=result.get("success"), source=result.get("source", "http"))
+            print(f"{tool_name} tool result: success={result.get('success')}")
+            return result
                 
         except Exception as e:
             error_result = {
@@ -222,6 +380,8 @@ async def test_voice_processor():
         
         if result.get('search_results'):
             print(f"📋 Found {len(result['search_results'])} search results")
+    
+    await processor.aclose()
 
 if __name__ == "__main__":
     asyncio.run(test_voice_processor()) 
\ No newline at end of file
@@ -0,0 +1,469 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import wave
+import numpy as np
+from typing import Callable, List, Optional
+
+from audio_pipeline import AudioRingBuffer, EnergyGate, WakeWordDetector
+
+# === Audio parameters (same as app1.py) ===
+SR = 16000
+CHUNK_DURATION_MS = 80
+CHUNK_SIZE = int(SR * CHUNK_DURATION_MS / 1000)
+
+# Detection parameters
+DETECTION_THRESHOLD = 0.5
+POST_DETECT_COOLDOWN = 2.0
+SMOOTHING_WINDOW = 5
+
+# openwakeword ignores the first few predictions while its feature buffers fill
+WARMUP_FRAMES = 5
+
+# openwakeword feature pipeline constants (see openwakeword.utils.AudioFeatures)
+MEL_CONTEXT_SAMPLES = 480      # extra samples before each chunk the melspectrogram needs
+MEL_BINS = 32
+EMBEDDING_WINDOW = 76          # melspectrogram frames per embedding
+EMBEDDING_DIMS = 96
+FEATURE_BUFFER_FRAMES = 120    # embeddings kept per stream
+
+
+class AudioSource:
+    """Base class for one input stream; subclasses fill ``self.ring`` from a thread or callback."""
+
+    def __init__(self, name: str, ring_capacity: int = 32, max_latency: Optional[float] = 0.5):
+        self.name = name
+        self.ring = AudioRingBuffer(CHUNK_SIZE, capacity_chunks=ring_capacity, max_latency=max_latency)
+        self.finished = False
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self.ring.close()
+
+
+class MicrophoneSource(AudioSource):
+    """Live sound device input."""
+
+    def __init__(self, device: Optional[int] = None, **kwargs):
+        super().__init__(f"mic:{device if device is not None else 'default'}", **kwargs)
+        self.device = device
+        self.stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"⚠️ [{self.name}] Stream status: {status}")
+        mono = indata[:, 0] if indata.ndim > 1 else indata
+        self.ring.write(mono)
+
+    def start(self):
+        import sounddevice as sd
+        self.stream = sd.InputStream(samplerate=SR, channels=1, blocksize=CHUNK_SIZE,
+                                     dtype=np.float32, device=self.device,
+                                     callback=self._callback)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+        super().stop()
+
+
+class WavFileSource(AudioSource):
+    """16 kHz mono 16-bit WAV file, paced in real time unless ``realtime`` is False."""
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False, **kwargs):
+        # Offline files must not lose audio to the latency guard
+        if not realtime:
+            kwargs.setdefault("max_latency", None)
+        super().__init__(f"wav:{path}", **kwargs)
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        with wave.open(self.path, "rb") as wf:
+            if wf.getframerate() != SR or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                print(f"❌ [{self.name}] Expected 16 kHz mono 16-bit PCM")
+                self.finished = True
+                self.ring.close()
+                return
+            period = CHUNK_SIZE / SR
+            next_time = time.monotonic()
+            while not self._stop.is_set():
+                frames = wf.readframes(CHUNK_SIZE)
+                if len(frames) < CHUNK_SIZE * 2:
+                    if not self.loop:
+                        break
+                    wf.rewind()
+                    continue
+                if not self.realtime:
+                    # Don't let the reader fall a whole ring behind
+                    while self.ring.pending() >= self.ring.capacity - 2 and not self._stop.is_set():
+                        time.sleep(0.001)
+                self.ring.write_int16(np.frombuffer(frames, dtype=np.int16))
+                if self.realtime:
+                    next_time += period
+                    time.sleep(max(0.0, next_time - time.monotonic()))
+        self.finished = True
+        self.ring.close()
+
+    def stop(self):
+        self._stop.set()
+        super().stop()
+
+
+class SocketSource(AudioSource):
+    """Raw 16 kHz mono int16 PCM received from one client on a local TCP port."""
+
+    def __init__(self, port: int, host: str = "127.0.0.1", **kwargs):
+        super().__init__(f"socket:{port}", **kwargs)
+        self.host = host
+        self.port = port
+        self._server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(1)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        buf = bytearray(CHUNK_SIZE * 2)
+        view = memoryview(buf)
+        while not self._stop.is_set():
+            try:
+                conn, addr = self._server.accept()
+            except OSError:
+                break
+            print(f"🔌 [{self.name}] Client connected: {addr[0]}:{addr[1]}")
+            with conn:
+                filled = 0
+                while not self._stop.is_set():
+                    n = conn.recv_into(view[filled:])
+                    if n == 0:
+                        break
+                    filled += n
+                    usable = filled - filled % 2
+                    if usable:
+                        self.ring.write_int16(np.frombuffer(buf, dtype=np.int16, count=usable // 2))
+                        if filled > usable:
+                            buf[0] = buf[usable]
+                        filled -= usable
+            print(f"🔌 [{self.name}] Client disconnected")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+        super().stop()
+
+
+class StreamFeatures:
+    """
+    Streaming buffers of one stream's feature pipeline: the raw audio tail,
+    the recent melspectrogram frames and the embedding history. The models
+    that fill them are shared (SharedFeatureModels).
+    """
+
+    def __init__(self, initial_features: np.ndarray):
+        self.raw = np.zeros(CHUNK_SIZE + MEL_CONTEXT_SAMPLES, dtype=np.float32)
+        self.mel = np.ones((EMBEDDING_WINDOW, MEL_BINS), dtype=np.float32)
+        self.features = initial_features.astype(np.float32)
+
+    def push_audio(self, chunk: np.ndarray, out: np.ndarray):
+        """Append a chunk and copy the melspectrogram input window ending with it into ``out``."""
+        self.raw[:MEL_CONTEXT_SAMPLES] = self.raw[-MEL_CONTEXT_SAMPLES:]
+        self.raw[MEL_CONTEXT_SAMPLES:] = chunk
+        np.copyto(out, self.raw)
+
+    def push_mel(self, frames: np.ndarray, out: np.ndarray):
+        """Append melspectrogram frames and copy the embedding input window ending with them into ``out``."""
+        self.mel = np.vstack((self.mel, frames))[-EMBEDDING_WINDOW:]
+        np.copyto(out, self.mel)
+
+    def push_embedding(self, embedding: np.ndarray):
+        self.features = np.vstack((self.features, embedding))[-FEATURE_BUFFER_FRAMES:]
+
+    def get_features(self, n_frames: int) -> np.ndarray:
+        return self.features[-n_frames:]
+
+
+class SharedFeatureModels:
+    """
+    One melspectrogram and one embedding ONNX session for all streams.
+
+    ``process`` takes (stream, chunk) pairs, possibly several per stream in
+    order (energy-gate context replay), and computes them with one batched
+    melspectrogram run and one batched embedding run. The melspectrogram of
+    each chunk depends only on its own audio window, and each embedding only
+    on mel frames computed in the same call or earlier, so batching gives the
+    same features as running the streams one chunk at a time.
+    """
+
+    def __init__(self, ncpu: int = 1):
+        from openwakeword.utils import AudioFeatures
+
+        # Loads the two shared sessions; its own streaming buffers are not used
+        loader = AudioFeatures(inference_framework='onnx', ncpu=ncpu)
+        self.melspec = loader.melspec_model
+        self.embedding = loader.embedding_model
+        self._melspec_input = self.melspec.get_inputs()[0].name
+        self._embedding_input = self.embedding.get_inputs()[0].name
+        self.initial_features = np.asarray(loader.feature_buffer, dtype=np.float32)
+        self._batched = True
+
+    def new_stream(self) -> StreamFeatures:
+        return StreamFeatures(self.initial_features)
+
+    def _run(self, session, input_name: str, batch: np.ndarray) -> np.ndarray:
+        if self._batched:
+            try:
+                return session.run(None, {input_name: batch})[0].reshape(len(batch), -1)
+            except Exception as e:
+                print(f"⚠️ Batched feature extraction unavailable, running per stream: {e}")
+                self._batched = False
+        return np.concatenate([session.run(None, {input_name: batch[i:i + 1]})[0].reshape(1, -1)
+                               for i in range(len(batch))])
+
+    def process(self, items: List[tuple]):
+        """Feed (StreamFeatures, int16 chunk) pairs, in order, through the shared models."""
+        if not items:
+            return
+        # Each item gets its own batch row: a stream's buffers move on with every
+        # item, so several chunks of one stream (context replay) need separate copies
+        windows = np.empty((len(items), CHUNK_SIZE + MEL_CONTEXT_SAMPLES), dtype=np.float32)
+        for row, (features, chunk) in zip(windows, items):
+            features.push_audio(chunk, row)
+        mel = self._run(self.melspec, self._melspec_input, windows)
+        mel = mel.reshape(len(items), -1, MEL_BINS) / 10 + 2
+        mel_windows = np.empty((len(items), EMBEDDING_WINDOW, MEL_BINS, 1), dtype=np.float32)
+        for row, (features, _), frames in zip(mel_windows, items, mel):
+            features.push_mel(frames, row[:, :, 0])
+        embeddings = self._run(self.embedding, self._embedding_input, mel_windows)
+        for (features, _), embedding in zip(items, embeddings.reshape(len(items), EMBEDDING_DIMS)):
+            features.push_embedding(embedding)
+
+
+def load_wakeword_sessions(wakeword_models, ncpu: int = 1):
+    """
+    Load only the wake-word classifier ONNX sessions (no openwakeword Model,
+    so no extra feature, VAD or preprocessing sessions).
+
+    Returns (sessions by name, input frames by name).
+    """
+    import onnxruntime as ort
+    import openwakeword
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ncpu
+    options.inter_op_num_threads = 1
+    pretrained = openwakeword.get_pretrained_model_paths("onnx")
+    sessions, model_inputs = {}, {}
+    for model in wakeword_models:
+        if os.path.exists(model):
+            path, name = model, os.path.splitext(os.path.basename(model))[0]
+        else:
+            matches = [p for p in pretrained if model.replace(" ", "_") in os.path.basename(p)]
+            if not matches:
+                raise ValueError(f"Unknown wake word model: {model}")
+            path, name = matches[0], model
+        session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        sessions[name] = session
+        model_inputs[name] = session.get_inputs()[0].shape[1]
+    return sessions, model_inputs
+
+
+class StreamState:
+    """Per-stream feature buffers, energy gate and detection state."""
+
+    def __init__(self, source: AudioSource, model_names, features: StreamFeatures, gate: Optional[EnergyGate]):
+        self.source = source
+        self.features = features
+        self.gate = gate
+        self.detector = WakeWordDetector(model_names, threshold=DETECTION_THRESHOLD,
+                                         smoothing_window=SMOOTHING_WINDOW,
+                                         cooldown=POST_DETECT_COOLDOWN)
+        self.frames_seen = 0
+        self.detections = 0
+
+
+class BatchedWakeWordServer:
+    """
+    Run OpenWakeWord over many audio streams in one process.
+
+    Each stream keeps only its streaming buffers (audio tail, melspectrogram
+    frames, embeddings), smoothing buffer and cooldown. The melspectrogram,
+    embedding and wake-word classifier sessions are loaded once, and every
+    stage runs over all streams that produced a chunk in the same tick as one
+    batched ONNX call.
+    """
+
+    def __init__(self, sources: List[AudioSource], wakeword_models=("alexa",),
+                 use_energy_gate: bool = True,
+                 on_detection: Optional[Callable[[str, str, float], None]] = None):
+        self.feature_models = SharedFeatureModels()
+        self.sessions, self.model_inputs = load_wakeword_sessions(wakeword_models)
+        self.model_names = list(self.sessions)
+        self.on_detection = on_detection
+
+        self.streams = []
+        for source in sources:
+            gate = EnergyGate(CHUNK_SIZE) if use_energy_gate else None
+            self.streams.append(StreamState(source, self.model_names, self.feature_models.new_stream(), gate))
+
+        # Preallocated batch input per model: (streams, frames, embedding dims)
+        self._batch_inputs = {}
+        for name in self.model_names:
+            self._batch_inputs[name] = np.zeros(
+                (len(self.streams), self.model_inputs[name], EMBEDDING_DIMS), dtype=np.float32)
+        self._batched = True
+        self._scores = np.zeros((len(self.model_names), len(self.streams)), dtype=np.float64)
+        self._stream_scores = np.zeros(len(self.model_names), dtype=np.float64)
+
+        # Stats
+        self.ticks = 0
+        self.chunks_scored = 0
+        self.feature_time = 0.0
+        self.inference_time = 0.0
+
+    def _classify(self, ready: List[StreamState]) -> np.ndarray:
+        """Score every ready stream with every wake-word model; returns a (models, streams) view."""
+        scores = self._scores[:, :len(ready)]
+        for m, name in enumerate(self.model_names):
+            session = self.sessions[name]
+            input_name = session.get_inputs()[0].name
+            n_frames = self.model_inputs[name]
+            batch = self._batch_inputs[name][:len(ready)]
+            for i, st in enumerate(ready):
+                np.copyto(batch[i], st.features.get_features(n_frames))
+
+            if self._batched:
+                try:
+                    out = session.run(None, {input_name: batch})[0]
+                    scores[m] = out.reshape(len(ready), -1)[:, 0]
+                    continue
+                except Exception as e:
+                    print(f"⚠️ Batched inference unavailable for '{name}', scoring per stream: {e}")
+                    self._batched = False
+            for i in range(len(ready)):
+                scores[m, i] = session.run(None, {input_name: batch[i:i + 1]})[0].reshape(-1)[0]
+        return scores
+
+    def step(self, now: Optional[float] = None) -> int:
+        """Process at most one chunk per stream; returns the number of streams scored."""
+        now = time.time() if now is None else now
+        ready = []
+        feature_items = []   # (stream features, chunk) in order, batched below
+        for st in self.streams:
+            chunk = st.source.ring.read(timeout=0)
+            if chunk is None:
+                continue
+            if st.detector.in_cooldown(now):
+                continue
+            if st.gate is not None:
+                if not st.gate.check(chunk):
+                    continue
+                for context_chunk in st.gate.drain_context():
+                    feature_items.append((st.features, context_chunk))
+                    st.frames_seen += 1
+            feature_items.append((st.features, chunk))
+            st.frames_seen += 1
+            ready.append(st)
+
+        if not ready:
+            return 0
+
+        start = time.perf_counter()
+        self.feature_models.process(feature_items)
+        classify_start = time.perf_counter()
+        self.feature_time += classify_start - start
+        scores = self._classify(ready)
+        self.inference_time += time.perf_counter() - classify_start
+        self.ticks += 1
+        self.chunks_scored += len(ready)
+
+        for i, st in enumerate(ready):
+            if st.frames_seen <= WARMUP_FRAMES:
+                continue
+            np.copyto(self._stream_scores, scores[:, i])
+            for name, smoothed in st.detector.update_scores(self._stream_scores, now):
+                st.detections += 1
+                print(f"🎯 [{st.source.name}] WAKE WORD DETECTED: '{name}' (score: {smoothed:.3f})")
+                if self.on_detection is not None:
+                    self.on_detection(st.source.name, name, smoothed)
+        return len(ready)
+
+    def run(self, status_interval: float = 10.0):
+        for st in self.streams:
+            st.source.start()
+            print(f"✅ Stream started: {st.source.name}")
+
+        last_status = time.time()
+        try:
+            while True:
+                if self.step() == 0:
+                    if all(st.source.finished and st.source.ring.pending() == 0 for st in self.streams):
+                        break
+                    time.sleep(CHUNK_DURATION_MS / 1000 / 8)
+                if time.time() - last_status > status_interval:
+                    self.print_status()
+                    last_status = time.time()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopped by user.")
+        finally:
+            for st in self.streams:
+                st.source.stop()
+            self.print_status()
+
+    def print_status(self):
+        avg_batch = self.chunks_scored / self.ticks if self.ticks else 0.0
+        avg_ms = self.inference_time / self.ticks * 1000 if self.ticks else 0.0
+        avg_feature_ms = self.feature_time / self.ticks * 1000 if self.ticks else 0.0
+        print(f"📊 Streams: {len(self.streams)} | Ticks: {self.ticks} | Avg batch: {avg_batch:.2f} | "
+              f"Avg feature time/tick: {avg_feature_ms:.2f} ms | Avg classifier time/tick: {avg_ms:.2f} ms")
+        for st in self.streams:
+            line = f"   - {st.source.name}: detections={st.detections} buffer={st.source.ring.stats()}"
+            if st.gate is not None:
+                line += f" gate={st.gate.stats()}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-stream wake word server with batched ONNX inference")
+    parser.add_argument("--mic", type=int, action="append", default=[], metavar="DEVICE",
+                        help="Sound device index to listen on (repeatable)")
+    parser.add_argument("--wav", action="append", default=[], metavar="PATH",
+                        help="16 kHz mono WAV file to stream (repeatable)")
+    parser.add_argument("--socket", type=int, action="append", default=[], metavar="PORT",
+                        help="Local TCP port accepting raw int16 PCM (repeatable)")
+    parser.add_argument("--loop", action="store_true", help="Loop WAV files forever")
+    parser.add_argument("--fast", action="store_true", help="Stream WAV files as fast as possible")
+    parser.add_argument("--no-gate", action="store_true", help="Disable the energy gate")
+    parser.add_argument("--model", action="append", default=[], help="Wake word model (default: alexa)")
+    args = parser.parse_args()
+
+    sources = [MicrophoneSource(device) for device in args.mic]
+    sources += [WavFileSource(path, realtime=not args.fast, loop=args.loop) for path in args.wav]
+    sources += [SocketSource(port) for port in args.socket]
+    if not sources:
+        sources.append(MicrophoneSource(None))
+
+    print(f"🔄 Initializing wake word server for {len(sources)} stream(s)...")
+    server = BatchedWakeWordServer(sources, wakeword_models=args.model or ["alexa"],
+                                   use_energy_gate=not args.no_gate)
+    server.run()
+
+
+if __name__ == '__main__':
+    main()